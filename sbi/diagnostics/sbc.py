@@ -2,6 +2,7 @@
 # under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
 
 import warnings
+from copy import deepcopy
 from typing import Callable, Dict, List, Tuple, Union
 
 import torch
@@ -13,12 +14,31 @@ from tqdm.auto import tqdm
 from sbi.inference import DirectPosterior, VectorFieldPosterior
 from sbi.inference.posteriors.base_posterior import NeuralPosterior
 from sbi.inference.posteriors.vi_posterior import VIPosterior
+from sbi.inference.potentials.likelihood_based_potential import (
+    LikelihoodBasedPotential,
+    MixedLikelihoodBasedPotential,
+)
+from sbi.inference.potentials.posterior_based_potential import (
+    PosteriorBasedPotential,
+)
+from sbi.inference.potentials.ratio_based_potential import RatioBasedPotential
+from sbi.inference.potentials.vector_field_potential import (
+    VectorFieldBasedPotential,
+)
 from sbi.utils.diagnostics_utils import (
     get_posterior_samples_on_batch,
     remove_nans_and_infs_in_x,
 )
 from sbi.utils.metrics import c2st
 
+# Potentials which pair every parameter with its own `x` if `x_is_iid=False`.
+_PAIRED_POTENTIALS = (
+    PosteriorBasedPotential,
+    LikelihoodBasedPotential,
+    RatioBasedPotential,
+    VectorFieldBasedPotential,
+)
+
 
 def run_sbc(
     thetas: Tensor,
@@ -33,6 +53,7 @@ def run_sbc(
     num_workers: int = 1,
     show_progress_bar: bool = True,
     use_batched_sampling: bool = True,
+    reduce_fns_batched: bool = False,
     **kwargs,
 ) -> Tuple[Tensor, Tensor]:
     """Run simulation-based calibration (SBC) or expected coverage.
@@ -57,6 +78,11 @@ def run_sbc(
         num_workers: Number of CPU cores to use in parallel.
         show_progress_bar: Whether to display a progress bar over SBC runs.
         use_batched_sampling: Whether to use batched sampling for posterior samples.
+        reduce_fns_batched: Whether the reduce functions evaluate all SBC samples at
+            once, i.e., take parameters of shape `(num_samples, num_sbc_samples,
+            dim)` and observations of shape `(num_sbc_samples, *x_shape)`, and
+            return values of shape `(num_samples, num_sbc_samples)`. This is the
+            case for, e.g., `posterior.log_prob_batched`.
 
     Returns:
         ranks: Ranks of the ground truth parameters under the inferred posterior.
@@ -96,6 +122,11 @@ def run_sbc(
     # Create wrapper for reduce_fns if using a VIPosterior that ensures it is trained
     # before applying the reduce function.
     if isinstance(posterior, VIPosterior):
+        if reduce_fns_batched and not isinstance(reduce_fns, str):
+            raise ValueError(
+                "Batched reduce functions are not supported for `VIPosterior`, "
+                "since it has to be trained for every observation."
+            )
 
         def make_vipost_wrapper(original_reduce_fn: Callable) -> Callable:
             """Returns a wrapped reduce function for VIPosterior."""
@@ -117,7 +148,14 @@ def run_sbc(
             reduce_fns = [make_vipost_wrapper(fn) for fn in reduce_fns]
 
     # Calculate ranks
-    ranks = _run_sbc(thetas, xs, posterior_samples, reduce_fns, show_progress_bar)
+    ranks = _run_sbc(
+        thetas,
+        xs,
+        posterior_samples,
+        reduce_fns,
+        show_progress_bar,
+        reduce_fns_batched=reduce_fns_batched,
+    )
 
     return ranks, dap_samples
 
@@ -154,6 +192,7 @@ def _run_sbc(
         List[Callable[[Tensor, Tensor], Tensor]],
     ] = "marginals",
     show_progress_bar: bool = True,
+    reduce_fns_batched: bool = False,
 ) -> Tensor:
     """Calculate ranks for SBC or expected coverage.
 
@@ -163,6 +202,8 @@ def _run_sbc(
         posterior_samples: Samples from posterior distribution.
         reduce_fns: Functions to reduce parameter space to 1D.
         show_progress_bar: Whether to show progress bar.
+        reduce_fns_batched: Whether the reduce functions evaluate all SBC samples at
+            once, see `run_sbc()`.
 
     Returns:
         Tensor of ranks for each parameter and reduction function.
@@ -170,31 +211,48 @@ def _run_sbc(
     num_sbc_samples = thetas.shape[0]
 
     # Construct reduce functions for SBC or expected coverage.
+    is_marginals = isinstance(reduce_fns, str)
     reduce_fns = _prepare_reduce_functions(reduce_fns, thetas.shape[1])
 
-    # Initialize ranks tensor.
-    ranks = torch.zeros((num_sbc_samples, len(reduce_fns)))
+    # The marginals of all SBC samples are ranked at once.
+    if is_marginals:
+        ranks = (posterior_samples < thetas.unsqueeze(0)).sum(dim=0)
+        return ranks.to(device="cpu", dtype=torch.float32)
+
+    if reduce_fns_batched:
+        ranks = torch.stack(
+            [
+                (
+                    reduce_fn(posterior_samples, xs)
+                    < reduce_fn(thetas.unsqueeze(0), xs)
+                ).sum(dim=0)
+                for reduce_fn in reduce_fns
+            ],
+            dim=1,
+        )
+        return ranks.to(device="cpu", dtype=torch.float32)
 
     # Iterate over all SBC samples and calculate ranks.
+    ranks = []
     for sbc_idx, (true_theta, x_i) in tqdm(
         enumerate(zip(thetas, xs, strict=False)),
         total=num_sbc_samples,
         disable=not show_progress_bar,
         desc=f"Calculating ranks for {num_sbc_samples} SBC samples",
     ):
-        # For each reduce_fn (e.g., per marginal for SBC)
-        for dim_idx, reduce_fn in enumerate(reduce_fns):
-            # Rank posterior samples against true parameter, reduced to 1D
-            ranks[sbc_idx, dim_idx] = (
+        # For each reduce_fn, rank posterior samples against true parameter, reduced
+        # to 1D. The ranks stay on the device until all are computed.
+        ranks.append(
+            torch.stack([
                 (
                     reduce_fn(posterior_samples[:, sbc_idx, :], x_i)
                     < reduce_fn(true_theta.unsqueeze(0), x_i)
-                )
-                .sum()
-                .item()
-            )
+                ).sum()
+                for reduce_fn in reduce_fns
+            ])
+        )
 
-    return ranks
+    return torch.stack(ranks).to(device="cpu", dtype=torch.float32)
 
 
 def _prepare_reduce_functions(
@@ -250,17 +308,33 @@ def get_nltp(thetas: Tensor, xs: Tensor, posterior: NeuralPosterior) -> Tensor:
     Returns:
         nltp: Negative log probs of true parameters under approximate posteriors.
     """
-    nltp = torch.zeros(thetas.shape[0])
     unnormalized_log_prob = not isinstance(
         posterior, (DirectPosterior, VectorFieldPosterior)
     )
 
-    for idx, (tho, xo) in enumerate(zip(thetas, xs, strict=False)):
-        # Log prob of true params under posterior
-        if unnormalized_log_prob:
-            nltp[idx] = -posterior.potential(tho, x=xo)
-        else:
-            nltp[idx] = -posterior.log_prob(tho, x=xo)
+    if isinstance(posterior, DirectPosterior):
+        # Log probs of all true params under their posteriors at once.
+        nltp = -posterior.log_prob_batched(thetas.unsqueeze(0), x=xs).squeeze(0).cpu()
+    elif isinstance(posterior.potential_fn, _PAIRED_POTENTIALS) and not isinstance(
+        posterior.potential_fn, MixedLikelihoodBasedPotential
+    ):
+        # The potential pairs every true param with its `x`. For vector field
+        # posteriors, the potential is the normalized log prob. The potential is
+        # copied, such that the `x` of the posterior is left untouched.
+        potential_fn = deepcopy(posterior.potential_fn)
+        potential_fn.set_x(xs.to(posterior._device), x_is_iid=False)
+        potentials = potential_fn(thetas.to(posterior._device), track_gradients=False)
+        # Some potentials return a leading batch dimension of the observations.
+        nltp = -potentials.reshape(-1).cpu()
+    else:
+        # Other potentials can not be evaluated for a batch of `x`.
+        nltp = torch.zeros(thetas.shape[0])
+        for idx, (tho, xo) in enumerate(zip(thetas, xs, strict=False)):
+            # Log prob of true params under posterior
+            if unnormalized_log_prob:
+                nltp[idx] = -posterior.potential(tho, x=xo)
+            else:
+                nltp[idx] = -posterior.log_prob(tho, x=xo)
 
     if unnormalized_log_prob:
         warnings.warn(
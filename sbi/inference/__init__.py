@@ -49,6 +49,15 @@ from sbi.inference.potentials import (
     ratio_estimator_based_potential,
     vector_field_estimator_based_potential,
 )
-from sbi.utils.simulation_utils import simulate_for_sbi
-
-__all__ = ["FMPE", "MarginalTrainer", "NLE", "NPE", "NPSE", "NRE", "simulate_for_sbi"]
+from sbi.utils.simulation_utils import SimulationStore, simulate_for_sbi
+
+__all__ = [
+    "FMPE",
+    "MarginalTrainer",
+    "NLE",
+    "NPE",
+    "NPSE",
+    "NRE",
+    "SimulationStore",
+    "simulate_for_sbi",
+]
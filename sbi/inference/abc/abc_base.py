@@ -63,6 +63,8 @@ class ABCBASE:
 
         self.prior = prior
         self._simulator = simulator
+        self._num_workers = num_workers
+        self._simulation_batch_size = simulation_batch_size
         self._show_progress_bars = show_progress_bars
 
         self.x_o = None
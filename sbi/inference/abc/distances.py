@@ -1,9 +1,9 @@
 from functools import partial
 from logging import warning
-from typing import Callable, Dict, Optional, Union
+from typing import Callable, Dict, Optional, Tuple, Union
 
 import torch
-from tqdm import tqdm
+from torch import Tensor
 
 from sbi.utils.metrics import unbiased_mmd_squared, wasserstein_2_squared
 
@@ -28,6 +28,8 @@ class Distance:
         """
         self.batch_size = batch_size
         self.distance_kwargs = distance_kwargs or {}
+        # The reference data and its kernel term of the MMD, see `_mmd()`.
+        self._x_o_kernel: Optional[Tuple[Tensor, Tensor]] = None
         if isinstance(distance, Callable):
             if requires_iid_data is None:
                 # By default, we assume that data should not come in batches
@@ -55,7 +57,7 @@ class Distance:
                 "mse": mse_distance,
                 "l2": l2_distance,
                 "l1": l1_distance,
-                "mmd": partial(mmd, **self.distance_kwargs),
+                "mmd": self._mmd,
                 "wasserstein": partial(wasserstein, **self.distance_kwargs),
             }
             try:
@@ -90,22 +92,29 @@ class Distance:
             x_o: Reference data
             x: Simulated data
         """
-        num_batches = x.shape[0] // self.batch_size - 1
-        remaining = x.shape[0] % self.batch_size
-        if remaining == 0:
-            remaining = self.batch_size
-
-        distances = torch.empty(x.shape[0])
-        for i in tqdm(range(num_batches)):
-            distances[self.batch_size * i : (i + 1) * self.batch_size] = (
-                self.distance_fn(
-                    x_o, x[self.batch_size * i : (i + 1) * self.batch_size]
-                )
-            )
-        if remaining > 0:
-            distances[-remaining:] = self.distance_fn(x_o, x[-remaining:])
+        return torch.cat([
+            self.distance_fn(x_o, x_batch) for x_batch in x.split(self.batch_size)
+        ])
 
-        return distances
+    def _mmd(self, x_o: Tensor, x: Tensor) -> Tensor:
+        """Squared MMD between `x_o` and every set of simulations in `x`.
+
+        With a fixed `scale`, the kernel term of the reference data is only computed
+        once for every `x_o`, and reused for all following evaluations.
+        """
+        scale = self.distance_kwargs.get("scale")
+        if scale is None:
+            return mmd(x_o, x, **self.distance_kwargs)
+
+        if self._x_o_kernel is None or not (
+            self._x_o_kernel[0].shape == x_o.shape
+            and torch.equal(self._x_o_kernel[0], x_o)
+        ):
+            self._x_o_kernel = (
+                x_o.clone(),
+                _gaussian_kernel_mean(x_o, x_o, scale, exclude_diagonal=True),
+            )
+        return mmd(x_o, x, x_o_kernel=self._x_o_kernel[1], **self.distance_kwargs)
 
     @property
     def requires_iid_data(self):
@@ -124,13 +133,66 @@ def l1_distance(x_o, x):
     return torch.mean(abs(x_o - x), dim=-1)
 
 
-def mmd(x_o, x, scale=None):
-    dist_fn = partial(unbiased_mmd_squared, scale=scale)
-    return torch.vmap(dist_fn, in_dims=(None, 0))(x_o, x)
-
-
-def wasserstein(x_o, x, epsilon=1e-3, max_iter=1000, tol=1e-9):
-    batched_x_o = x_o.repeat((x.shape[0], *[1] * len(x_o.shape)))
-    return wasserstein_2_squared(
-        batched_x_o, x, epsilon=epsilon, max_iter=max_iter, tol=tol
-    )
+def mmd(x_o, x, scale=None, max_num_elements=2**24, x_o_kernel=None):
+    """Unbiased squared MMD between `x_o` of shape `(m, d)` and every set of
+    simulations in `x` of shape `(B, n, d)`.
+
+    With a fixed `scale`, the sets are evaluated in tiles, such that the kernel
+    matrices of a tile hold at most about `max_num_elements` entries. The kernel term
+    of `x_o` can be passed as `x_o_kernel` to not recompute it. Without `scale`, the
+    scale of every set is chosen by the median heuristic, which requires all
+    pairwise distances of the set.
+    """
+    if scale is None:
+        dist_fn = partial(unbiased_mmd_squared, scale=scale)
+        return torch.vmap(dist_fn, in_dims=(None, 0))(x_o, x)
+
+    if x_o_kernel is None:
+        x_o_kernel = _gaussian_kernel_mean(x_o, x_o, scale, exclude_diagonal=True)
+    num_x_o, num_iid = x_o.shape[0], x.shape[1]
+    tile_size = max(1, max_num_elements // (num_iid * max(num_iid, num_x_o)))
+
+    mmds = []
+    for x_tile in x.split(tile_size):
+        x_x_kernel = _gaussian_kernel_mean(x_tile, x_tile, scale, exclude_diagonal=True)
+        x_o_x_kernel = _gaussian_kernel_mean(
+            x_o.expand(x_tile.shape[0], *x_o.shape), x_tile, scale
+        )
+        mmds.append(x_o_kernel + x_x_kernel - 2 * x_o_x_kernel)
+    return torch.cat(mmds)
+
+
+def _gaussian_kernel_mean(
+    a: Tensor, b: Tensor, scale: float, exclude_diagonal: bool = False
+) -> Tensor:
+    """Mean of the Gaussian kernel between all points of `a` and `b`, batched over
+    the leading dimensions. With `exclude_diagonal`, `a` and `b` have to be the same
+    and the kernel of every point with itself is left out."""
+    kernel = torch.exp(-0.5 * torch.cdist(a, b) ** 2 / scale**2)
+    if exclude_diagonal:
+        num_points = a.shape[-2]
+        kernel_sum = kernel.sum(dim=(-2, -1)) - kernel.diagonal(
+            dim1=-2, dim2=-1
+        ).sum(dim=-1)
+        return kernel_sum / (num_points * (num_points - 1))
+    return kernel.mean(dim=(-2, -1))
+
+
+def wasserstein(x_o, x, epsilon=1e-3, max_iter=1000, tol=1e-9, max_num_elements=2**24):
+    """Squared 2-Wasserstein distance between `x_o` of shape `(m, d)` and every set of
+    simulations in `x` of shape `(B, n, d)`.
+
+    The sets are evaluated in tiles, such that the cost matrices of a tile hold at
+    most `max_num_elements` entries. `x_o` is not copied for every set.
+    """
+    tile_size = max(1, max_num_elements // (x_o.shape[0] * x.shape[1]))
+    return torch.cat([
+        wasserstein_2_squared(
+            x_o.expand(x_tile.shape[0], *x_o.shape),
+            x_tile,
+            epsilon=epsilon,
+            max_iter=max_iter,
+            tol=tol,
+        )
+        for x_tile in x.split(tile_size)
+    ])
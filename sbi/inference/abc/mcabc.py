@@ -3,13 +3,20 @@
 
 """Monte-Carlo Approximate Bayesian Computation (Rejection ABC)."""
 
-from typing import Any, Callable, Dict, Optional, Tuple, Union
+import random
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, Union
 
+import numpy as np
 import torch
+from joblib import Parallel, delayed
 from numpy import ndarray
 from torch import Tensor
+from tqdm.auto import tqdm
 
 from sbi.inference.abc.abc_base import ABCBASE
+from sbi.inference.abc.distances import Distance
+from sbi.simulators.simutils import simulate_in_batches
 from sbi.utils.kde import KDEWrapper, get_kde
 from sbi.utils.user_input_checks import process_x
 
@@ -88,6 +95,8 @@ class MCABC(ABCBASE):
         kde_kwargs: Optional[Dict[str, Any]] = None,
         return_summary: bool = False,
         num_iid_samples: int = 1,
+        chunk_size: Optional[int] = None,
+        keep_x: bool = True,
     ) -> Union[Tuple[Tensor, dict], Tuple[KDEWrapper, dict], Tensor, KDEWrapper]:
         r"""Run MCABC and return accepted parameters or KDE object fitted on them.
 
@@ -120,6 +129,13 @@ class MCABC(ABCBASE):
                 `num_iid_samples>1`, if you have chosen a statistical distance that
                 evaluates sets of simulations against a set of reference observations
                 instead of a single data-point comparison.
+            chunk_size: If passed, the simulations are run in chunks of `chunk_size`
+                parameters, which are distributed among `num_workers` workers. Of
+                every chunk, only the accepted parameters (for `eps`) or the running
+                top `quantile` of parameters (for `quantile`) are kept, such that the
+                memory does not grow with `num_simulations`.
+            keep_x: Whether to keep the simulated data of the accepted parameters.
+                Only used if `chunk_size` is passed, must be True for `lra`.
 
         Returns:
             theta (if kde False): accepted parameters
@@ -130,11 +146,15 @@ class MCABC(ABCBASE):
         """
 
         # Exactly one of eps or quantile need to be passed.
+        if eps is None and quantile is None:
+            raise ValueError("One of epsilon or quantile has to be passed.")
         assert (eps is not None) ^ (quantile is not None), (
             "Eps or quantile must be passed, but not both."
         )
         if kde_kwargs is None:
             kde_kwargs = {}
+        assert keep_x or not lra, "The simulated data is required for lra."
+        x_transform = None
 
         # Run SASS and change the simulator and x_o accordingly.
         if sass:
@@ -156,9 +176,36 @@ class MCABC(ABCBASE):
                 return sass_transform(self._batched_simulator(theta))
 
             x_o = sass_transform(x_o)
+            x_transform = sass_transform
         else:
             simulator = self._batched_simulator
 
+        if chunk_size is not None:
+            num_top_samples = (
+                None if quantile is None else int(num_simulations * quantile)
+            )
+            theta_accepted, distances_accepted, x_accepted = (
+                self._simulate_and_select_in_chunks(
+                    x_o,
+                    num_simulations,
+                    chunk_size,
+                    num_iid_samples,
+                    eps=eps,
+                    num_top_samples=num_top_samples,
+                    keep_x=keep_x,
+                    x_transform=x_transform,
+                )
+            )
+            return self._finalize(
+                theta_accepted,
+                distances_accepted,
+                x_accepted,
+                lra,
+                kde,
+                kde_kwargs,
+                return_summary,
+            )
+
         # Simulate and calculate distances.
         theta = self.prior.sample((num_simulations,))
         theta_repeat = theta.repeat_interleave(num_iid_samples, dim=0)
@@ -201,6 +248,29 @@ class MCABC(ABCBASE):
         else:
             raise ValueError("One of epsilon or quantile has to be passed.")
 
+        return self._finalize(
+            theta_accepted,
+            distances_accepted,
+            x_accepted,
+            lra,
+            kde,
+            kde_kwargs,
+            return_summary,
+        )
+
+    def _finalize(
+        self,
+        theta_accepted: Tensor,
+        distances_accepted: Tensor,
+        x_accepted: Optional[Tensor],
+        lra: bool,
+        kde: bool,
+        kde_kwargs: Dict[str, Any],
+        return_summary: bool,
+    ) -> Union[Tuple[Tensor, dict], Tuple[KDEWrapper, dict], Tensor, KDEWrapper]:
+        """Return the accepted parameters, maybe adjusted with LRA, or a KDE fitted on
+        them, and optionally a summary."""
+
         # Maybe adjust theta with LRA.
         if lra:
             self.logger.info("Running Linear regression adjustment.")
@@ -230,3 +300,235 @@ class MCABC(ABCBASE):
             return final_theta, dict(distances=distances_accepted, x=x_accepted)
         else:
             return final_theta
+
+    def _simulate_and_select_in_chunks(
+        self,
+        x_o: Union[Tensor, ndarray],
+        num_simulations: int,
+        chunk_size: int,
+        num_iid_samples: int,
+        eps: Optional[float] = None,
+        num_top_samples: Optional[int] = None,
+        keep_x: bool = True,
+        x_transform: Optional[Callable] = None,
+    ) -> Tuple[Tensor, Tensor, Optional[Tensor]]:
+        """Return accepted parameters, distances and x, simulated in chunks.
+
+        The first chunk is simulated in this process to infer the shape of `x` and set
+        `x_o`. All remaining chunks are simulated by `num_workers` workers, which
+        only return the parameters of their chunk that are accepted or among the
+        `num_top_samples` smallest distances. These are merged into the running
+        selection as they arrive, such that the memory is bounded by the selection
+        and does not grow with `num_simulations`.
+
+        Args:
+            x_o: Observed data.
+            num_simulations: Number of simulations to run.
+            chunk_size: Number of parameters per chunk.
+            num_iid_samples: Number of simulations per parameter.
+            eps: Acceptance threshold for the distances.
+            num_top_samples: Number of parameters with smallest distances to return.
+                Exactly one of `eps` or `num_top_samples` has to be passed.
+            keep_x: Whether to return the simulated data of the accepted parameters.
+            x_transform: Transformation applied to the simulated data, e.g., SASS.
+
+        Returns:
+            Accepted parameters, their distances and simulated data (None if not
+            `keep_x`), sorted by distance if `num_top_samples` is passed.
+        """
+        assert (eps is not None) ^ (num_top_samples is not None), (
+            "Eps or num_top_samples must be passed, but not both."
+        )
+        chunk_sizes = [chunk_size] * (num_simulations // chunk_size)
+        if num_simulations % chunk_size > 0:
+            chunk_sizes.append(num_simulations % chunk_size)
+        seeds = torch.randint(high=2**31, size=(len(chunk_sizes),)).tolist()
+
+        pbar = tqdm(
+            total=num_simulations,
+            disable=not self._show_progress_bars,
+            desc=f"Running {num_simulations} simulations in "
+            f"{len(chunk_sizes)} chunks.",
+        )
+
+        theta, x = _simulate_chunk(
+            self._simulator,
+            self.prior,
+            chunk_sizes[0],
+            num_iid_samples,
+            self._simulation_batch_size,
+            seeds[0],
+            x_transform,
+            self.distance.requires_iid_data,
+        )
+        # Infer x shape to test and set x_o.
+        if not self.distance.requires_iid_data:
+            self.x_shape = x[0].shape
+        else:
+            self.x_shape = x[0, 0].shape
+        self.x_o = process_x(x_o, self.x_shape)
+        selected = _select_from_chunk(
+            self.distance, self.x_o, theta, x, eps, num_top_samples, keep_x
+        )
+        pbar.update(chunk_sizes[0])
+
+        for chunk_selected, num_chunk_simulations in Parallel(
+            return_as="generator_unordered", n_jobs=self._num_workers
+        )(
+            delayed(_simulate_and_select_chunk)(
+                self._simulator,
+                self.prior,
+                self.distance,
+                self.x_o,
+                num_chunk_simulations,
+                num_iid_samples,
+                self._simulation_batch_size,
+                seed,
+                x_transform,
+                eps,
+                num_top_samples,
+                keep_x,
+            )
+            for num_chunk_simulations, seed in zip(
+                chunk_sizes[1:], seeds[1:], strict=True
+            )
+        ):
+            selected = _merge_selections(selected, chunk_selected, num_top_samples)
+            pbar.update(num_chunk_simulations)
+        pbar.close()
+
+        theta_accepted, distances_accepted, x_accepted = selected
+        if eps is not None:
+            assert theta_accepted.shape[0] > 0, (
+                f"No parameters accepted, eps={eps} too small"
+            )
+        return theta_accepted, distances_accepted, x_accepted
+
+
+def _simulate_chunk(
+    simulator: Callable,
+    prior: Any,
+    num_simulations: int,
+    num_iid_samples: int,
+    simulation_batch_size: int,
+    seed: int,
+    x_transform: Optional[Callable],
+    requires_iid_data: bool,
+) -> Tuple[Tensor, Tensor]:
+    """Return parameters sampled from the prior and their simulations.
+
+    The chunk is seeded with `seed` without changing the random state of the calling
+    process, such that the first chunk, which is simulated in the calling process,
+    does not reseed the random number generators of the user.
+    """
+    with _isolated_random_state():
+        torch.manual_seed(seed)
+        theta = prior.sample((num_simulations,))
+        # A seed of its own, such that the simulations are independent of theta.
+        simulation_seed = int(torch.randint(high=2**31, size=(1,)).item())
+        x = simulate_in_batches(
+            simulator=simulator,
+            theta=theta.repeat_interleave(num_iid_samples, dim=0),
+            sim_batch_size=simulation_batch_size,
+            seed=simulation_seed,
+            show_progress_bars=False,
+        )
+    if x_transform is not None:
+        x = x_transform(x)
+    x = x.reshape((num_simulations, num_iid_samples, -1))
+    if not requires_iid_data:
+        x = x.squeeze(1)
+    return theta, x
+
+
+@contextmanager
+def _isolated_random_state() -> Iterator[None]:
+    """Restores the python, numpy and pytorch random states and the cudnn flags
+    on exit, which are changed by `seed_all_backends()`."""
+    python_state = random.getstate()
+    numpy_state = np.random.get_state()
+    cudnn_flags = (torch.backends.cudnn.deterministic, torch.backends.cudnn.benchmark)
+    try:
+        with torch.random.fork_rng():
+            yield
+    finally:
+        random.setstate(python_state)
+        np.random.set_state(numpy_state)
+        torch.backends.cudnn.deterministic, torch.backends.cudnn.benchmark = (
+            cudnn_flags
+        )
+
+
+def _select_from_chunk(
+    distance: Distance,
+    x_o: Tensor,
+    theta: Tensor,
+    x: Tensor,
+    eps: Optional[float],
+    num_top_samples: Optional[int],
+    keep_x: bool,
+) -> Tuple[Tensor, Tensor, Optional[Tensor]]:
+    """Return the parameters, distances and x of a chunk that are accepted given
+    `eps`, or that have the `num_top_samples` smallest distances."""
+    distances = distance(x_o, x)
+    if eps is not None:
+        idx = torch.nonzero(distances < eps).squeeze(1)
+    else:
+        idx = torch.topk(
+            distances, min(num_top_samples, distances.shape[0]), largest=False
+        ).indices
+    return theta[idx], distances[idx], x[idx] if keep_x else None
+
+
+def _simulate_and_select_chunk(
+    simulator: Callable,
+    prior: Any,
+    distance: Distance,
+    x_o: Tensor,
+    num_simulations: int,
+    num_iid_samples: int,
+    simulation_batch_size: int,
+    seed: int,
+    x_transform: Optional[Callable],
+    eps: Optional[float],
+    num_top_samples: Optional[int],
+    keep_x: bool,
+) -> Tuple[Tuple[Tensor, Tensor, Optional[Tensor]], int]:
+    """Simulates a chunk in a worker and returns its selection and its size."""
+    theta, x = _simulate_chunk(
+        simulator,
+        prior,
+        num_simulations,
+        num_iid_samples,
+        simulation_batch_size,
+        seed,
+        x_transform,
+        distance.requires_iid_data,
+    )
+    selected = _select_from_chunk(
+        distance, x_o, theta, x, eps, num_top_samples, keep_x
+    )
+    return selected, num_simulations
+
+
+def _merge_selections(
+    selected: Tuple[Tensor, Tensor, Optional[Tensor]],
+    chunk_selected: Tuple[Tensor, Tensor, Optional[Tensor]],
+    num_top_samples: Optional[int],
+) -> Tuple[Tensor, Tensor, Optional[Tensor]]:
+    """Return the union of two selections, restricted to the `num_top_samples`
+    smallest distances if passed."""
+    theta = torch.cat([selected[0], chunk_selected[0]])
+    distances = torch.cat([selected[1], chunk_selected[1]])
+    x = (
+        None
+        if selected[2] is None or chunk_selected[2] is None
+        else torch.cat([selected[2], chunk_selected[2]])
+    )
+    if num_top_samples is not None:
+        idx = torch.topk(
+            distances, min(num_top_samples, distances.shape[0]), largest=False
+        ).indices
+        theta, distances = theta[idx], distances[idx]
+        x = None if x is None else x[idx]
+    return theta, distances, x
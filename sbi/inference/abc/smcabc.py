@@ -4,16 +4,20 @@
 """Sequential Monte Carlo Approximate Bayesian Computation."""
 
 import math
+from concurrent.futures import FIRST_COMPLETED, Future, wait
 from typing import Any, Callable, Dict, Optional, Tuple, Union
 
 import numpy as np
 import torch
+from joblib.externals.loky import get_reusable_executor
 from numpy import ndarray
 from torch import Tensor
 from torch.distributions import Distribution, Multinomial, MultivariateNormal
+from tqdm.auto import tqdm
 
 from sbi.inference.abc.abc_base import ABCBASE
 from sbi.sbi_types import Array
+from sbi.simulators.simutils import simulate_in_batches
 from sbi.utils.kde import KDEWrapper, get_kde
 from sbi.utils.sbiutils import within_support
 from sbi.utils.torchutils import BoxUniform
@@ -36,6 +40,8 @@ class SMCABC(ABCBASE):
         show_progress_bars: bool = True,
         kernel: Optional[str] = "gaussian",
         algorithm_variant: str = "C",
+        async_populations: bool = False,
+        speculation_factor: float = 2.0,
     ):
         r"""Sequential Monte Carlo Approximate Bayesian Computation.
 
@@ -80,6 +86,14 @@ class SMCABC(ABCBASE):
                 sampling.
             kernel: Perturbation kernel.
             algorithm_variant: Indicating the choice of algorithm variant, A, B, or C.
+            async_populations: Whether to sample the populations after the initial one
+                asynchronously with `num_workers` workers. Batches of perturbed
+                particles are dispatched to the workers as soon as one of them becomes
+                idle, and the particles are accepted as the simulations arrive.
+            speculation_factor: Only used if `async_populations=True`. Every batch
+                dispatched to a worker holds `speculation_factor * num_particles /
+                num_workers` particles, such that the workers stay busy until the
+                population is complete even though most particles are rejected.
         """
 
         super().__init__(
@@ -106,6 +120,10 @@ class SMCABC(ABCBASE):
             " {algorithm_variants}."
         )
         self.algorithm_variant = algorithm_variant
+        assert speculation_factor > 0.0, "speculation_factor must be positive."
+        self._async_populations = async_populations
+        self._speculation_factor = speculation_factor
+        self._sass_transform: Optional[Callable] = None
         self.distance_to_x0 = None
         self.simulation_counter = 0
         self.num_simulations = 0
@@ -229,6 +247,7 @@ class SMCABC(ABCBASE):
                 return sass_transform(self._batched_simulator(theta))
 
             self._simulate_with_budget = sass_simulator
+            self._sass_transform = sass_transform
 
         # run initial population
         particles, epsilon, distances, x = self._set_xo_and_sample_initial_population(
@@ -427,7 +446,27 @@ class SMCABC(ABCBASE):
         num_accepted_particles = 0
         num_particles = particles.shape[0]
 
-        while num_accepted_particles < num_particles:
+        if self._async_populations:
+            accepted_particles, accepted_distances, accepted_x = (
+                self._simulate_and_accept_async(
+                    particles, log_weights, epsilon, num_iid_samples
+                )
+            )
+            num_accepted_particles = accepted_particles.shape[0]
+            if num_accepted_particles > 0:
+                new_particles.append(accepted_particles)
+                new_log_weights.append(
+                    self._calculate_new_log_weights(
+                        accepted_particles, particles, log_weights
+                    )
+                )
+                new_distances.append(accepted_distances)
+                new_x.append(accepted_x)
+
+        while (
+            num_accepted_particles < num_particles
+            and self.simulation_counter < self.num_simulations
+        ):
             # Upperbound for batch size to not exceed simulation budget.
             num_batch = min(
                 num_particles - num_accepted_particles,
@@ -468,42 +507,37 @@ class SMCABC(ABCBASE):
                 new_x.append(x_candidates[is_accepted])
                 num_accepted_particles += num_accepted_batch
 
-            # If simulation budget was exceeded and we still need particles, take
-            # previous population or fill up with previous population.
-            if (
-                self.simulation_counter >= self.num_simulations
-                and num_accepted_particles < num_particles
-            ):
-                if use_last_pop_samples:
-                    num_remaining = num_particles - num_accepted_particles
-                    self.logger.info(
-                        """Simulation Budget exceeded, filling up with %s
-                        samples from last population.""",
-                        num_remaining,
-                    )
-                    # Some new particles have been accepted already, therefore
-                    # fill up the remaining once with old particles and weights.
-                    new_particles.append(particles[:num_remaining, :])
-                    # Recalculate weights with new particles.
-                    new_log_weights = [
-                        self._calculate_new_log_weights(
-                            torch.cat(new_particles),
-                            particles,
-                            log_weights,
-                        )
-                    ]
-                    new_distances.append(distances[:num_remaining])
-                    new_x.append(x[:num_remaining])
-                else:
-                    self.logger.info(
-                        "Simulation Budget exceeded, returning previous population."
+        # If simulation budget was exceeded and we still need particles, take
+        # previous population or fill up with previous population.
+        if num_accepted_particles < num_particles:
+            if use_last_pop_samples:
+                num_remaining = num_particles - num_accepted_particles
+                self.logger.info(
+                    """Simulation Budget exceeded, filling up with %s
+                    samples from last population.""",
+                    num_remaining,
+                )
+                # Some new particles have been accepted already, therefore
+                # fill up the remaining once with old particles and weights.
+                new_particles.append(particles[:num_remaining, :])
+                # Recalculate weights with new particles.
+                new_log_weights = [
+                    self._calculate_new_log_weights(
+                        torch.cat(new_particles),
+                        particles,
+                        log_weights,
                     )
-                    new_particles = [particles]
-                    new_log_weights = [log_weights]
-                    new_distances = [distances]
-                    new_x = [x]
-
-                break
+                ]
+                new_distances.append(distances[:num_remaining])
+                new_x.append(x[:num_remaining])
+            else:
+                self.logger.info(
+                    "Simulation Budget exceeded, returning previous population."
+                )
+                new_particles = [particles]
+                new_log_weights = [log_weights]
+                new_distances = [distances]
+                new_x = [x]
 
         # collect lists of tensors into tensors
         new_particles = torch.cat(new_particles)
@@ -524,6 +558,133 @@ class SMCABC(ABCBASE):
             new_x[sort_idx],
         )
 
+    def _simulate_and_accept_async(
+        self,
+        particles: Tensor,
+        log_weights: Tensor,
+        epsilon: float,
+        num_iid_samples: int,
+    ) -> Tuple[Tensor, Tensor, Tensor]:
+        """Return accepted particles, distances and x of a new population, simulated
+        asynchronously with `num_workers` workers.
+
+        Batches of perturbed particles are created and submitted in the main process,
+        such that at most two batches per worker are in flight, and the distances of
+        a batch are computed as soon as its simulations arrive. The simulations of a
+        batch are counted towards the budget when the batch is submitted, and the
+        last batch is shrunk such that the budget is not exceeded. Once enough
+        particles are accepted, the batches which have not started yet are cancelled
+        and refunded. Batches which are already running are still charged, even
+        though their simulations are discarded.
+
+        Returns:
+            At most `num_particles` accepted particles with their distances and x. Less
+            particles are returned if the simulation budget is used up.
+        """
+
+        num_particles = particles.shape[0]
+        num_workers = max(self._num_workers, 1)
+        batch_size = max(
+            math.ceil(self._speculation_factor * num_particles / num_workers), 1
+        )
+        executor = get_reusable_executor(max_workers=num_workers)
+        # Number of simulations charged for every batch in flight.
+        pending: Dict[Future, int] = {}
+        # Results of every batch, by the order in which the batches were submitted.
+        batch_results: Dict[int, Tuple[Tensor, Tensor, Tensor]] = {}
+
+        def submit_batch(batch_idx: int) -> bool:
+            num_remaining = (
+                self.num_simulations - self.simulation_counter
+            ) // num_iid_samples
+            num_batch = min(batch_size, num_remaining)
+            if num_batch <= 0:
+                return False
+            self.simulation_counter += num_batch * num_iid_samples
+            particle_candidates = self._sample_and_perturb(
+                particles, torch.exp(log_weights), num_samples=num_batch
+            )
+            seed = int(torch.randint(high=2**31, size=(1,)).item())
+            future = executor.submit(
+                _simulate_batch,
+                self._simulator,
+                batch_idx,
+                particle_candidates,
+                num_iid_samples,
+                self._simulation_batch_size,
+                seed,
+            )
+            pending[future] = num_batch * num_iid_samples
+            return True
+
+        num_batches_submitted = 0
+        while num_batches_submitted < 2 * num_workers and submit_batch(
+            num_batches_submitted
+        ):
+            num_batches_submitted += 1
+
+        pbar = tqdm(
+            total=num_particles,
+            disable=not self._show_progress_bars,
+            desc=f"Accepting {num_particles} particles asynchronously.",
+        )
+        num_accepted_in_order = 0
+        num_batches_in_order = 0
+        # Simulations arrive in arbitrary order. To not favour parameters which are
+        # fast to simulate, particles are accepted in the order in which their
+        # batches were submitted, as in the sequential case.
+        while pending and num_accepted_in_order < num_particles:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                batch_idx, particle_candidates, x_candidates = future.result()
+                if self._sass_transform is not None:
+                    x_candidates = self._sass_transform(x_candidates)
+                x_candidates = x_candidates.reshape((
+                    particle_candidates.shape[0],
+                    num_iid_samples,
+                    -1,
+                ))
+                if not self.distance.requires_iid_data:
+                    x_candidates = x_candidates.squeeze(1)
+                dists = self.distance(self.x_o, x_candidates)
+                is_accepted = dists <= epsilon
+                batch_results[batch_idx] = (
+                    particle_candidates[is_accepted],
+                    dists[is_accepted],
+                    x_candidates[is_accepted],
+                )
+
+            while num_batches_in_order in batch_results:
+                num_accepted_batch = batch_results[num_batches_in_order][0].shape[0]
+                pbar.update(min(num_accepted_batch, num_particles - pbar.n))
+                num_accepted_in_order += num_accepted_batch
+                num_batches_in_order += 1
+            if num_accepted_in_order >= num_particles:
+                break
+            for _ in done:
+                if not submit_batch(num_batches_submitted):
+                    break
+                num_batches_submitted += 1
+        pbar.close()
+
+        # Batches which have not started yet are not simulated and hence not charged.
+        for future, num_simulations in pending.items():
+            if future.cancel():
+                self.simulation_counter -= num_simulations
+
+        ordered_results = [batch_results[idx] for idx in range(num_batches_in_order)]
+        if not ordered_results:
+            return (
+                particles[:0],
+                torch.empty(0),
+                torch.empty(0),
+            )
+        accepted_particles, accepted_distances, accepted_x = (
+            torch.cat(results)[:num_particles] for results in zip(*ordered_results)
+        )
+        return accepted_particles, accepted_distances, accepted_x
+
     def _get_next_epsilon(self, distances: Tensor, quantile: float) -> float:
         """Return epsilon for next round based on quantile of this round's distances.
 
@@ -561,26 +722,52 @@ class SMCABC(ABCBASE):
         new_particles: Tensor,
         old_particles: Tensor,
         old_log_weights: Tensor,
+        max_num_pairs: int = 2**20,
     ) -> Tensor:
-        """Return new log weights following formulas in publications A,B anc C."""
+        """Return new log weights following formulas in publications A,B anc C.
+
+        The kernel log probs of all pairs of new and old particles are computed at
+        once for tiles of new particles, such that a tile contains at most
+        `max_num_pairs` pairs.
+        """
 
         # Prior can be batched across new particles.
         prior_log_probs = self.prior.log_prob(new_particles)
 
-        # Contstruct function to get kernel log prob for given old particle.
-        # The kernel is centered on each old particle as in all three variants (A,B,C).
-        def kernel_log_prob(new_particle):
-            return self.get_new_kernel(old_particles).log_prob(new_particle)
-
-        # We still have to loop over particles here because
-        # the kernel log probs are already batched across old particles.
-        log_weighted_sum = torch.tensor(
-            [
-                torch.logsumexp(old_log_weights + kernel_log_prob(new_particle), dim=0)
-                for new_particle in new_particles
-            ],
-            dtype=torch.float32,
-        )
+        # The kernel is centered on each old particle as in all three variants (A,B,C),
+        # i.e., the kernel log probs of a tile of new particles have shape
+        # `(tile_size, num_old_particles)`.
+        if self.kernel == "gaussian" and self.kernel_variance.ndim == 2:  # type: ignore
+            # With a covariance shared by all old particles, the Mahalanobis distances
+            # are the euclidean distances of the whitened particles.
+            scale_tril = torch.linalg.cholesky(self.kernel_variance)  # type: ignore
+
+            def whiten(particles: Tensor) -> Tensor:
+                return torch.linalg.solve_triangular(
+                    scale_tril, particles.T, upper=False
+                ).T
+
+            whitened_old_particles = whiten(old_particles)
+            log_normalizer = (
+                -scale_tril.diagonal().log().sum()
+                - 0.5 * old_particles.shape[1] * math.log(2 * math.pi)
+            )
+
+            def kernel_log_prob(new_particles: Tensor) -> Tensor:
+                distances = torch.cdist(whiten(new_particles), whitened_old_particles)
+                return log_normalizer - 0.5 * distances**2
+
+        else:
+            kernel = self.get_new_kernel(old_particles)
+
+            def kernel_log_prob(new_particles: Tensor) -> Tensor:
+                return kernel.log_prob(new_particles.unsqueeze(1))
+
+        tile_size = max(1, max_num_pairs // old_particles.shape[0])
+        log_weighted_sum = torch.cat([
+            torch.logsumexp(old_log_weights + kernel_log_prob(tile), dim=1)
+            for tile in new_particles.split(tile_size)
+        ])
         # new weights are prior probs over weighted sum:
         return prior_log_probs - log_weighted_sum
 
@@ -796,3 +983,23 @@ class SMCABC(ABCBASE):
         particle_ranges = samples.max(0).values - samples.min(0).values
         assert particle_ranges.ndim < 2
         return particle_ranges
+
+
+def _simulate_batch(
+    simulator: Callable,
+    batch_idx: int,
+    theta: Tensor,
+    num_iid_samples: int,
+    simulation_batch_size: int,
+    seed: int,
+) -> Tuple[int, Tensor, Tensor]:
+    """Return the index, the parameters and the simulations of a batch, simulated in
+    a worker of `SMCABC._simulate_and_accept_async()`."""
+    x = simulate_in_batches(
+        simulator=simulator,
+        theta=theta.repeat_interleave(num_iid_samples, dim=0),
+        sim_batch_size=simulation_batch_size,
+        seed=seed,
+        show_progress_bars=False,
+    )
+    return batch_idx, theta, x
@@ -2,7 +2,7 @@
 # under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
 
 from abc import abstractmethod
-from typing import Any, Dict, Optional, Union
+from typing import Any, Callable, Dict, Optional, Union
 from warnings import warn
 
 import torch
@@ -15,7 +15,7 @@ from sbi.inference.potentials.base_potential import (
     CustomPotentialWrapper,
 )
 from sbi.sbi_types import Array, Shape, TorchTransform
-from sbi.utils.sbiutils import gradient_ascent
+from sbi.utils.sbiutils import gradient_ascent, gradient_ascent_batched
 from sbi.utils.torchutils import ensure_theta_batched, process_device
 from sbi.utils.user_input_checks import process_x
 
@@ -205,6 +205,90 @@ class NeuralPosterior:
             show_progress_bars=show_progress_bars,
         )[0]
 
+    def _calculate_map_batched(
+        self,
+        x: Tensor,
+        num_iter: int = 1_000,
+        num_to_optimize: int = 100,
+        learning_rate: float = 0.01,
+        init_method: Union[str, Tensor] = "posterior",
+        num_init_samples: int = 1_000,
+        patience: int = 50,
+        tolerance: float = 1e-4,
+        show_progress_bars: bool = False,
+        potential_fn: Optional[Callable] = None,
+        **set_x_kwargs: Any,
+    ) -> Tensor:
+        """Calculates the maximum-a-posteriori estimates (MAP) of a batch of
+        observations `x` of shape `(num_x, *x_shape)`.
+        See `map_batched()` method of child classes for docstring.
+
+        Args:
+            potential_fn: The differentiable function which evaluates
+                `self.potential_fn`. Defaults to `self.potential_fn` itself.
+            set_x_kwargs: Additional keyword arguments for `self.potential_fn.set_x`.
+        """
+        num_x = x.shape[0]
+        if init_method == "posterior":
+            inits = self.sample_batched(
+                (num_init_samples,), x, show_progress_bars=show_progress_bars
+            )
+        elif init_method == "proposal":
+            inits = self.proposal.sample((num_init_samples,))  # type: ignore
+        elif isinstance(init_method, Tensor):
+            inits = init_method
+        else:
+            raise ValueError(
+                f"Unknown init_method '{init_method}'. Use 'posterior', 'proposal' or "
+                "a tensor of init locations."
+            )
+        if inits.dim() == 2:
+            # The same init locations are used for all observations.
+            inits = inits.unsqueeze(1).expand(-1, num_x, -1)
+        inits = inits.transpose(0, 1)
+
+        potential_fn = self.potential_fn if potential_fn is None else potential_fn
+        current_shape = []
+
+        def batched_potential_fn(theta: Tensor, x_: Tensor) -> Tensor:
+            num_x_, num_thetas = theta.shape[:2]
+            # The observations only change when the optimization of some of them has
+            # stopped, i.e. when their number decreases, or when switching from the
+            # init locations to those that are optimized.
+            if current_shape != [num_x_, num_thetas]:
+                current_shape[:] = [num_x_, num_thetas]
+                self.potential_fn.set_x(
+                    x_.repeat_interleave(num_thetas, dim=0),
+                    x_is_iid=False,
+                    **set_x_kwargs,
+                )
+            log_probs = potential_fn(theta.reshape(-1, *theta.shape[2:]))
+            return log_probs.reshape(num_x_, num_thetas)
+
+        # The repeated observations are only set for the optimization. Afterwards, the
+        # previous observation is set again (which, e.g., restores cached embeddings)
+        # and all attributes of the potential are restored.
+        previous_state = self.potential_fn.__dict__.copy()
+        try:
+            return gradient_ascent_batched(
+                potential_fn=batched_potential_fn,
+                inits=inits,
+                x=x,
+                theta_transform=self.theta_transform,
+                num_iter=num_iter,
+                num_to_optimize=num_to_optimize,
+                learning_rate=learning_rate,
+                patience=patience,
+                tolerance=tolerance,
+                show_progress_bars=show_progress_bars,
+            )[0]
+        finally:
+            if current_shape:
+                self.potential_fn.set_x(
+                    previous_state["_x_o"], x_is_iid=previous_state["_x_is_iid"]
+                )
+                self.potential_fn.__dict__.update(previous_state)
+
     def map(
         self,
         x: Optional[Tensor] = None,
@@ -2,7 +2,8 @@
 # under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
 
 import warnings
-from typing import Optional, Union
+from collections import OrderedDict
+from typing import Dict, Optional, Union
 
 import torch
 from torch import Tensor, log
@@ -20,7 +21,11 @@ from sbi.neural_nets.estimators.shape_handling import (
 from sbi.samplers.rejection import rejection
 from sbi.sbi_types import Shape
 from sbi.utils.sbiutils import within_support
-from sbi.utils.torchutils import ensure_theta_batched
+from sbi.utils.torchutils import (
+    ensure_theta_batched,
+    parameter_versions,
+    tensor_digest,
+)
 from sbi.utils.user_input_checks import check_prior
 
 
@@ -49,6 +54,7 @@ class DirectPosterior(NeuralPosterior):
         device: Optional[Union[str, torch.device]] = None,
         x_shape: Optional[torch.Size] = None,
         enable_transform: bool = True,
+        leakage_correction_cache_size: int = 10_000,
     ):
         """
         Args:
@@ -62,6 +68,8 @@ class DirectPosterior(NeuralPosterior):
             enable_transform: Whether to transform parameters to unconstrained space
                 during MAP optimization. When False, an identity transform will be
                 returned for `theta_transform`.
+            leakage_correction_cache_size: Maximum number of observations for which
+                the leakage correction factor is cached (see `leakage_correction()`).
         """
         # Because `DirectPosterior` does not take the `potential_fn` as input, it
         # builds it itself. The `potential_fn` and `theta_transform` are used only for
@@ -88,7 +96,9 @@ class DirectPosterior(NeuralPosterior):
         self.posterior_estimator = posterior_estimator
 
         self.max_sampling_batch_size = max_sampling_batch_size
-        self._leakage_density_correction_factor = None
+        self.leakage_correction_cache_size = leakage_correction_cache_size
+        self._leakage_correction_cache: OrderedDict = OrderedDict()
+        self._leakage_correction_versions = None
 
         self._purpose = """It samples the posterior network and rejects samples that
             lie outside of the prior bounds."""
@@ -408,55 +418,85 @@ class DirectPosterior(NeuralPosterior):
         show_progress_bars: bool = False,
         rejection_sampling_batch_size: int = 10_000,
     ) -> Tensor:
-        r"""Return leakage correction factor for a leaky posterior density estimate.
+        r"""Return leakage correction factors for a leaky posterior density estimate.
 
         The factor is estimated from the acceptance probability during rejection
         sampling from the posterior.
 
         This is to avoid re-estimating the acceptance probability from scratch
-        whenever `log_prob` is called and `norm_posterior=True`. Here, it
-        is estimated only once for `self.default_x` and saved for later. We
-        re-evaluate only whenever a new `x` is passed.
+        whenever `log_prob` is called and `norm_posterior=True`. Here, it is estimated
+        only once per observation and saved for later. The factors of the most
+        recently used `leakage_correction_cache_size` observations are kept, keyed by
+        the content of the observations. The saved factors are discarded once the
+        posterior estimator is modified (e.g. trained further). For a batch of
+        observations, the factors of all observations which are not saved are
+        estimated in a single batched rejection sampling pass.
 
         Arguments:
+            x: Observation of shape `(*condition_shape)`, or batch of observations of
+                shape `(batch_dim, *condition_shape)`.
             num_rejection_samples: Number of samples used to estimate correction factor.
+            force_update: Whether to re-estimate the factors of saved observations.
             show_progress_bars: Whether to show a progress bar during sampling.
             rejection_sampling_batch_size: Batch size for rejection sampling.
 
         Returns:
-            Saved or newly-estimated correction factor (as a scalar `Tensor`).
+            Saved or newly-estimated correction factors, one per observation.
         """
-
-        def acceptance_at(x: Tensor) -> Tensor:
-            # [1:] to remove batch-dimension for `reshape_to_batch_event`.
-            return rejection.accept_reject_sample(
+        x = reshape_to_batch_event(
+            x, event_shape=self.posterior_estimator.condition_shape
+        )
+        cache = self._leakage_correction_cache
+        versions = parameter_versions(self.posterior_estimator)
+        if versions != self._leakage_correction_versions:
+            cache.clear()
+            self._leakage_correction_versions = versions
+
+        x_cpu = x.detach().cpu()
+        keys = [tensor_digest(x_i) for x_i in x_cpu]
+        # Index of the first occurrence of every observation that has to be estimated.
+        missing = {}
+        for i, key in enumerate(keys):
+            if (force_update or key not in cache) and key not in missing:
+                missing[key] = i
+
+        if missing:
+            acceptance_rates = rejection.accept_reject_sample(
                 proposal=self.posterior_estimator.sample,
                 accept_reject_fn=lambda theta: within_support(self.prior, theta),
                 num_samples=num_rejection_samples,
                 show_progress_bars=show_progress_bars,
                 sample_for_correction_factor=True,
                 max_sampling_batch_size=rejection_sampling_batch_size,
-                proposal_sampling_kwargs={
-                    "condition": reshape_to_batch_event(
-                        x, event_shape=self.posterior_estimator.condition_shape
-                    )
-                },
+                proposal_sampling_kwargs={"condition": x[list(missing.values())]},
             )[1]
+            for key, acceptance_rate in zip(missing, acceptance_rates, strict=True):
+                cache[key] = acceptance_rate
 
-        # Check if the provided x matches the default x (short-circuit on identity).
-        is_new_x = self.default_x is None or (
-            x is not self.default_x and (x != self.default_x).any()
-        )
+        factors = []
+        for key in keys:
+            cache.move_to_end(key)
+            factors.append(cache[key])
+        while len(cache) > self.leakage_correction_cache_size:
+            cache.popitem(last=False)
 
-        not_saved_at_default_x = self._leakage_density_correction_factor is None
+        return torch.stack(factors)
 
-        if is_new_x:  # Calculate at x; don't save.
-            return acceptance_at(x)
-        elif not_saved_at_default_x or force_update:  # Calculate at default_x; save.
-            assert self.default_x is not None
-            self._leakage_density_correction_factor = acceptance_at(self.default_x)
+    def __setstate__(self, state_dict: Dict):
+        """Sets the state when being loaded from pickle.
 
-        return self._leakage_density_correction_factor  # type: ignore
+        Posteriors pickled before the leakage correction factors were cached get an
+        empty cache.
+
+        Args:
+            state_dict: State to be restored.
+        """
+        state_dict.setdefault("_leakage_correction_cache", OrderedDict())
+        state_dict.setdefault("leakage_correction_cache_size", 10_000)
+        # The saved factors can not be related to the versions of the loaded
+        # parameters, hence they are re-estimated once.
+        state_dict["_leakage_correction_versions"] = None
+        super().__setstate__(state_dict)
 
     def map(
         self,
@@ -524,3 +564,69 @@ class DirectPosterior(NeuralPosterior):
             show_progress_bars=show_progress_bars,
             force_update=force_update,
         )
+
+    def map_batched(
+        self,
+        x: Tensor,
+        num_iter: int = 1_000,
+        num_to_optimize: int = 100,
+        learning_rate: float = 0.01,
+        init_method: Union[str, Tensor] = "posterior",
+        num_init_samples: int = 1_000,
+        patience: int = 50,
+        tolerance: float = 1e-4,
+        show_progress_bars: bool = False,
+    ) -> Tensor:
+        r"""Returns the maximum-a-posteriori estimates (MAP) given a batch of
+        observations [x_1, ..., x_B].
+
+        The parameters of all observations are optimized jointly with a single
+        optimizer, starting from a given number of starting positions per observation
+        (samples with the highest log-probability). The optimization of an observation
+        stops once its best log-probability has not improved by more than `tolerance`
+        for `patience` iterations. The method can be interrupted (Ctrl-C), in which
+        case the best estimates so far are returned.
+
+        Warning: The default values used by this function are not well-tested. They
+        might require hand-tuning for the problem at hand.
+
+        Args:
+            x: A batch of observations, of shape `(batch_dim, event_shape_x)`.
+            num_iter: Maximal number of optimization steps that the algorithm takes
+                to find the MAPs.
+            num_to_optimize: From the drawn `num_init_samples`, use the
+                `num_to_optimize` with highest log-probability as the initial points
+                for the optimization of every observation.
+            learning_rate: Learning rate of the optimizer.
+            init_method: How to select the starting parameters for the optimization. If
+                it is a string, it can be either [`posterior`, `proposal`], which
+                samples the respective distribution `num_init_samples` times. If it is
+                a tensor of shape `(num_inits, *input_shape)` or
+                `(num_inits, batch_dim, *input_shape)`, it will be used as init
+                locations.
+            num_init_samples: Draw this number of samples from the posterior and
+                evaluate the log-probability of all of them.
+            patience: Number of iterations without improvement after which the
+                optimization of an observation is stopped.
+            tolerance: Minimal increase of the log-probability which counts as an
+                improvement.
+            show_progress_bars: Whether to show a progressbar during sampling and
+                optimization.
+
+        Returns:
+            The MAP estimates of shape `(batch_dim, *input_shape)`.
+        """
+        x = reshape_to_batch_event(
+            x, event_shape=self.posterior_estimator.condition_shape
+        )
+        return self._calculate_map_batched(
+            x,
+            num_iter=num_iter,
+            num_to_optimize=num_to_optimize,
+            learning_rate=learning_rate,
+            init_method=init_method,
+            num_init_samples=num_init_samples,
+            patience=patience,
+            tolerance=tolerance,
+            show_progress_bars=show_progress_bars,
+        )
@@ -26,10 +26,13 @@ from sbi.neural_nets.estimators.shape_handling import reshape_to_batch_event
 from sbi.samplers.mcmc import (
     IterateParameters,
     PyMCSampler,
+    SliceSamplerArrayVectorized,
     SliceSamplerSerial,
+    SliceSamplerTorch,
     SliceSamplerVectorized,
     proposal_init,
     resample_given_potential_fn,
+    resample_given_potential_fn_batched,
     sir_init,
 )
 from sbi.sbi_types import Shape, TorchTransform
@@ -70,12 +73,17 @@ class MCMCPosterior(NeuralPosterior):
             theta_transform: Transformation that will be applied during sampling.
                 Allows to perform MCMC in unconstrained space.
             method: Method used for MCMC sampling, one of `slice_np`,
-                `slice_np_vectorized`, `hmc_pyro`, `nuts_pyro`, `slice_pymc`,
-                `hmc_pymc`, `nuts_pymc`. `slice_np` is a custom
-                numpy implementation of slice sampling. `slice_np_vectorized` is
+                `slice_np_vectorized`, `slice_np_arrayvec`, `slice_torch`, `hmc_pyro`,
+                `nuts_pyro`, `slice_pymc`, `hmc_pymc`, `nuts_pymc`. `slice_np` is a
+                custom numpy implementation of slice sampling. `slice_np_vectorized` is
                 identical to `slice_np`, but if `num_chains>1`, the chains are
                 vectorized for `slice_np_vectorized` whereas they are run sequentially
-                for `slice_np`. The samplers ending on `_pyro` are using Pyro, and
+                for `slice_np`. `slice_np_arrayvec` is identical to
+                `slice_np_vectorized`, but keeps the state of all chains in arrays
+                instead of per-chain Python objects, which is faster for many chains.
+                `slice_torch` runs the vectorized slice sampler in PyTorch on `device`,
+                avoiding the conversion of every potential evaluation to NumPy.
+                The samplers ending on `_pyro` are using Pyro, and
                 likewise the samplers ending on `_pymc` are using PyMC.
             thin: The thinning factor for the chain, default 1 (no thinning).
             warmup_steps: The initial number of samples to discard.
@@ -346,14 +354,19 @@ class MCMCPosterior(NeuralPosterior):
 
         track_gradients = method in ("hmc_pyro", "nuts_pyro", "hmc_pymc", "nuts_pymc")
         with torch.set_grad_enabled(track_gradients):
-            if method in ("slice_np", "slice_np_vectorized"):
+            if method in (
+                "slice_np",
+                "slice_np_vectorized",
+                "slice_np_arrayvec",
+                "slice_torch",
+            ):
                 transformed_samples = self._slice_np_mcmc(
                     num_samples=num_samples,
                     potential_function=self.potential_,
                     initial_params=initial_params,
                     thin=thin,  # type: ignore
                     warmup_steps=warmup_steps,  # type: ignore
-                    vectorized=(method == "slice_np_vectorized"),
+                    method=method,  # type: ignore
                     interchangeable_chains=True,
                     num_workers=num_workers,
                     show_progress_bars=show_progress_bars,
@@ -427,8 +440,7 @@ class MCMCPosterior(NeuralPosterior):
             init_strategy: The initialisation strategy for chains.
             init_strategy_parameters: Dictionary of keyword arguments passed to
                 the init strategy.
-            num_workers: number of cpu cores used to parallelize initial
-                parameter generation and mcmc sampling.
+            num_workers: number of cpu cores used to parallelize mcmc sampling.
             mp_context: Multiprocessing start method, either `"fork"` or `"spawn"`
             show_progress_bars: Whether to show sampling progress monitor.
 
@@ -450,9 +462,11 @@ class MCMCPosterior(NeuralPosterior):
             else init_strategy_parameters
         )
 
-        assert method == "slice_np_vectorized", (
-            "Batched sampling only supported for vectorized samplers!"
-        )
+        assert method in (
+            "slice_np_vectorized",
+            "slice_np_arrayvec",
+            "slice_torch",
+        ), "Batched sampling only supported for vectorized samplers!"
 
         # warn if num_chains is larger than num requested samples
         if num_chains > torch.Size(sample_shape).numel():
@@ -496,13 +510,18 @@ class MCMCPosterior(NeuralPosterior):
             x,
             init_strategy,  # type: ignore
             num_chains,  # type: ignore
-            num_workers,
-            show_progress_bars,
             **init_strategy_parameters,
         )
         # We need num_samples from each posterior in the batch
         num_samples = torch.Size(sample_shape).numel() * batch_size
 
+        def shard_potential(chain_indices: ndarray) -> Callable:
+            # When the chains are split across workers, each shard of chains has to
+            # be evaluated against its own observations only.
+            potential_fn = deepcopy(self.potential_fn)
+            potential_fn.set_x(x_[chain_indices], x_is_iid=False)
+            return self._prepare_potential(method, potential_fn=potential_fn)  # type: ignore
+
         with torch.set_grad_enabled(False):
             transformed_samples = self._slice_np_mcmc(
                 num_samples=num_samples,
@@ -510,10 +529,11 @@ class MCMCPosterior(NeuralPosterior):
                 initial_params=initial_params,
                 thin=thin,  # type: ignore
                 warmup_steps=warmup_steps,  # type: ignore
-                vectorized=(method == "slice_np_vectorized"),
+                method=method,
                 interchangeable_chains=False,
                 num_workers=num_workers,
                 show_progress_bars=show_progress_bars,
+                shard_potential_function=shard_potential,
             )
 
         # (num_chains_extended, samples_per_chain, *input_shape)
@@ -665,14 +685,15 @@ class MCMCPosterior(NeuralPosterior):
         x: torch.Tensor,
         init_strategy: str,
         num_chains_per_x: int,
-        num_workers: int,
-        show_progress_bars: bool,
         **kwargs,
     ) -> Tensor:
         """Return initial parameters for MCMC for a batch of `x`, obtained with given
            init strategy.
 
-        Parallelizes across CPU cores only for resample and SIR.
+        The `resample` and `sir` strategies evaluate the potential of all `x` on a
+        shared grid of candidates (see `resample_given_potential_fn_batched()`), and
+        the `proposal` strategy draws the initial parameters of all chains at once.
+        Other strategies create the initial parameters one by one for every `x`.
 
         Args:
             x: Batch of observations to create different initial parameters for.
@@ -680,14 +701,65 @@ class MCMCPosterior(NeuralPosterior):
                 [`proposal`|`sir`|`resample`|`latest_sample`].
             num_chains_per_x: number of MCMC chains for each x, generates initial params
                 for each x
-            num_workers: number of CPU cores for parallization
-            show_progress_bars: whether to show progress bars for SIR init
-            kwargs: Passed on to `_build_mcmc_init_fn`.
+            kwargs: Passed on to the init strategy. The `resample` and `sir`
+                strategies take `num_candidate_samples`, `num_batches` and
+                `max_sampling_batch_size`.
 
         Returns:
             Tensor: initial parameters, one for each chain
         """
 
+        if init_strategy == "resample" or init_strategy == "sir":
+            resample_kwargs = {
+                key: kwargs.pop(key)
+                for key in (
+                    "num_candidate_samples",
+                    "num_batches",
+                    "max_sampling_batch_size",
+                )
+                if key in kwargs
+            }
+            # Set by `sample_batched()` for the other strategies.
+            kwargs.pop("num_return_samples", None)
+            if kwargs:
+                warnings.warn(
+                    f"The init strategy parameters {sorted(kwargs)} are not "
+                    f"supported by the batched `{init_strategy}` init strategy and "
+                    "are ignored.",
+                    stacklevel=3,
+                )
+
+            potential_ = deepcopy(self.potential_fn)
+            current_num_candidates = []
+
+            def batched_potential_fn(theta: Tensor) -> Tensor:
+                # Pair every candidate of the grid with its `x`, i.e., repeat the
+                # observations ABC -> ABCABC. The observations only change for the
+                # last, smaller tile of candidates.
+                if current_num_candidates != [theta.shape[0]]:
+                    current_num_candidates[:] = [theta.shape[0]]
+                    potential_.set_x(
+                        x.repeat(theta.shape[0], *([1] * (x.dim() - 1))),
+                        x_is_iid=False,
+                    )
+                log_probs = potential_(theta.reshape(-1, *theta.shape[2:]))
+                return log_probs.reshape(theta.shape[:2])
+
+            return resample_given_potential_fn_batched(
+                self.proposal,
+                batched_potential_fn,
+                transform=self.theta_transform,
+                num_x=x.shape[0],
+                num_samples_per_x=num_chains_per_x,
+                correct_for_proposal=init_strategy == "sir",
+                **resample_kwargs,
+            )
+        elif init_strategy == "proposal":
+            num_chains = x.shape[0] * num_chains_per_x
+            return self.theta_transform(  # type: ignore
+                self.proposal.sample((num_chains,)).detach()
+            )
+
         potential_ = deepcopy(self.potential_fn)
         initial_params = []
         init_fn = self._build_mcmc_init_fn(
@@ -700,35 +772,9 @@ class MCMCPosterior(NeuralPosterior):
         for xi in x:
             # Build init function
             potential_.set_x(xi)
-
-            # Parallelize inits for resampling or sir.
-            if num_workers > 1 and (
-                init_strategy == "resample" or init_strategy == "sir"
-            ):
-
-                def seeded_init_fn(seed):
-                    torch.manual_seed(seed)
-                    return init_fn()
-
-                seeds = torch.randint(high=2**31, size=(num_chains_per_x,))
-
-                # Generate initial params parallelized over num_workers.
-                initial_params = initial_params + list(
-                    tqdm(
-                        Parallel(return_as="generator", n_jobs=num_workers)(
-                            delayed(seeded_init_fn)(seed) for seed in seeds
-                        ),
-                        total=len(seeds),
-                        desc=f"""Generating {num_chains_per_x} MCMC inits with
-                                {num_workers} workers.""",
-                        disable=not show_progress_bars,
-                    )
-                )
-
-            else:
-                initial_params = initial_params + [
-                    init_fn() for _ in range(num_chains_per_x)
-                ]  # type: ignore
+            initial_params = initial_params + [
+                init_fn() for _ in range(num_chains_per_x)
+            ]  # type: ignore
 
         initial_params = torch.cat(initial_params)
         return initial_params
@@ -740,13 +786,14 @@ class MCMCPosterior(NeuralPosterior):
         initial_params: Tensor,
         thin: int,
         warmup_steps: int,
-        vectorized: bool = False,
+        method: str = "slice_np",
         interchangeable_chains=True,
         num_workers: int = 1,
         init_width: Union[float, ndarray] = 0.01,
         show_progress_bars: bool = True,
+        shard_potential_function: Optional[Callable[[ndarray], Callable]] = None,
     ) -> Tensor:
-        """Custom implementation of slice sampling using Numpy.
+        """Custom implementation of slice sampling using Numpy or PyTorch.
 
         Args:
             num_samples: Desired number of samples.
@@ -754,14 +801,22 @@ class MCMCPosterior(NeuralPosterior):
             initial_params: Initial parameters for MCMC chain.
             thin: Thinning (subsampling) factor, default 1 (no thinning).
             warmup_steps: Initial number of samples to discard.
-            vectorized: Whether to use a vectorized implementation of the
-                `SliceSampler`.
+            method: Which implementation of the `SliceSampler` to use, one of
+                `slice_np` (chains in serial), `slice_np_vectorized` (vectorized
+                across chains), `slice_np_arrayvec` (vectorized across chains with
+                array-based chain state) or `slice_torch` (vectorized across chains
+                in PyTorch, on the device of the potential).
             interchangeable_chains: Whether chains are interchangeable, i.e., whether
                 we can mix samples between chains.
             num_workers: Number of CPU cores to use.
             init_width: Inital width of brackets.
             show_progress_bars: Whether to show a progressbar during sampling;
                 can only be turned off for vectorized sampler.
+            shard_potential_function: Function that takes the indices of a subset of
+                chains and returns the potential function for these chains. Used by
+                the vectorized numpy samplers when splitting the chains across
+                `num_workers` processes and the potential of a chain depends on its
+                index, e.g., for batched sampling.
 
         Returns:
             Tensor of shape (num_samples, shape_of_single_theta).
@@ -769,31 +824,52 @@ class MCMCPosterior(NeuralPosterior):
 
         num_chains, dim_samples = initial_params.shape
 
-        if not vectorized:
-            SliceSamplerMultiChain = SliceSamplerSerial
-        else:
-            SliceSamplerMultiChain = SliceSamplerVectorized
+        SliceSamplerMultiChain = {
+            "slice_np": SliceSamplerSerial,
+            "slice_np_vectorized": SliceSamplerVectorized,
+            "slice_np_arrayvec": SliceSamplerArrayVectorized,
+            "slice_torch": SliceSamplerTorch,
+        }[method]
 
         def multi_obs_potential(params):
             # Params are of shape (num_chains * num_obs, event).
             all_potentials = potential_function(params)  # Shape: (num_chains, num_obs)
             return all_potentials.flatten()
 
+        def shard_log_prob_fn(chain_indices: ndarray) -> Callable:
+            shard_potential = shard_potential_function(chain_indices)  # type: ignore
+            return lambda params: shard_potential(params).flatten()
+
+        sampler_kwargs = {}
+        if (
+            method in ("slice_np_vectorized", "slice_np_arrayvec")
+            and shard_potential_function is not None
+        ):
+            sampler_kwargs["shard_log_prob_fn"] = shard_log_prob_fn
+
+        # The torch sampler stays on the device of the potential, all others run
+        # in numpy.
+        if method == "slice_torch":
+            init_params = initial_params.to(self._device)
+        else:
+            init_params = tensor2numpy(initial_params)
+
         posterior_sampler = SliceSamplerMultiChain(
-            init_params=tensor2numpy(initial_params),
+            init_params=init_params,  # type: ignore
             log_prob_fn=multi_obs_potential,
             num_chains=num_chains,
             thin=thin,
             verbose=show_progress_bars,
             num_workers=num_workers,
             init_width=init_width,
+            **sampler_kwargs,
         )
         warmup_ = warmup_steps * thin
         num_samples_ = ceil((num_samples * thin) / num_chains)
         # Run mcmc including warmup
         samples = posterior_sampler.run(warmup_ + num_samples_)
         samples = samples[:, warmup_steps:, :]  # discard warmup steps
-        samples = torch.from_numpy(samples)  # chains x samples x dim
+        samples = torch.as_tensor(samples)  # chains x samples x dim
 
         # Save posterior sampler.
         self._posterior_sampler = posterior_sampler
@@ -923,11 +999,14 @@ class MCMCPosterior(NeuralPosterior):
 
         return samples
 
-    def _prepare_potential(self, method: str) -> Callable:
+    def _prepare_potential(
+        self, method: str, potential_fn: Optional[BasePotential] = None
+    ) -> Callable:
         """Combines potential and transform and takes care of gradients and pyro.
 
         Args:
             method: Which MCMC method to use.
+            potential_fn: Potential to prepare. If None, `self.potential_fn` is used.
 
         Returns:
             A potential function that is ready to be used in MCMC.
@@ -938,7 +1017,13 @@ class MCMCPosterior(NeuralPosterior):
         elif method in ("hmc_pymc", "nuts_pymc"):
             track_gradients = True
             pyro = False
-        elif method in ("slice_np", "slice_np_vectorized", "slice_pymc"):
+        elif method in (
+            "slice_np",
+            "slice_np_vectorized",
+            "slice_np_arrayvec",
+            "slice_torch",
+            "slice_pymc",
+        ):
             track_gradients = False
             pyro = False
         else:
@@ -953,7 +1038,7 @@ class MCMCPosterior(NeuralPosterior):
 
         prepared_potential = partial(
             transformed_potential,
-            potential_fn=self.potential_fn,
+            potential_fn=self.potential_fn if potential_fn is None else potential_fn,
             theta_transform=self.theta_transform,
             device=self._device,
             track_gradients=track_gradients,
@@ -1032,6 +1117,72 @@ class MCMCPosterior(NeuralPosterior):
             force_update=force_update,
         )
 
+    def map_batched(
+        self,
+        x: Tensor,
+        num_iter: int = 1_000,
+        num_to_optimize: int = 100,
+        learning_rate: float = 0.01,
+        init_method: Union[str, Tensor] = "proposal",
+        num_init_samples: int = 1_000,
+        patience: int = 50,
+        tolerance: float = 1e-4,
+        show_progress_bars: bool = False,
+    ) -> Tensor:
+        r"""Returns the maximum-a-posteriori estimates (MAP) given a batch of
+        observations [x_1, ..., x_B].
+
+        The parameters of all observations are optimized jointly with a single
+        optimizer, starting from a given number of starting positions per observation
+        (samples with the highest log-probability). The optimization of an observation
+        stops once its best log-probability has not improved by more than `tolerance`
+        for `patience` iterations. The method can be interrupted (Ctrl-C), in which
+        case the best estimates so far are returned.
+
+        Warning: The default values used by this function are not well-tested. They
+        might require hand-tuning for the problem at hand.
+
+        Args:
+            x: A batch of observations, of shape `(batch_dim, event_shape_x)`.
+            num_iter: Maximal number of optimization steps that the algorithm takes
+                to find the MAPs.
+            num_to_optimize: From the drawn `num_init_samples`, use the
+                `num_to_optimize` with highest log-probability as the initial points
+                for the optimization of every observation.
+            learning_rate: Learning rate of the optimizer.
+            init_method: How to select the starting parameters for the optimization. If
+                it is a string, it can be either [`posterior`, `proposal`], which
+                samples the respective distribution `num_init_samples` times. If it is
+                a tensor of shape `(num_inits, *input_shape)` or
+                `(num_inits, batch_dim, *input_shape)`, it will be used as init
+                locations.
+            num_init_samples: Draw this number of samples from the posterior and
+                evaluate the log-probability of all of them.
+            patience: Number of iterations without improvement after which the
+                optimization of an observation is stopped.
+            tolerance: Minimal increase of the log-probability which counts as an
+                improvement.
+            show_progress_bars: Whether to show a progressbar during sampling and
+                optimization.
+
+        Returns:
+            The MAP estimates of shape `(batch_dim, *input_shape)`.
+        """
+        if len(x.shape) == 1:
+            x = x.unsqueeze(0)
+        x = reshape_to_batch_event(x, event_shape=x.shape[1:])
+        return self._calculate_map_batched(
+            x,
+            num_iter=num_iter,
+            num_to_optimize=num_to_optimize,
+            learning_rate=learning_rate,
+            init_method=init_method,
+            num_init_samples=num_init_samples,
+            patience=patience,
+            tolerance=tolerance,
+            show_progress_bars=show_progress_bars,
+        )
+
     def get_arviz_inference_data(self) -> InferenceData:
         """Returns arviz InferenceData object constructed most recent samples.
 
@@ -1049,7 +1200,11 @@ class MCMCPosterior(NeuralPosterior):
         )
 
         sampler: Union[
-            MCMC, SliceSamplerSerial, SliceSamplerVectorized, PyMCSampler
+            MCMC,
+            SliceSamplerSerial,
+            SliceSamplerVectorized,
+            SliceSamplerTorch,
+            PyMCSampler,
         ] = self._posterior_sampler
 
         # If Pyro sampler and samples not transformed, use arviz' from_pyro.
@@ -1084,8 +1239,10 @@ class MCMCPosterior(NeuralPosterior):
                 *samples_shape
             )
 
+            # Arviz converts to NumPy, so samples from device samplers such as
+            # `slice_torch` need to be moved to the CPU first.
             inference_data = az.convert_to_inference_data({
-                f"{self.param_name}": samples
+                f"{self.param_name}": samples.cpu()
             })
 
         return inference_data
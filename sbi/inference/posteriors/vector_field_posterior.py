@@ -1,7 +1,8 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
 
-from typing import Dict, Literal, Optional, Union
+import logging
+from typing import Dict, Iterator, Literal, Optional, Tuple, Union
 
 import torch
 from torch import Tensor
@@ -17,6 +18,7 @@ from sbi.neural_nets.estimators.base import ConditionalVectorFieldEstimator
 from sbi.neural_nets.estimators.shape_handling import (
     reshape_to_batch_event,
 )
+from sbi.samplers.ode_solvers import ZukoNeuralODE
 from sbi.samplers.rejection import rejection
 from sbi.samplers.score.correctors import Corrector
 from sbi.samplers.score.diffuser import Diffuser
@@ -152,6 +154,7 @@ class VectorFieldPosterior(NeuralPosterior):
         iid_method: Literal["fnpe", "gauss", "auto_gauss", "jac_gauss"] = "auto_gauss",
         iid_params: Optional[Dict] = None,
         max_sampling_batch_size: int = 10_000,
+        num_workers: int = 1,
         sample_with: Optional[str] = None,
         show_progress_bars: bool = True,
     ) -> Tensor:
@@ -161,12 +164,15 @@ class VectorFieldPosterior(NeuralPosterior):
             sample_shape: Shape of the samples to be drawn.
             predictor: The predictor for the vector field sampler. Can be a string or
                 a custom predictor following the API in `sbi.samplers.score.predictors`.
-                Currently, only `euler_maruyama` is implemented.
+                Implemented are `euler_maruyama`, `heun` and `dpm_solver` (second-order
+                solvers which require far fewer steps, e.g. 25), and `adaptive`
+                (adaptive step sizes, e.g. with `steps=2`).
             corrector: The corrector for the vector field sampler. Either of
                 [None].
             predictor_params: Additional parameters passed to predictor.
             corrector_params: Additional parameters passed to corrector.
-            steps: Number of steps to take for the Euler-Maruyama method.
+            steps: Number of time points of the linear grid on which the predictor
+                is run.
                 If `sample_with` is "ode", this is ignored.
             ts: Time points at which to evaluate the vector field process. If None, a
                 linear grid between t_max and t_min is used. If `sample_with` is "ode",
@@ -187,6 +193,8 @@ class VectorFieldPosterior(NeuralPosterior):
             iid_params: Additional parameters passed to the iid method. See the specific
                 `IIDScoreFunction` child class for details.
             max_sampling_batch_size: Maximum batch size for sampling.
+            num_workers: Number of threads which propagate batches through the
+                diffusion process concurrently. Ignored if `sample_with` is "ode".
             sample_with: Sampling method to use - 'ode' or 'sde'. Note that in order to
                 use the 'sde' sampling method, the vector field estimator must support
                 it and have the SCORE_DEFINED class attribute set to True.
@@ -222,6 +230,7 @@ class VectorFieldPosterior(NeuralPosterior):
                 "steps": steps,
                 "ts": ts,
                 "max_sampling_batch_size": max_sampling_batch_size,
+                "num_workers": num_workers,
                 "show_progress_bars": show_progress_bars,
             }
             samples = rejection.accept_reject_sample(
@@ -252,6 +261,7 @@ class VectorFieldPosterior(NeuralPosterior):
         steps: int = 500,
         ts: Optional[Tensor] = None,
         max_sampling_batch_size: int = 10_000,
+        num_workers: int = 1,
         show_progress_bars: bool = True,
     ) -> Tensor:
         r"""Return samples from posterior distribution $p(\theta|x)$.
@@ -264,23 +274,22 @@ class VectorFieldPosterior(NeuralPosterior):
             sample_shape: Shape of the samples to be drawn.
             predictor: The predictor for the diffusion-based sampler. Can be a string or
                 a custom predictor following the API in `sbi.samplers.score.predictors`.
-                Currently, only `euler_maruyama` is implemented.
+                Implemented are `euler_maruyama`, `heun` and `dpm_solver` (second-order
+                solvers which require far fewer steps, e.g. 25), and `adaptive`
+                (adaptive step sizes, e.g. with `steps=2`).
             corrector: The corrector for the diffusion-based sampler. Either of
                 [None].
-            steps: Number of steps to take for the Euler-Maruyama method.
+            steps: Number of time points of the linear grid on which the predictor
+                is run.
             ts: Time points at which to evaluate the diffusion process. If None, a
                 linear grid between t_max and t_min is used.
             max_sampling_batch_size: Maximum batch size for sampling.
+            num_workers: Number of threads which propagate batches concurrently.
             sample_with: Deprecated - use `.build_posterior(sample_with=...)` prior to
                 `.sample()`.
             show_progress_bars: Whether to show a progress bar during sampling.
         """
 
-        if not self.vector_field_estimator.SCORE_DEFINED:
-            raise ValueError(
-                "The vector field estimator does not support the 'sde' sampling method."
-            )
-
         num_samples = torch.Size(sample_shape).numel()
 
         max_sampling_batch_size = (
@@ -289,6 +298,152 @@ class VectorFieldPosterior(NeuralPosterior):
             else max_sampling_batch_size
         )
 
+        diffuser, ts = self._build_diffuser(
+            predictor, corrector, predictor_params, corrector_params, steps, ts
+        )
+
+        # Chunks are written into a preallocated tensor, which is created once the
+        # shape of the samples is known from the first chunk.
+        samples = None
+        start = 0
+        for chunk in diffuser.run_in_chunks(
+            num_samples,
+            ts,
+            chunk_size=max_sampling_batch_size,
+            num_workers=num_workers,
+            show_progress_bars=show_progress_bars,
+        ):
+            if samples is None:
+                samples = chunk.new_empty((num_samples, *chunk.shape[1:]))
+            samples[start : start + chunk.shape[0]] = chunk
+            start += chunk.shape[0]
+
+        return samples  # type: ignore
+
+    def sample_iter(
+        self,
+        sample_shape: Shape = torch.Size(),
+        x: Optional[Tensor] = None,
+        predictor: Union[str, Predictor] = "euler_maruyama",
+        corrector: Optional[Union[str, Corrector]] = None,
+        predictor_params: Optional[Dict] = None,
+        corrector_params: Optional[Dict] = None,
+        steps: int = 500,
+        ts: Optional[Tensor] = None,
+        iid_method: Literal["fnpe", "gauss", "auto_gauss", "jac_gauss"] = "auto_gauss",
+        iid_params: Optional[Dict] = None,
+        chunk_size: int = 10_000,
+        num_workers: int = 1,
+        show_progress_bars: bool = True,
+    ) -> Iterator[Tensor]:
+        r"""Yields samples from the posterior distribution $p(\theta|x)$ in chunks.
+
+        Samples are drawn with the diffusion-based sampler, like `.sample()` with
+        `sample_with="sde"`. Unlike `.sample()`, the samples are not gathered in a
+        single tensor, such that memory stays bounded for any number of samples.
+        Samples outside of the support of the prior are rejected, hence chunks can
+        contain fewer than `chunk_size` samples. A warning is logged if less than 1%
+        of the samples are accepted, and a `RuntimeError` is raised if none of the
+        first 100_000 samples is accepted.
+
+        Args:
+            sample_shape: Shape of the samples to be drawn in total.
+            x: Observed data. If None, the default x is used.
+            predictor: The predictor for the diffusion-based sampler, see `.sample()`.
+            corrector: The corrector for the diffusion-based sampler.
+            predictor_params: Additional parameters passed to predictor.
+            corrector_params: Additional parameters passed to corrector.
+            steps: Number of time points of the linear grid on which the predictor
+                is run.
+            ts: Time points at which to evaluate the diffusion process. If None, a
+                linear grid between t_max and t_min is used.
+            iid_method: Which method to use for computing the score in the iid setting,
+                see `.sample()`.
+            iid_params: Additional parameters passed to the iid method.
+            chunk_size: Number of samples which are propagated through the diffusion
+                process at once.
+            num_workers: Number of threads which propagate chunks concurrently.
+            show_progress_bars: Whether to show a progress bar during sampling.
+
+        Yields:
+            Chunks of samples of shape `(num_samples_in_chunk, *input_shape)`.
+        """
+        x = self._x_else_default_x(x)
+        x = reshape_to_batch_event(x, self.vector_field_estimator.condition_shape)
+        is_iid = x.shape[0] > 1
+        self.potential_fn.set_x(
+            x, x_is_iid=is_iid, iid_method=iid_method, iid_params=iid_params
+        )
+
+        diffuser, ts = self._build_diffuser(
+            predictor, corrector, predictor_params, corrector_params, steps, ts
+        )
+
+        num_remaining = torch.Size(sample_shape).numel()
+        num_proposed, num_accepted = 0, 0
+        low_acceptance_warned = False
+        while num_remaining > 0:
+            # After the first pass, propose enough samples to collect the remaining
+            # ones given the acceptance rate so far, but at most `chunk_size` samples
+            # (or the remaining ones if there are more).
+            num_to_propose = num_remaining
+            if num_proposed > 0:
+                acceptance_rate = num_accepted / num_proposed
+                num_needed = int(1.5 * num_remaining / max(acceptance_rate, 1e-12))
+                num_to_propose = max(num_remaining, min(num_needed, chunk_size))
+            for chunk in diffuser.run_in_chunks(
+                num_to_propose,
+                ts,
+                chunk_size=chunk_size,
+                num_workers=num_workers,
+                show_progress_bars=show_progress_bars,
+            ):
+                chunk = chunk.reshape(-1, *self.vector_field_estimator.input_shape)
+                accepted = chunk[within_support(self.prior, chunk)][:num_remaining]
+                num_proposed += chunk.shape[0]
+                num_accepted += accepted.shape[0]
+                # To avoid endless sampling if the prior rejects (almost) all samples,
+                # e.g. for a badly trained estimator, warn once after the first 1_000
+                # samples and give up if none of the first 100_000 was accepted.
+                if num_accepted == 0 and num_proposed >= 100_000:
+                    raise RuntimeError(
+                        f"None of {num_proposed} samples was within the support of "
+                        "the prior. The estimator may be badly trained."
+                    )
+                acceptance_rate = num_accepted / num_proposed
+                if (
+                    num_proposed > 1000
+                    and acceptance_rate < 0.01
+                    and not low_acceptance_warned
+                ):
+                    logging.warning(
+                        f"Only {acceptance_rate:.3%} of the samples were within the "
+                        "support of the prior. It may take a long time to collect the "
+                        f"remaining {num_remaining} samples."
+                    )
+                    low_acceptance_warned = True
+                if accepted.shape[0] == 0:
+                    continue
+                num_remaining -= accepted.shape[0]
+                yield accepted
+                if num_remaining == 0:
+                    return
+
+    def _build_diffuser(
+        self,
+        predictor: Union[str, Predictor],
+        corrector: Optional[Union[str, Corrector]],
+        predictor_params: Optional[Dict],
+        corrector_params: Optional[Dict],
+        steps: int,
+        ts: Optional[Tensor],
+    ) -> Tuple[Diffuser, Tensor]:
+        """Returns the diffusion-based sampler and its time grid."""
+        if not self.vector_field_estimator.SCORE_DEFINED:
+            raise ValueError(
+                "The vector field estimator does not support the 'sde' sampling method."
+            )
+
         # TODO: the time schedule should be provided by the estimator, see issue #1437
         if ts is None:
             t_max = self.vector_field_estimator.t_max
@@ -303,23 +458,7 @@ class VectorFieldPosterior(NeuralPosterior):
             predictor_params=predictor_params,
             corrector_params=corrector_params,
         )
-        max_sampling_batch_size = min(max_sampling_batch_size, num_samples)
-        samples = []
-        num_iter = num_samples // max_sampling_batch_size
-        num_iter = (
-            num_iter + 1 if (num_samples % max_sampling_batch_size) != 0 else num_iter
-        )
-        for _ in range(num_iter):
-            samples.append(
-                diffuser.run(
-                    num_samples=max_sampling_batch_size,
-                    ts=ts,
-                    show_progress_bars=show_progress_bars,
-                )
-            )
-        samples = torch.cat(samples, dim=0)[:num_samples]
-
-        return samples
+        return diffuser, ts
 
     def sample_via_ode(
         self,
@@ -391,6 +530,7 @@ class VectorFieldPosterior(NeuralPosterior):
         steps: int = 500,
         ts: Optional[Tensor] = None,
         max_sampling_batch_size: int = 10000,
+        num_workers: int = 1,
         show_progress_bars: bool = True,
     ) -> Tensor:
         r"""Given a batch of observations [x_1, ..., x_B] this function samples from
@@ -405,14 +545,19 @@ class VectorFieldPosterior(NeuralPosterior):
                 drawn.
             predictor: The predictor for the diffusion-based sampler. Can be a string or
                 a custom predictor following the API in `sbi.samplers.score.predictors`.
-                Currently, only `euler_maruyama` is implemented.
+                Implemented are `euler_maruyama`, `heun` and `dpm_solver` (second-order
+                solvers which require far fewer steps, e.g. 25), and `adaptive`
+                (adaptive step sizes, e.g. with `steps=2`).
             corrector: The corrector for the diffusion-based sampler.
             predictor_params: Additional parameters passed to predictor.
             corrector_params: Additional parameters passed to corrector.
-            steps: Number of steps to take for the Euler-Maruyama method.
+            steps: Number of time points of the linear grid on which the predictor
+                is run.
             ts: Time points at which to evaluate the diffusion process. If None, a
                 linear grid between t_max and t_min is used.
             max_sampling_batch_size: Maximum batch size for sampling.
+            num_workers: Number of threads which propagate batches through the
+                diffusion process concurrently. Ignored if `sample_with` is "ode".
             show_progress_bars: Whether to show sampling progress monitor.
 
         Returns:
@@ -452,6 +597,7 @@ class VectorFieldPosterior(NeuralPosterior):
                 "steps": steps,
                 "ts": ts,
                 "max_sampling_batch_size": max_sampling_batch_size,
+                "num_workers": num_workers,
                 "show_progress_bars": show_progress_bars,
             }
             samples = rejection.accept_reject_sample(
@@ -536,7 +682,10 @@ class VectorFieldPosterior(NeuralPosterior):
 
         if self._map is None or force_update:
             # rebuild coarse flow fast for MAP optimization.
-            self.potential_fn.set_x(self.default_x, atol=1e-2, rtol=1e-3, exact=True)
+            ode_kwargs: Dict[str, Union[bool, float]] = {"exact": True}
+            if isinstance(self.potential_fn.neural_ode, ZukoNeuralODE):
+                ode_kwargs.update(atol=1e-2, rtol=1e-3)
+            self.potential_fn.set_x(self.default_x, **ode_kwargs)
             callable_potential_fn = CallableDifferentiablePotentialFunction(
                 self.potential_fn
             )
@@ -561,3 +710,73 @@ class VectorFieldPosterior(NeuralPosterior):
             )[0]
 
         return self._map
+
+    def map_batched(
+        self,
+        x: Tensor,
+        num_iter: int = 1_000,
+        num_to_optimize: int = 100,
+        learning_rate: float = 0.01,
+        init_method: Union[str, Tensor] = "posterior",
+        num_init_samples: int = 1_000,
+        patience: int = 50,
+        tolerance: float = 1e-4,
+        show_progress_bars: bool = False,
+    ) -> Tensor:
+        r"""Returns the maximum-a-posteriori estimates (MAP) given a batch of
+        observations [x_1, ..., x_B].
+
+        The parameters of all observations are optimized jointly with a single
+        optimizer, starting from a given number of starting positions per observation
+        (samples with the highest log-probability). The optimization of an observation
+        stops once its best log-probability has not improved by more than `tolerance`
+        for `patience` iterations. The method can be interrupted (Ctrl-C), in which
+        case the best estimates so far are returned.
+
+        Warning: The default values used by this function are not well-tested. They
+        might require hand-tuning for the problem at hand.
+
+        Args:
+            x: A batch of observations, of shape `(batch_dim, event_shape_x)`.
+            num_iter: Maximal number of optimization steps that the algorithm takes
+                to find the MAPs.
+            num_to_optimize: From the drawn `num_init_samples`, use the
+                `num_to_optimize` with highest log-probability as the initial points
+                for the optimization of every observation.
+            learning_rate: Learning rate of the optimizer.
+            init_method: How to select the starting parameters for the optimization. If
+                it is a string, it can be either [`posterior`, `proposal`], which
+                samples the respective distribution `num_init_samples` times. If it is
+                a tensor of shape `(num_inits, *input_shape)` or
+                `(num_inits, batch_dim, *input_shape)`, it will be used as init
+                locations.
+            num_init_samples: Draw this number of samples from the posterior and
+                evaluate the log-probability of all of them.
+            patience: Number of iterations without improvement after which the
+                optimization of an observation is stopped.
+            tolerance: Minimal increase of the log-probability which counts as an
+                improvement.
+            show_progress_bars: Whether to show a progressbar during sampling and
+                optimization.
+
+        Returns:
+            The MAP estimates of shape `(batch_dim, *input_shape)`.
+        """
+        x = reshape_to_batch_event(x, self.vector_field_estimator.condition_shape)
+        # Coarse flows for a fast MAP optimization, see `map()`.
+        ode_kwargs: Dict[str, Union[bool, float]] = {"exact": True}
+        if isinstance(self.potential_fn.neural_ode, ZukoNeuralODE):
+            ode_kwargs.update(atol=1e-2, rtol=1e-3)
+        return self._calculate_map_batched(
+            x,
+            num_iter=num_iter,
+            num_to_optimize=num_to_optimize,
+            learning_rate=learning_rate,
+            init_method=init_method,
+            num_init_samples=num_init_samples,
+            patience=patience,
+            tolerance=tolerance,
+            show_progress_bars=show_progress_bars,
+            potential_fn=CallableDifferentiablePotentialFunction(self.potential_fn),
+            **ode_kwargs,
+        )
@@ -1,7 +1,9 @@
 import functools
 import math
+import weakref
 from abc import ABC, abstractmethod
-from typing import Callable, Optional, Type, Union
+from collections import OrderedDict
+from typing import Callable, Iterator, Optional, Tuple, Type, Union
 
 import torch
 from torch import Tensor
@@ -15,10 +17,19 @@ from sbi.utils.score_utils import (
     mv_diag_or_dense,
     solve_diag_or_dense,
 )
-from sbi.utils.torchutils import ensure_theta_batched
+from sbi.utils.torchutils import (
+    ensure_theta_batched,
+    parameter_versions,
+    tensor_digest,
+)
 
 IID_METHODS = {}
 
+# Posterior precisions estimated by `AutoGaussCorrectedScoreFn`, per estimator. For
+# every estimator, the most recent estimates are kept in insertion order.
+_POSTERIOR_PRECISION_CACHE: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_POSTERIOR_PRECISION_CACHE_SIZE = 16
+
 
 def get_iid_method(name: str) -> Type["IIDScoreFunction"]:
     r"""
@@ -61,6 +72,7 @@ class IIDScoreFunction(ABC):
         vector_field_estimator: ConditionalVectorFieldEstimator,
         prior: Distribution,  # type: ignore
         device: Union[str, torch.device] = "cpu",
+        iid_batch_size: Optional[int] = None,
     ) -> None:
         r"""
         This is a abstract base class wrapper for score estimators.
@@ -75,10 +87,19 @@ class IIDScoreFunction(ABC):
         posterior factorizes, the marginal true posterior at time $t>0$ does not and
         this requires some adjustments.
 
+        The scores of the observations are accumulated over batches of at most
+        `iid_batch_size` observations, such that the memory required for a large
+        number of observations is bounded. If the embedding of all observations has
+        been cached in the `vector_field_estimator` (which is done when setting the
+        observations of a `VectorFieldBasedPotential`), every batch reuses the
+        corresponding slice of the cached embedding.
+
         Args:
             vector_field_estimator: The neural network modeling the score.
             prior: The prior distribution.
             device: The device on which to evaluate the potential. Defaults to "cpu".
+            iid_batch_size: Maximum number of observations for which the score is
+                evaluated at once. If None, all observations are evaluated at once.
         """
 
         if not vector_field_estimator.SCORE_DEFINED:
@@ -103,8 +124,12 @@ class IIDScoreFunction(ABC):
                 "estimator with marginals defined, set MARGINALS_DEFINED to True."
             )
 
+        if iid_batch_size is not None and iid_batch_size < 1:
+            raise ValueError("`iid_batch_size` must be at least 1.")
+
         self.vector_field_estimator = vector_field_estimator.to(device).eval()
         self.prior = prior
+        self.iid_batch_size = iid_batch_size
 
     def to(self, device: Union[str, torch.device]) -> None:
         """
@@ -120,6 +145,21 @@ class IIDScoreFunction(ABC):
         if self.prior:
             self.prior.to(device)  # type: ignore
 
+    def iid_batches(self, conditions: Tensor) -> Iterator[Tuple[slice, Tensor]]:
+        r"""Splits the observations into batches of at most `iid_batch_size`.
+
+        Args:
+            conditions: The sequence of observations of size [iid,...].
+
+        Yields:
+            The indices of the observations in the batch and the batch itself, which
+            is a view of `conditions`.
+        """
+        batch_size = self.iid_batch_size or conditions.shape[0]
+        for start in range(0, conditions.shape[0], batch_size):
+            rows = slice(start, start + batch_size)
+            yield rows, conditions[rows]
+
     @abstractmethod
     def __call__(
         self,
@@ -149,6 +189,7 @@ class FactorizedNPEScoreFunction(IIDScoreFunction):
         prior: Distribution,
         device: Union[str, torch.device] = "cpu",
         prior_score_weight: Optional[Callable[[Tensor], Tensor]] = None,
+        iid_batch_size: Optional[int] = None,
     ) -> None:
         r"""
         The FactorizedNPEScoreFunction implments the
@@ -172,8 +213,10 @@ class FactorizedNPEScoreFunction(IIDScoreFunction):
             device: The device on which to evaluate the potential. Defaults to "cpu".
             prior_score_weight: A function to weight the prior score. Defaults to the
                 linear interpolation between zero (at t=0) and one (at t=t_max).
+            iid_batch_size: Maximum number of observations for which the score is
+                evaluated at once. If None, all observations are evaluated at once.
         """
-        super().__init__(vector_field_estimator, prior, device)
+        super().__init__(vector_field_estimator, prior, device, iid_batch_size)
         if prior_score_weight is None:
             t_max = vector_field_estimator.t_max
 
@@ -208,15 +251,17 @@ class FactorizedNPEScoreFunction(IIDScoreFunction):
 
         N = conditions.shape[0]
 
-        # Compute the per-sample score
+        # Accumulate the per-sample scores over batches of observations
         inputs = ensure_theta_batched(inputs)
-        base_score = self.vector_field_estimator.score(inputs, conditions, time)
+        base_score = sum(
+            self.vector_field_estimator.score(inputs, batch, time).sum(-2, keepdim=True)
+            for _, batch in self.iid_batches(conditions)
+        )
 
         # Compute the prior score
         prior_score = self.prior_score_weight_fn(time) * self.prior_score_fn(inputs)
 
-        # Accumulate
-        score = (1 - N) * prior_score + base_score.sum(-2, keepdim=True)
+        score = (1 - N) * prior_score + base_score
 
         return score
 
@@ -248,6 +293,10 @@ class FactorizedNPEScoreFunction(IIDScoreFunction):
 
 
 class BaseGaussCorrectedScoreFunction(IIDScoreFunction):
+    # Whether the posterior precisions depend on the inputs (and hence are estimated
+    # per batch of observations), or only on the observations and the time.
+    PRECISIONS_DEPEND_ON_INPUTS = False
+
     def __init__(
         self,
         vector_field_estimator: ConditionalVectorFieldEstimator,
@@ -255,6 +304,7 @@ class BaseGaussCorrectedScoreFunction(IIDScoreFunction):
         ensure_lam_psd: bool = True,
         lam_psd_nugget: float = 0.01,
         device: Union[str, torch.device] = "cpu",
+        iid_batch_size: Optional[int] = None,
     ) -> None:
         r"""Base class for Gauss-corrected score function as proposed in [1].
 
@@ -285,8 +335,10 @@ class BaseGaussCorrectedScoreFunction(IIDScoreFunction):
             ensure_lam_psd: Whether to ensure the precision matrix is positive definite.
             lam_psd_nugget: The nugget value to ensure positive definiteness.
             device: The device on which to evaluate the potential. Defaults to "cpu".
+            iid_batch_size: Maximum number of observations for which the score is
+                evaluated at once. If None, all observations are evaluated at once.
         """
-        super().__init__(vector_field_estimator, prior, device)
+        super().__init__(vector_field_estimator, prior, device, iid_batch_size)
         self.ensure_lam_psd = ensure_lam_psd
         self.lam_psd_nugget = lam_psd_nugget
 
@@ -426,44 +478,79 @@ class BaseGaussCorrectedScoreFunction(IIDScoreFunction):
         if time is None:
             time = torch.tensor([self.vector_field_estimator.t_min])
 
-        base_score = self.vector_field_estimator.score(
-            inputs, conditions, time, **kwargs
-        )
         prior_score = self.marginal_prior_score_fn(time, inputs)
 
         # Marginal prior precision
         prior_precision = self.marginal_denoising_prior_precision_fn(time, inputs)
-        # Marginal posterior variance estimates
-        posterior_precisions = self.marginal_denoising_posterior_precision_est_fn(
-            time,
-            inputs,
-            conditions,
-        )
+        # Marginal posterior variance estimates. Unless they depend on the inputs,
+        # they are estimated for all observations at once.
+        if not self.PRECISIONS_DEPEND_ON_INPUTS:
+            all_posterior_precisions = (
+                self.marginal_denoising_posterior_precision_est_fn(
+                    time, inputs, conditions
+                )
+            )
+
+        # The posterior scores and precisions only enter through their sums, which
+        # are accumulated over batches of observations.
+        sum_scores = sum_posterior_precisions = sum_weighted_posterior_scores = 0
+        for rows, batch in self.iid_batches(conditions):
+            base_score = self.vector_field_estimator.score(
+                inputs, batch, time, **kwargs
+            )
+            if self.PRECISIONS_DEPEND_ON_INPUTS:
+                posterior_precisions = (
+                    self.marginal_denoising_posterior_precision_est_fn(
+                        time, inputs, batch
+                    )
+                )
+            else:
+                posterior_precisions = all_posterior_precisions[:, rows]
+            weighted_posterior_scores = mv_diag_or_dense(
+                posterior_precisions, base_score, batch_dims=2
+            )
+            sum_scores = sum_scores + base_score.sum(dim=1, keepdim=True)
+            sum_posterior_precisions = sum_posterior_precisions + (
+                posterior_precisions.sum(dim=1, keepdim=True)
+            )
+            sum_weighted_posterior_scores = sum_weighted_posterior_scores + (
+                weighted_posterior_scores.sum(dim=1, keepdim=True)
+            )
 
         if self.ensure_lam_psd:
-            prior_precision, posterior_precisions = ensure_lam_positive_definite(
+            # The same correction is added to the precision of every observation.
+            correction = lam_psd_correction(
                 prior_precision,
-                posterior_precisions,
+                sum_posterior_precisions,  # type: ignore
                 N,
                 precision_nugget=self.lam_psd_nugget,
             )
+            sum_posterior_precisions = add_diag_or_dense(
+                sum_posterior_precisions,  # type: ignore
+                N * correction,
+                batch_dims=2,
+            )
+            sum_weighted_posterior_scores = sum_weighted_posterior_scores + (
+                mv_diag_or_dense(correction, sum_scores, batch_dims=2)  # type: ignore
+            )
 
         # Total precision
         term1 = (1 - N) * prior_precision
-        term2 = torch.sum(posterior_precisions, dim=1, keepdim=True)
-        Lam = add_diag_or_dense(term1, term2, batch_dims=2)
+        Lam = add_diag_or_dense(
+            term1,
+            sum_posterior_precisions,  # type: ignore
+            batch_dims=2,
+        )
 
         # Weighted scores
         weighted_prior_score = mv_diag_or_dense(
             prior_precision, prior_score, batch_dims=2
         )
-        weighted_posterior_scores = mv_diag_or_dense(
-            posterior_precisions, base_score, batch_dims=2
-        )
 
         # Accumulate the scores
         score = (1 - N) * weighted_prior_score.sum(dim=1) + torch.sum(
-            weighted_posterior_scores, dim=1
+            sum_weighted_posterior_scores,  # type: ignore
+            dim=1,
         )
 
         # Solve the linear system
@@ -483,6 +570,7 @@ class GaussCorrectedScoreFn(BaseGaussCorrectedScoreFunction):
         enable_lam_psd: bool = False,
         lam_psd_nugget: float = 0.01,
         device: Union[str, torch.device] = "cpu",
+        iid_batch_size: Optional[int] = None,
     ) -> None:
         r"""
         This extends the BaseGaussCorrectedScoreFunction to provide a simple method to
@@ -499,9 +587,16 @@ class GaussCorrectedScoreFn(BaseGaussCorrectedScoreFunction):
             enable_lam_psd: Whether to ensure the precision matrix is positive definite.
             lam_psd_nugget: The nugget value to ensure positive definiteness.
             device: The device on which to evaluate the potential. Defaults to "cpu".
+            iid_batch_size: Maximum number of observations for which the score is
+                evaluated at once. If None, all observations are evaluated at once.
         """
         super().__init__(
-            vector_field_estimator, prior, enable_lam_psd, lam_psd_nugget, device=device
+            vector_field_estimator,
+            prior,
+            enable_lam_psd,
+            lam_psd_nugget,
+            device=device,
+            iid_batch_size=iid_batch_size,
         )
 
         if posterior_precision is None:
@@ -567,6 +662,7 @@ class AutoGaussCorrectedScoreFn(BaseGaussCorrectedScoreFunction):
         precision_est_budget: Optional[int] = None,
         precision_initial_sampler_steps: int = 100,
         device: Union[str, torch.device] = "cpu",
+        iid_batch_size: Optional[int] = None,
     ) -> None:
         r"""
         This method extends the by estimating the posterior precision using
@@ -584,9 +680,16 @@ class AutoGaussCorrectedScoreFn(BaseGaussCorrectedScoreFunction):
             precision_est_budget: The budget for the precision estimation.
             precision_initial_sampler_steps: The number of initial sampler steps.
             device: The device on which to evaluate the potential. Defaults to "cpu".
+            iid_batch_size: Maximum number of observations for which the score is
+                evaluated at once. If None, all observations are evaluated at once.
         """
         super().__init__(
-            vector_field_estimator, prior, enable_lam_psd, lam_psd_nugget, device=device
+            vector_field_estimator,
+            prior,
+            enable_lam_psd,
+            lam_psd_nugget,
+            device=device,
+            iid_batch_size=iid_batch_size,
         )
         self.precision_est_only_diag = precision_est_only_diag
         self.precision_est_budget = precision_est_budget
@@ -596,23 +699,48 @@ class AutoGaussCorrectedScoreFn(BaseGaussCorrectedScoreFunction):
         r"""
         Estimates the posterior precision.
 
+        The estimate is cached per estimator, keyed by the state of the parameters of
+        the estimator, the prior, the content of `conditions` and the estimation
+        settings. Hence, it is computed only once for repeated sampling given the same
+        observations, and recomputed once the estimator is trained further.
+
         Args:
             conditions: Observed data.
 
         Returns:
             Estimated posterior precision.
         """
-        return self.estimate_posterior_precision(
-            self.vector_field_estimator,
+        estimator = self.vector_field_estimator
+        key = (
+            parameter_versions(estimator),
+            id(self.prior),
+            tensor_digest(conditions),
+            self.precision_est_only_diag,
+            self.precision_est_budget,
+            self.precision_initial_sampler_steps,
+        )
+        cache = _POSTERIOR_PRECISION_CACHE.setdefault(estimator, OrderedDict())
+        if key in cache:
+            prior_ref, precisions = cache[key]
+            # The id of a garbage-collected prior can be reused by a new prior.
+            if prior_ref() is self.prior:
+                cache.move_to_end(key)
+                return precisions
+
+        precisions = self.estimate_posterior_precision(
+            estimator,
             self.prior,
             conditions,
             precision_est_only_diag=self.precision_est_only_diag,
             precision_est_budget=self.precision_est_budget,
             precision_initial_sampler_steps=self.precision_initial_sampler_steps,
         )
+        cache[key] = (weakref.ref(self.prior), precisions)
+        if len(cache) > _POSTERIOR_PRECISION_CACHE_SIZE:
+            cache.popitem(last=False)
+        return precisions
 
     @classmethod
-    @functools.lru_cache()
     def estimate_posterior_precision(
         cls,
         vector_field_estimator: ConditionalVectorFieldEstimator,
@@ -640,9 +768,6 @@ class AutoGaussCorrectedScoreFn(BaseGaussCorrectedScoreFunction):
         Returns:
             Estimated posterior precision.
         """
-        # NOTE: This assumes that the objects dont change between calls to cache
-        # the results efficiently.
-
         # NOTE: To avoid circular imports :(
         from sbi.inference.posteriors.vector_field_posterior import VectorFieldPosterior
 
@@ -685,6 +810,8 @@ class JacCorrectedScoreFn(BaseGaussCorrectedScoreFunction):
     in some cases.
     """
 
+    PRECISIONS_DEPEND_ON_INPUTS = True
+
     def posterior_precision_est_fn(self, conditions: Tensor) -> Tensor:
         raise ValueError("This method does not use the posterior precision estimation.")
 
@@ -748,11 +875,42 @@ def ensure_lam_positive_definite(
         A tuple of (denoising_prior_precision, denoising_posterior_precision) where the
         posterior precision has been adjusted to be positive definite.
     """
+    correction = lam_psd_correction(
+        denoising_prior_precision,
+        torch.sum(denoising_posterior_precision, dim=1, keepdim=True),
+        N,
+        precision_nugget=precision_nugget,
+    )
+    denoising_posterior_precision = add_diag_or_dense(
+        denoising_posterior_precision, correction, batch_dims=2
+    )
+    return denoising_prior_precision, denoising_posterior_precision
+
+
+def lam_psd_correction(
+    denoising_prior_precision: torch.Tensor,
+    summed_denoising_posterior_precision: torch.Tensor,
+    N: int,
+    precision_nugget: float = 0.1,
+) -> torch.Tensor:
+    r"""
+    Returns the correction which, added to the posterior precision of each of the N
+    observations, ensures that the total precision matrix is positive definite.
+
+    Args:
+        denoising_prior_precision: The prior precision tensor.
+        summed_denoising_posterior_precision: The sum of the posterior precisions of
+            all observations, with the observations dimension kept.
+        N: The scaling factor used in the correction.
+        precision_nugget: The nugget value to ensure positive definiteness.
+
+    Returns:
+        The correction of the posterior precision.
+    """
     d = denoising_prior_precision.shape[-1]
 
     term1 = (1 - N) * denoising_prior_precision
-    term2 = torch.sum(denoising_posterior_precision, axis=1, keepdim=True)  # type: ignore
-    Lam = add_diag_or_dense(term1, term2, batch_dims=2)
+    Lam = add_diag_or_dense(term1, summed_denoising_posterior_precision, batch_dims=2)
 
     is_diag = Lam.ndim == 3
     if d > 1 and not is_diag:
@@ -768,18 +926,12 @@ def ensure_lam_positive_definite(
         Lam_corr += precision_nugget * torch.eye(
             Lam.shape[-1], device=Lam.device, dtype=Lam.dtype
         )
-
-        denoising_posterior_precision = add_diag_or_dense(
-            denoising_posterior_precision, Lam_corr, batch_dims=2
-        )
     else:
         # For one-dimensional case, treat Lam as a vector by putting it on the diagonal.
         Lam_diag = Lam
-        average_diff = (
+        Lam_corr = (
             torch.where(Lam_diag > 0, torch.zeros_like(Lam_diag), -Lam_diag) / (N - 1)
             + precision_nugget
         )
-        Lam_corr = average_diff
-        denoising_posterior_precision = denoising_posterior_precision + Lam_corr
 
-    return denoising_prior_precision, denoising_posterior_precision
+    return Lam_corr
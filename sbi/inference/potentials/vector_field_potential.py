@@ -83,8 +83,9 @@ class VectorFieldBasedPotential(BasePotential):
             iid_params: Parameters for the iid method, for arguments see
                 `IIDScoreFunction`.
             device: The device on which to evaluate the potential.
-            neural_ode_backend: The backend to use for the neural ODE. Currently,
-                only "zuko" is supported.
+            neural_ode_backend: The backend to use for the neural ODE. Either "zuko"
+                (adaptive solver) or "fixed_step" (fixed number of Runge-Kutta steps
+                and stochastic log-probabilities, faster but less exact).
             neural_ode_kwargs: Additional keyword arguments for the neural ODE.
         """
         self.vector_field_estimator = vector_field_estimator
@@ -122,6 +123,7 @@ class VectorFieldBasedPotential(BasePotential):
             self.prior.to(device)  # type: ignore
         if self._x_o is not None:
             self._x_o = self._x_o.to(device)
+            self.vector_field_estimator.cache_condition_embedding(self._x_o)
 
     def set_x(
         self,
@@ -134,7 +136,9 @@ class VectorFieldBasedPotential(BasePotential):
         """
         Set the observed data and whether it is IID.
 
-        Rebuilds the continuous normalizing flow if the observed data is set.
+        Rebuilds the continuous normalizing flow if the observed data is set, and
+        caches the embedding of the observed data, such that it is not recomputed in
+        every step of the ODE or SDE solvers.
 
         Args:
             x_o: The observed data.
@@ -148,6 +152,11 @@ class VectorFieldBasedPotential(BasePotential):
         super().set_x(x_o, x_is_iid)
         self.iid_method = iid_method
         self.iid_params = iid_params
+        if self._x_o is not None:
+            self.vector_field_estimator.eval()
+            self.vector_field_estimator.cache_condition_embedding(self._x_o)
+        else:
+            self.vector_field_estimator.clear_condition_embedding_cache()
         # NOTE: Once IID potential evaluation is supported. This needs to be adapted.
         # See #1450.
         if not x_is_iid and (self._x_o is not None):
@@ -190,13 +199,19 @@ class VectorFieldBasedPotential(BasePotential):
                 )
 
         theta = ensure_theta_batched(torch.as_tensor(theta))
+        x_batch_size = reshape_to_batch_event(
+            self.x_o, event_shape=self.vector_field_estimator.condition_shape
+        ).shape[0]
+        # A single `x` is evaluated at every `theta`, whereas multiple `x` are
+        # paired with the `theta` of the same batch index.
         theta_density_estimator = reshape_to_sample_batch_event(
-            theta, theta.shape[1:], leading_is_sample=True
+            theta, theta.shape[1:], leading_is_sample=x_batch_size == 1
         )
         self.vector_field_estimator.eval()
 
         with torch.set_grad_enabled(track_gradients):
-            log_probs = self.flow.log_prob(theta_density_estimator).squeeze(-1)
+            log_probs = self.flow.log_prob(theta_density_estimator)
+            log_probs = log_probs.squeeze(-1 if x_batch_size == 1 else 0)
             # Force probability to be zero outside prior support.
             in_prior_support = within_support(self.prior, theta)
 
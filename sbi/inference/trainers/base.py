@@ -1,21 +1,24 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
 
+import time
 from abc import ABC, abstractmethod
 from copy import deepcopy
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Callable, Dict, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from warnings import warn
 
 import torch
 from torch import Tensor
 from torch.distributions import Distribution
+from torch.optim.adam import Adam
 from torch.utils import data
-from torch.utils.data.sampler import SubsetRandomSampler
+from torch.utils.data.sampler import BatchSampler, SubsetRandomSampler
 from torch.utils.tensorboard.writer import SummaryWriter
 
 from sbi.inference.posteriors.base_posterior import NeuralPosterior
+from sbi.inference.trainers.trainer import Trainer
 from sbi.utils import (
     check_prior,
     get_log_root,
@@ -25,7 +28,7 @@ from sbi.utils import (
     validate_theta_and_x,
     warn_if_zscoring_changes_data,
 )
-from sbi.utils.sbiutils import get_simulations_since_round
+from sbi.utils.data_utils import DeviceDataLoader, RoundwiseDataset, SimulationBuffer
 from sbi.utils.simulation_utils import simulate_for_sbi
 from sbi.utils.torchutils import check_if_prior_on_device, process_device
 from sbi.utils.user_input_checks import (
@@ -34,6 +37,10 @@ from sbi.utils.user_input_checks import (
     process_simulator,
 )
 
+# Dataloader kwargs which change how samples are batched. If any of them is passed,
+# the dataloaders collate their batches sample by sample.
+_BATCHING_KWARGS = {"batch_size", "shuffle", "sampler", "drop_last", "collate_fn"}
+
 
 def infer(
     simulator: Callable,
@@ -162,11 +169,11 @@ class NeuralInference(ABC):
 
         self._show_progress_bars = show_progress_bars
 
-        # Initialize roundwise (theta, x, prior_masks) for storage of parameters,
-        # simulations and masks indicating if simulations came from prior.
-        self._theta_roundwise = []
-        self._x_roundwise = []
-        self._prior_masks = []
+        # Initialize storage of (theta, x, prior_masks), i.e. of parameters,
+        # simulations and masks indicating if simulations came from prior. The rounds
+        # are stored contiguously and can be accessed as views via `_theta_roundwise`,
+        # `_x_roundwise` and `_prior_masks`.
+        self._simulations = SimulationBuffer(("theta", "x", "prior_masks"))
         self._model_bank = []
 
         # Initialize list that indicates the round from which simulations were drawn.
@@ -174,6 +181,10 @@ class NeuralInference(ABC):
 
         self._round = 0
         self._val_loss = float("Inf")
+        self._lr_scheduler = None
+        # Compiled loss methods of `_compiled_net`, reused across calls to `train()`.
+        self._compiled_net = None
+        self._compiled_loss_fns = {}
 
         # XXX We could instantiate here the Posterior for all children. Two problems:
         #     1. We must dispatch to right PotentialProvider for mcmc based on name
@@ -207,21 +218,76 @@ class NeuralInference(ABC):
             warn_on_invalid: Whether to give out a warning if invalid simulations were
                 found.
 
-        Returns: Parameters, simulation outputs, prior masks.
+        Returns: Parameters, simulation outputs, prior masks. If the selected rounds
+            were appended one after another, these are views into the internal storage
+            (and not copies), so they should not be modified in place.
         """
 
-        theta = get_simulations_since_round(
-            self._theta_roundwise, self._data_round_index, starting_round
-        )
-        x = get_simulations_since_round(
-            self._x_roundwise, self._data_round_index, starting_round
-        )
-        prior_masks = get_simulations_since_round(
-            self._prior_masks, self._data_round_index, starting_round
-        )
+        rounds = [
+            i for i, r in enumerate(self._data_round_index) if r >= starting_round
+        ]
+        theta, x, prior_masks = self._simulations.get(rounds)
 
         return theta, x, prior_masks
 
+    def store_simulations_on_disk(
+        self, directory: Union[str, Path]
+    ) -> "NeuralInference":
+        r"""Store all appended $\theta$ and $x$ as memory-mapped `.npy` files.
+
+        Rounds that were already appended are moved to `directory`, and all rounds
+        appended later are written to it. During training, samples are read from the
+        files batch by batch, such that datasets larger than the available memory can
+        be used. Memory-mapped data lives on the CPU, irrespective of `data_device`;
+        batches are moved to the training device as usual.
+
+        Args:
+            directory: Directory in which to store the simulations. It is created if it
+                does not exist.
+
+        Returns:
+            NeuralInference object (returned so that this function is chainable).
+        """
+        self._simulations.to_disk(directory)
+        return self
+
+    @property
+    def _theta_roundwise(self) -> List[Tensor]:
+        return [self._simulations.round(i)[0] for i in range(len(self._simulations))]
+
+    @property
+    def _x_roundwise(self) -> List[Tensor]:
+        return [self._simulations.round(i)[1] for i in range(len(self._simulations))]
+
+    @property
+    def _prior_masks(self) -> List[Tensor]:
+        return [self._simulations.round(i)[2] for i in range(len(self._simulations))]
+
+    def _append_round(self, theta: Tensor, x: Tensor, prior_masks: Tensor):
+        """Stores the simulations of one call to `append_simulations`."""
+        self._simulations.append(theta, x, prior_masks)
+
+    def get_dataset(self, starting_round: int = 0) -> RoundwiseDataset:
+        r"""Returns a dataset of all $\theta$, $x$, and prior_masks from rounds >=
+        `starting_round`.
+
+        Unlike `get_simulations()`, the rounds are not concatenated, such that no copy
+        of the data is made.
+
+        Args:
+            starting_round: The earliest round to return samples from (we start counting
+                from zero).
+
+        Returns: Dataset which returns tuples of parameters, simulation outputs and
+            prior masks.
+        """
+        rounds = [
+            i for i, r in enumerate(self._data_round_index) if r >= starting_round
+        ]
+        return RoundwiseDataset(
+            *zip(*[self._simulations.round(i) for i in rounds], strict=True)
+        )
+
     @abstractmethod
     def append_simulations(
         self,
@@ -234,7 +300,8 @@ class NeuralInference(ABC):
     ) -> "NeuralInference":
         r"""Store parameters and simulation outputs to use them for later training.
 
-        Data are stored as entries in lists for each type of variable (parameter/data).
+        Data are stored in one contiguous buffer for each type of variable
+        (parameter/data), which grows as rounds are appended.
 
         Stores $\theta$, $x$, prior_masks (indicating if simulations are coming from the
         prior or not) and an index indicating which round the batch of simulations came
@@ -264,8 +331,10 @@ class NeuralInference(ABC):
 
         is_valid_x, num_nans, num_infs = handle_invalid_x(x, exclude_invalid_x)
 
-        x = x[is_valid_x]
-        theta = theta[is_valid_x]
+        # Only index if needed, such that e.g. memory-mapped data is not copied.
+        if not is_valid_x.all():
+            x = x[is_valid_x]
+            theta = theta[is_valid_x]
 
         # Check for problematic z-scoring
         warn_if_zscoring_changes_data(x)
@@ -281,9 +350,7 @@ class NeuralInference(ABC):
 
         prior_masks = mask_sims_from_prior(int(from_round), theta.size(0))
 
-        self._theta_roundwise.append(theta)
-        self._x_roundwise.append(x)
-        self._prior_masks.append(prior_masks)
+        self._append_round(theta, x, prior_masks)
 
         self._data_round_index.append(int(from_round))
 
@@ -313,7 +380,11 @@ class NeuralInference(ABC):
         validation_fraction: float = 0.1,
         resume_training: bool = False,
         dataloader_kwargs: Optional[dict] = None,
-    ) -> Tuple[data.DataLoader, data.DataLoader]:
+        device_dataloader: bool = False,
+    ) -> Tuple[
+        Union[data.DataLoader, DeviceDataLoader],
+        Union[data.DataLoader, DeviceDataLoader],
+    ]:
         """Return dataloaders for training and validation.
 
         Args:
@@ -322,20 +393,28 @@ class NeuralInference(ABC):
             resume_training: Whether the current call is resuming training so that no
                 new training and validation indices into the dataset have to be created.
             dataloader_kwargs: Additional or updated kwargs to be passed to the training
-                and validation dataloaders (like, e.g., a collate_fn).
+                and validation dataloaders (like, e.g., a collate_fn). If training on a
+                GPU with data stored on the CPU, `pin_memory` defaults to `True`. By
+                default, every batch is gathered from the dataset at once. If any of
+                `batch_size`, `shuffle`, `sampler`, `drop_last` or `collate_fn` is
+                passed, batches are collated sample by sample instead.
+            device_dataloader: Whether to move the training data to the training device
+                once and to draw batches by slicing a random permutation of the
+                training indices, instead of using a `torch.utils.data.DataLoader`.
+                This is typically much faster for small networks, but requires the data
+                to fit into the memory of the device. `dataloader_kwargs` are ignored.
 
         Returns:
             Tuple of dataloaders for training and validation.
 
         """
 
-        #
-        theta, x, prior_masks = self.get_simulations(starting_round)
-
-        dataset = data.TensorDataset(theta, x, prior_masks)
+        # Index into the rounds instead of concatenating them, such that the data
+        # (which may be memory-mapped) is not copied.
+        dataset = self.get_dataset(starting_round)
 
         # Get total number of training examples.
-        num_examples = theta.size(0)
+        num_examples = len(dataset)
         # Select random train and validation splits from (theta, x) pairs.
         num_training_examples = int((1 - validation_fraction) * num_examples)
         num_validation_examples = num_examples - num_training_examples
@@ -348,30 +427,173 @@ class NeuralInference(ABC):
                 permuted_indices[num_training_examples:],
             )
 
+        train_batch_size = min(training_batch_size, num_training_examples)
+        val_batch_size = min(training_batch_size, num_validation_examples)
+        train_sampler = SubsetRandomSampler(self.train_indices.tolist())
+        val_sampler = SubsetRandomSampler(self.val_indices.tolist())
         # Create training and validation loaders using a subset sampler.
         # Intentionally use dicts to define the default dataloader args
         # Then, use dataloader_kwargs to override (or add to) any of these defaults
         # https://stackoverflow.com/questions/44784577/in-method-call-args-how-to-override-keyword-argument-of-unpacked-dict
-        train_loader_kwargs = {
-            "batch_size": min(training_batch_size, num_training_examples),
-            "drop_last": True,
-            "sampler": SubsetRandomSampler(self.train_indices.tolist()),
-        }
-        val_loader_kwargs = {
-            "batch_size": min(training_batch_size, num_validation_examples),
-            "shuffle": False,
-            "drop_last": True,
-            "sampler": SubsetRandomSampler(self.val_indices.tolist()),
-        }
+        user_batching = _BATCHING_KWARGS & set(dataloader_kwargs or {})
+        if user_batching:
+            # Batches are collated sample by sample, as requested by the user.
+            train_loader_kwargs = {
+                "batch_size": train_batch_size,
+                "drop_last": True,
+                "sampler": train_sampler,
+            }
+            val_loader_kwargs = {
+                "batch_size": val_batch_size,
+                "shuffle": False,
+                "drop_last": True,
+                "sampler": val_sampler,
+            }
+        else:
+            # Every batch of indices is gathered at once by the dataset, which reads
+            # only the selected rows of every round, instead of sample by sample.
+            train_loader_kwargs = {
+                "batch_size": None,
+                "sampler": BatchSampler(
+                    train_sampler, train_batch_size, drop_last=True
+                ),
+            }
+            val_loader_kwargs = {
+                "batch_size": None,
+                "sampler": BatchSampler(val_sampler, val_batch_size, drop_last=True),
+            }
+        # Batches in pinned memory can be copied to the GPU without blocking the host.
+        if self._device.startswith("cuda") and dataset[0][0].device.type == "cpu":
+            train_loader_kwargs["pin_memory"] = True
+            val_loader_kwargs["pin_memory"] = True
         if dataloader_kwargs is not None:
             train_loader_kwargs = dict(train_loader_kwargs, **dataloader_kwargs)
             val_loader_kwargs = dict(val_loader_kwargs, **dataloader_kwargs)
 
+        if device_dataloader:
+            # Views of the stored rounds, which are only copied if they are not on
+            # the training device yet.
+            tensors = [t.to(self._device) for t in self.get_simulations(starting_round)]
+            train_loader = DeviceDataLoader(
+                tensors, self.train_indices, train_batch_size
+            )
+            val_loader = DeviceDataLoader(
+                tensors, self.val_indices, val_batch_size, shuffle=False
+            )
+            return train_loader, val_loader
+
         train_loader = data.DataLoader(dataset, **train_loader_kwargs)
         val_loader = data.DataLoader(dataset, **val_loader_kwargs)
 
         return train_loader, val_loader
 
+    def _get_trainer(
+        self,
+        learning_rate: float,
+        clip_max_norm: Optional[float],
+        resume_training: bool,
+        trainer_kwargs: Optional[Dict] = None,
+    ) -> Trainer:
+        """Return the training engine for `self._neural_net`.
+
+        Unless training is resumed, a new optimizer (and learning rate scheduler) is
+        created and the epoch count is reset.
+
+        Args:
+            learning_rate: Learning rate for Adam optimizer.
+            clip_max_norm: Value at which to clip the total gradient norm.
+            resume_training: Whether to continue with the optimizer, learning rate
+                scheduler and epoch count of the last call to `train()`.
+            trainer_kwargs: Additional kwargs passed to the `Trainer`. Instead of a
+                scheduler, `lr_scheduler` has to be a function that takes the optimizer
+                and returns the scheduler, e.g.
+                `functools.partial(torch.optim.lr_scheduler.StepLR, step_size=10)`.
+
+        Returns:
+            Trainer which runs the epochs.
+        """
+        assert self._neural_net is not None
+        trainer_kwargs = dict(trainer_kwargs or {})
+        lr_scheduler = trainer_kwargs.pop("lr_scheduler", None)
+        if resume_training and lr_scheduler is not None:
+            warn(
+                "`lr_scheduler` is ignored when resuming training. The learning rate "
+                "scheduler of the previous call to `train()` is continued.",
+                stacklevel=3,
+            )
+
+        if self._compiled_net is not self._neural_net:
+            self._compiled_net, self._compiled_loss_fns = self._neural_net, {}
+
+        if not resume_training:
+            self.optimizer = Adam(list(self._neural_net.parameters()), lr=learning_rate)
+            self._lr_scheduler = (
+                None if lr_scheduler is None else lr_scheduler(self.optimizer)
+            )
+            self.epoch, self._val_loss = 0, float("Inf")
+
+        return Trainer(
+            self._neural_net,
+            self.optimizer,
+            clip_max_norm=clip_max_norm,
+            lr_scheduler=self._lr_scheduler,
+            compiled_loss_fns=self._compiled_loss_fns,
+            **trainer_kwargs,
+        )
+
+    def _run_training_loop(
+        self,
+        trainer: Trainer,
+        train_loader: Any,
+        val_loader: Any,
+        loss_fn: Callable[[Any], Tensor],
+        max_num_epochs: int,
+        stop_after_epochs: int,
+        val_loss_fn: Optional[Callable[[Any], Tensor]] = None,
+        ema_loss_decay: Optional[float] = None,
+    ) -> None:
+        """Train until convergence (or `max_num_epochs`) and log the losses.
+
+        Args:
+            trainer: Training engine.
+            train_loader: Dataloader for training.
+            val_loader: Dataloader for validation.
+            loss_fn: Function which returns the losses of a batch.
+            max_num_epochs: Maximum number of epochs to run.
+            stop_after_epochs: The number of epochs to wait for improvement on the
+                validation set before terminating training.
+            val_loss_fn: Function which returns the validation losses of a batch,
+                defaults to `loss_fn`.
+            ema_loss_decay: If given, an exponential moving average of the training
+                and validation losses (with this decay) is logged and used for
+                checking convergence.
+        """
+        val_loss_fn = loss_fn if val_loss_fn is None else val_loss_fn
+
+        def smooth(loss: float, key: str) -> float:
+            if ema_loss_decay is None or len(self._summary[key]) == 0:
+                return loss
+            previous_loss = self._summary[key][-1]
+            return (1.0 - ema_loss_decay) * previous_loss + ema_loss_decay * loss
+
+        while self.epoch <= max_num_epochs and not self._converged(
+            self.epoch, stop_after_epochs
+        ):
+            epoch_start_time = time.time()
+            train_loss = trainer.train_epoch(train_loader, loss_fn)
+            self.epoch += 1
+            self._summary["training_loss"].append(smooth(train_loss, "training_loss"))
+
+            val_loss = trainer.validate(val_loader, val_loss_fn)
+            self._val_loss = smooth(val_loss, "validation_loss")
+            self._summary["validation_loss"].append(self._val_loss)
+            self._summary["epoch_durations_sec"].append(time.time() - epoch_start_time)
+
+            trainer.end_epoch(self.epoch, train_loss, val_loss)
+            self._maybe_show_progress(self._show_progress_bars, self.epoch)
+
+        self._report_convergence_at_end(self.epoch, stop_after_epochs, max_num_epochs)
+
     def _converged(self, epoch: int, stop_after_epochs: int) -> bool:
         """Return whether the training converged yet and save best model state so far.
 
@@ -550,6 +772,9 @@ class NeuralInference(ABC):
                 dict_to_save[key] = None
             else:
                 dict_to_save[key] = self.__dict__[key]
+        # Compiled functions can not be pickled, they are recompiled when needed.
+        dict_to_save["_compiled_net"] = None
+        dict_to_save["_compiled_loss_fns"] = {}
         return dict_to_save
 
     def __setstate__(self, state_dict: Dict):
@@ -562,6 +787,20 @@ class NeuralInference(ABC):
             state_dict: State to be restored.
         """
         state_dict["_summary_writer"] = self._default_summary_writer()
+        # Objects pickled with earlier versions of sbi store the rounds in lists.
+        if "_simulations" not in state_dict:
+            simulations = SimulationBuffer(("theta", "x", "prior_masks"))
+            for round_ in zip(
+                state_dict.pop("_theta_roundwise"),
+                state_dict.pop("_x_roundwise"),
+                state_dict.pop("_prior_masks"),
+                strict=True,
+            ):
+                simulations.append(*round_)
+            state_dict["_simulations"] = simulations
+        state_dict.setdefault("_lr_scheduler", None)
+        state_dict.setdefault("_compiled_net", None)
+        state_dict.setdefault("_compiled_loss_fns", {})
         self.__dict__ = state_dict
 
 
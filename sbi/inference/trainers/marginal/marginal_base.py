@@ -9,19 +9,23 @@ from typing import Any, Callable, Optional, Tuple, Union
 
 import torch
 from torch import Tensor
-from torch.nn.utils.clip_grad import clip_grad_norm_
 from torch.optim.adam import Adam
 from torch.utils import data
 from torch.utils.data.sampler import SubsetRandomSampler
 from torch.utils.tensorboard.writer import SummaryWriter
 
+from sbi.inference.trainers.trainer import Trainer
 from sbi.neural_nets.estimators import UnconditionalDensityEstimator
 from sbi.neural_nets.estimators.shape_handling import (
     reshape_to_batch_event,
 )
 from sbi.neural_nets.factory import ZukoFlowType, marginal_nn
 from sbi.utils import check_estimator_arg, get_log_root
-from sbi.utils.torchutils import assert_all_finite, process_device
+from sbi.utils.torchutils import (
+    assert_all_finite,
+    move_to_device,
+    process_device,
+)
 
 DensityEstimatorType = Union[ZukoFlowType, str, Callable[[Tensor], Any]]
 
@@ -131,6 +135,10 @@ class MarginalTrainer:
             "drop_last": True,
             "sampler": SubsetRandomSampler(self.val_indices.tolist()),
         }
+        # Batches in pinned memory can be copied to the GPU without blocking the host.
+        if self._device.startswith("cuda") and x.device.type == "cpu":
+            train_loader_kwargs["pin_memory"] = True
+            val_loader_kwargs["pin_memory"] = True
         if dataloader_kwargs is not None:
             train_loader_kwargs = dict(train_loader_kwargs, **dataloader_kwargs)
             val_loader_kwargs = dict(val_loader_kwargs, **dataloader_kwargs)
@@ -174,6 +182,7 @@ class MarginalTrainer:
         max_num_epochs: int = 2**31 - 1,
         clip_max_norm: Optional[float] = 5.0,
         dataloader_kwargs: Optional[dict] = None,
+        trainer_kwargs: Optional[dict] = None,
     ) -> UnconditionalDensityEstimator:
         r"""Return density estimator that approximates the distribution $p(x)$.
 
@@ -192,6 +201,10 @@ class MarginalTrainer:
                 loss after the training.
             dataloader_kwargs: Additional or updated kwargs to be passed to the training
                 and validation dataloaders (like, e.g., a collate_fn)
+            trainer_kwargs: Additional kwargs for the training engine (see `Trainer`),
+                e.g. `mixed_precision`, `compile`, `gradient_accumulation_steps`,
+                `lr_scheduler` (a function that takes the optimizer and returns a
+                learning rate scheduler) and `callbacks`.
 
         Returns:
             Density estimator that approximates the distribution $p(\theta|x)$.
@@ -215,59 +228,40 @@ class MarginalTrainer:
                 x[self.train_indices].to("cpu"),
             )
 
+        self._neural_net.to(self._device)
+        trainer_kwargs = dict(trainer_kwargs or {})
+        lr_scheduler = trainer_kwargs.pop("lr_scheduler", None)
         self.optimizer = Adam(list(self._neural_net.parameters()), lr=learning_rate)
         self.epoch, self._val_loss = 0, float("Inf")
+        trainer = Trainer(
+            self._neural_net,
+            self.optimizer,
+            clip_max_norm=clip_max_norm,
+            lr_scheduler=None if lr_scheduler is None else lr_scheduler(self.optimizer),
+            **trainer_kwargs,
+        )
+
+        loss = trainer.compiled(self.loss)
+
+        def loss_fn(batch) -> Tensor:
+            # Get batches on current device.
+            (x_batch,) = move_to_device(batch, self._device)
+            return loss(x_batch)
 
-        self._neural_net.to(self._device)
         while self.epoch <= max_num_epochs and not self._converged(
             self.epoch, stop_after_epochs
         ):
-            # Train for a single epoch.
-            self._neural_net.train()
-            train_loss_sum = 0
             epoch_start_time = time.time()
-            for batch in train_loader:
-                self.optimizer.zero_grad()
-                # Get batches on current device.
-                x_batch = batch[0].to(self._device)
-
-                train_losses = self.loss(x_batch)
-                train_loss = torch.mean(train_losses)
-                train_loss_sum += train_losses.sum().item()
-
-                train_loss.backward()
-                if clip_max_norm is not None:
-                    clip_grad_norm_(
-                        self._neural_net.parameters(), max_norm=clip_max_norm
-                    )
-                self.optimizer.step()
-
+            train_loss = trainer.train_epoch(train_loader, loss_fn)
             self.epoch += 1
+            self._summary["training_loss"].append(train_loss)
 
-            train_loss_average = train_loss_sum / (
-                len(train_loader) * train_loader.batch_size  # type: ignore
-            )
-            self._summary["training_loss"].append(train_loss_average)
-
-            # Calculate validation performance.
-            self._neural_net.eval()
-            val_loss_sum = 0
-
-            with torch.no_grad():
-                for batch in val_loader:
-                    x_batch = batch[0].to(self._device)
-                    # Take negative loss here to get validation log_prob.
-                    val_losses = self.loss(x_batch)
-                    val_loss_sum += val_losses.sum().item()
-
-            # Take mean over all validation samples.
-            self._val_loss = val_loss_sum / (
-                len(val_loader) * val_loader.batch_size  # type: ignore
-            )
+            self._val_loss = trainer.validate(val_loader, loss_fn)
             # Log validation loss for every epoch.
             self._summary["validation_loss"].append(self._val_loss)
             self._summary["epoch_durations_sec"].append(time.time() - epoch_start_time)
 
+            trainer.end_epoch(self.epoch, train_loss, self._val_loss)
             self._maybe_show_progress(self._show_progress_bars, self.epoch)
 
         # Update summary.
@@ -80,6 +80,8 @@ class MNLE(LikelihoodEstimator):
         retrain_from_scratch: bool = False,
         show_train_summary: bool = False,
         dataloader_kwargs: Optional[Dict] = None,
+        device_dataloader: bool = False,
+        trainer_kwargs: Optional[Dict] = None,
     ) -> MixedDensityEstimator:
         density_estimator = super().train(
             **del_entries(locals(), entries=("self", "__class__"))
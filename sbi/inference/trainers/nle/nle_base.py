@@ -6,11 +6,8 @@ from abc import ABC
 from copy import deepcopy
 from typing import Any, Callable, Dict, Optional, Union
 
-import torch
 from torch import Tensor
 from torch.distributions import Distribution
-from torch.nn.utils.clip_grad import clip_grad_norm_
-from torch.optim.adam import Adam
 from torch.utils.tensorboard.writer import SummaryWriter
 
 from sbi.inference.posteriors import MCMCPosterior, RejectionPosterior, VIPosterior
@@ -23,7 +20,7 @@ from sbi.neural_nets.estimators.shape_handling import (
     reshape_to_batch_event,
 )
 from sbi.utils import check_estimator_arg, check_prior, x_shape_from_simulation
-from sbi.utils.torchutils import assert_all_finite
+from sbi.utils.torchutils import assert_all_finite, move_to_device
 
 
 class LikelihoodEstimator(NeuralInference, ABC):
@@ -139,6 +136,8 @@ class LikelihoodEstimator(NeuralInference, ABC):
         retrain_from_scratch: bool = False,
         show_train_summary: bool = False,
         dataloader_kwargs: Optional[Dict] = None,
+        device_dataloader: bool = False,
+        trainer_kwargs: Optional[Dict] = None,
     ) -> ConditionalDensityEstimator:
         r"""Train the density estimator to learn the distribution $p(x|\theta)$.
 
@@ -166,6 +165,15 @@ class LikelihoodEstimator(NeuralInference, ABC):
                 loss after the training.
             dataloader_kwargs: Additional or updated kwargs to be passed to the training
                 and validation dataloaders (like, e.g., a collate_fn)
+            device_dataloader: Whether to move the training data to the training device
+                once and to draw batches by slicing a random permutation of the
+                training indices, instead of using a `torch.utils.data.DataLoader`.
+                This is typically much faster for small networks, but requires the data
+                to fit into the memory of the device. `dataloader_kwargs` are ignored.
+            trainer_kwargs: Additional kwargs for the training engine (see `Trainer`),
+                e.g. `mixed_precision`, `compile`, `gradient_accumulation_steps`,
+                `lr_scheduler` (a function that takes the optimizer and returns a
+                learning rate scheduler) and `callbacks`.
 
         Returns:
             Density estimator that has learned the distribution $p(x|\theta)$.
@@ -181,6 +189,7 @@ class LikelihoodEstimator(NeuralInference, ABC):
             validation_fraction,
             resume_training,
             dataloader_kwargs=dataloader_kwargs,
+            device_dataloader=device_dataloader,
         )
 
         # First round or if retraining from scratch:
@@ -189,81 +198,36 @@ class LikelihoodEstimator(NeuralInference, ABC):
         # This is passed into NeuralPosterior, to create a neural posterior which
         # can `sample()` and `log_prob()`. The network is accessible via `.net`.
         if self._neural_net is None or retrain_from_scratch:
-            # Get theta,x to initialize NN
-            theta, x, _ = self.get_simulations(starting_round=start_idx)
-            # Use only training data for building the neural net (z-scoring transforms)
-            self._neural_net = self._build_neural_net(
-                theta[self.train_indices].to("cpu"),
-                x[self.train_indices].to("cpu"),
-            )
+            # Get theta,x to initialize NN. Use only training data for building the
+            # neural net (z-scoring transforms), gathered without concatenating rounds.
+            train_indices = self.train_indices.sort().values
+            theta, x, _ = self.get_dataset(start_idx)[train_indices]
+            self._neural_net = self._build_neural_net(theta.to("cpu"), x.to("cpu"))
             assert len(x_shape_from_simulation(x.to("cpu"))) < 3, (
                 "SNLE cannot handle multi-dimensional simulator output."
             )
             del theta, x
 
         self._neural_net.to(self._device)
-        if not resume_training:
-            self.optimizer = Adam(
-                list(self._neural_net.parameters()),
-                lr=learning_rate,
-            )
-            self.epoch, self._val_loss = 0, float("Inf")
-
-        while self.epoch <= max_num_epochs and not self._converged(
-            self.epoch, stop_after_epochs
-        ):
-            # Train for a single epoch.
-            self._neural_net.train()
-            train_loss_sum = 0
-            for batch in train_loader:
-                self.optimizer.zero_grad()
-                theta_batch, x_batch = (
-                    batch[0].to(self._device),
-                    batch[1].to(self._device),
-                )
-                # Evaluate on x with theta as context.
-                train_losses = self._loss(theta=theta_batch, x=x_batch)
-                train_loss = torch.mean(train_losses)
-                train_loss_sum += train_losses.sum().item()
-
-                train_loss.backward()
-                if clip_max_norm is not None:
-                    clip_grad_norm_(
-                        self._neural_net.parameters(),
-                        max_norm=clip_max_norm,
-                    )
-                self.optimizer.step()
-
-            self.epoch += 1
-
-            train_loss_average = train_loss_sum / (
-                len(train_loader) * train_loader.batch_size  # type: ignore
-            )
-            self._summary["training_loss"].append(train_loss_average)
-
-            # Calculate validation performance.
-            self._neural_net.eval()
-            val_loss_sum = 0
-            with torch.no_grad():
-                for batch in val_loader:
-                    theta_batch, x_batch = (
-                        batch[0].to(self._device),
-                        batch[1].to(self._device),
-                    )
-                    # Evaluate on x with theta as context.
-                    val_losses = self._loss(theta=theta_batch, x=x_batch)
-                    val_loss_sum += val_losses.sum().item()
-
-            # Take mean over all validation samples.
-            self._val_loss = val_loss_sum / (
-                len(val_loader) * val_loader.batch_size  # type: ignore
-            )
-            # Log validation loss for every epoch.
-            self._summary["validation_loss"].append(self._val_loss)
+        trainer = self._get_trainer(
+            learning_rate, clip_max_norm, resume_training, trainer_kwargs
+        )
+
+        loss = trainer.compiled(self._loss)
 
-            self._maybe_show_progress(self._show_progress_bars, self.epoch)
+        def loss_fn(batch) -> Tensor:
+            theta_batch, x_batch = move_to_device(batch[:2], self._device)
+            # Evaluate on x with theta as context.
+            return loss(theta=theta_batch, x=x_batch)
 
-        self._report_convergence_at_end(self.epoch, stop_after_epochs, max_num_epochs)
+        self._run_training_loop(
+            trainer,
+            train_loader,
+            val_loader,
+            loss_fn,
+            max_num_epochs=max_num_epochs,
+            stop_after_epochs=stop_after_epochs,
+        )
 
         # Update summary.
         self._summary["epochs_trained"].append(self.epoch)
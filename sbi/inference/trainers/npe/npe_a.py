@@ -121,6 +121,8 @@ class NPE_A(PosteriorEstimator):
         show_train_summary: bool = False,
         dataloader_kwargs: Optional[Dict] = None,
         component_perturbation: float = 5e-3,
+        device_dataloader: bool = False,
+        trainer_kwargs: Optional[Dict] = None,
     ) -> ConditionalDensityEstimator:
         r"""Return density estimator that approximates the proposal posterior.
 
@@ -165,6 +167,15 @@ class NPE_A(PosteriorEstimator):
                 biases when, in the last round, the Mixture of Gaussians is build from
                 a single Gaussian. This value can be problem-specific and also depends
                 on the number of mixture components.
+            device_dataloader: Whether to move the training data to the training device
+                once and to draw batches by slicing a random permutation of the
+                training indices, instead of using a `torch.utils.data.DataLoader`.
+                This is typically much faster for small networks, but requires the data
+                to fit into the memory of the device. `dataloader_kwargs` are ignored.
+            trainer_kwargs: Additional kwargs for the training engine (see `Trainer`),
+                e.g. `mixed_precision`, `compile`, `gradient_accumulation_steps`,
+                `lr_scheduler` (a function that takes the optimizer and returns a
+                learning rate scheduler) and `callbacks`.
 
         Returns:
             Density estimator that approximates the distribution $p(\theta|x)$.
@@ -1,17 +1,13 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
 
-import time
 from abc import ABC, abstractmethod
 from copy import deepcopy
 from typing import Any, Callable, Dict, Optional, Union
 from warnings import warn
 
-import torch
 from torch import Tensor, ones
 from torch.distributions import Distribution
-from torch.nn.utils.clip_grad import clip_grad_norm_
-from torch.optim.adam import Adam
 from torch.utils.tensorboard.writer import SummaryWriter
 
 from sbi.inference.posteriors import (
@@ -42,7 +38,7 @@ from sbi.utils import (
     warn_if_zscoring_changes_data,
 )
 from sbi.utils.sbiutils import ImproperEmpirical, mask_sims_from_prior
-from sbi.utils.torchutils import assert_all_finite
+from sbi.utils.torchutils import assert_all_finite, move_to_device
 
 
 class PosteriorEstimator(NeuralInference, ABC):
@@ -163,8 +159,10 @@ class PosteriorEstimator(NeuralInference, ABC):
             x, exclude_invalid_x=exclude_invalid_x
         )
 
-        x = x[is_valid_x]
-        theta = theta[is_valid_x]
+        # Only index if needed, such that e.g. memory-mapped data is not copied.
+        if not is_valid_x.all():
+            x = x[is_valid_x]
+            theta = theta[is_valid_x]
 
         # Check for problematic z-scoring
         warn_if_zscoring_changes_data(x)
@@ -189,9 +187,7 @@ class PosteriorEstimator(NeuralInference, ABC):
         self._data_round_index.append(current_round)
         prior_masks = mask_sims_from_prior(int(current_round > 0), theta.size(0))
 
-        self._theta_roundwise.append(theta)
-        self._x_roundwise.append(x)
-        self._prior_masks.append(prior_masks)
+        self._append_round(theta, x, prior_masks)
 
         self._proposal_roundwise.append(proposal)
 
@@ -228,6 +224,8 @@ class PosteriorEstimator(NeuralInference, ABC):
         retrain_from_scratch: bool = False,
         show_train_summary: bool = False,
         dataloader_kwargs: Optional[dict] = None,
+        device_dataloader: bool = False,
+        trainer_kwargs: Optional[dict] = None,
     ) -> ConditionalDensityEstimator:
         r"""Return density estimator that approximates the distribution $p(\theta|x)$.
 
@@ -261,6 +259,15 @@ class PosteriorEstimator(NeuralInference, ABC):
                 loss after the training.
             dataloader_kwargs: Additional or updated kwargs to be passed to the training
                 and validation dataloaders (like, e.g., a collate_fn)
+            device_dataloader: Whether to move the training data to the training device
+                once and to draw batches by slicing a random permutation of the
+                training indices, instead of using a `torch.utils.data.DataLoader`.
+                This is typically much faster for small networks, but requires the data
+                to fit into the memory of the device. `dataloader_kwargs` are ignored.
+            trainer_kwargs: Additional kwargs for the training engine (see `Trainer`),
+                e.g. `mixed_precision`, `compile`, `gradient_accumulation_steps`,
+                `lr_scheduler` (a function that takes the optimizer and returns a
+                learning rate scheduler) and `callbacks`.
 
         Returns:
             Density estimator that approximates the distribution $p(\theta|x)$.
@@ -313,6 +320,7 @@ class PosteriorEstimator(NeuralInference, ABC):
             validation_fraction,
             resume_training,
             dataloader_kwargs=dataloader_kwargs,
+            device_dataloader=device_dataloader,
         )
         # First round or if retraining from scratch:
         # Call the `self._build_neural_net` with the rounds' thetas and xs as
@@ -320,14 +328,11 @@ class PosteriorEstimator(NeuralInference, ABC):
         # This is passed into NeuralPosterior, to create a neural posterior which
         # can `sample()` and `log_prob()`. The network is accessible via `.net`.
         if self._neural_net is None or retrain_from_scratch:
-            # Get theta,x to initialize NN
-            theta, x, _ = self.get_simulations(starting_round=start_idx)
-            # Use only training data for building the neural net (z-scoring transforms)
-
-            self._neural_net = self._build_neural_net(
-                theta[self.train_indices].to("cpu"),
-                x[self.train_indices].to("cpu"),
-            )
+            # Get theta,x to initialize NN. Use only training data for building the
+            # neural net (z-scoring transforms), gathered without concatenating rounds.
+            train_indices = self.train_indices.sort().values
+            theta, x, _ = self.get_dataset(start_idx)[train_indices]
+            self._neural_net = self._build_neural_net(theta.to("cpu"), x.to("cpu"))
 
             theta = reshape_to_sample_batch_event(
                 theta.to("cpu"), self._neural_net.input_shape
@@ -340,84 +345,32 @@ class PosteriorEstimator(NeuralInference, ABC):
         # Move entire net to device for training.
         self._neural_net.to(self._device)
 
-        if not resume_training:
-            self.optimizer = Adam(list(self._neural_net.parameters()), lr=learning_rate)
-            self.epoch, self._val_loss = 0, float("Inf")
-
-        while self.epoch <= max_num_epochs and not self._converged(
-            self.epoch, stop_after_epochs
-        ):
-            # Train for a single epoch.
-            self._neural_net.train()
-            train_loss_sum = 0
-            epoch_start_time = time.time()
-            for batch in train_loader:
-                self.optimizer.zero_grad()
-                # Get batches on current device.
-                theta_batch, x_batch, masks_batch = (
-                    batch[0].to(self._device),
-                    batch[1].to(self._device),
-                    batch[2].to(self._device),
-                )
-
-                train_losses = self._loss(
-                    theta_batch,
-                    x_batch,
-                    masks_batch,
-                    proposal,
-                    calibration_kernel,
-                    force_first_round_loss=force_first_round_loss,
-                )
-                train_loss = torch.mean(train_losses)
-                train_loss_sum += train_losses.sum().item()
-
-                train_loss.backward()
-                if clip_max_norm is not None:
-                    clip_grad_norm_(
-                        self._neural_net.parameters(), max_norm=clip_max_norm
-                    )
-                self.optimizer.step()
-
-            self.epoch += 1
-
-            train_loss_average = train_loss_sum / (
-                len(train_loader) * train_loader.batch_size  # type: ignore
-            )
-            self._summary["training_loss"].append(train_loss_average)
-
-            # Calculate validation performance.
-            self._neural_net.eval()
-            val_loss_sum = 0
-
-            with torch.no_grad():
-                for batch in val_loader:
-                    theta_batch, x_batch, masks_batch = (
-                        batch[0].to(self._device),
-                        batch[1].to(self._device),
-                        batch[2].to(self._device),
-                    )
-                    # Take negative loss here to get validation log_prob.
-                    val_losses = self._loss(
-                        theta_batch,
-                        x_batch,
-                        masks_batch,
-                        proposal,
-                        calibration_kernel,
-                        force_first_round_loss=force_first_round_loss,
-                    )
-                    val_loss_sum += val_losses.sum().item()
+        trainer = self._get_trainer(
+            learning_rate, clip_max_norm, resume_training, trainer_kwargs
+        )
 
-            # Take mean over all validation samples.
-            self._val_loss = val_loss_sum / (
-                len(val_loader) * val_loader.batch_size  # type: ignore
+        loss = trainer.compiled(self._loss)
+
+        def loss_fn(batch) -> Tensor:
+            # Get batches on current device.
+            theta_batch, x_batch, masks_batch = move_to_device(batch, self._device)
+            return loss(
+                theta_batch,
+                x_batch,
+                masks_batch,
+                proposal,
+                calibration_kernel,
+                force_first_round_loss=force_first_round_loss,
             )
-            # Log validation loss for every epoch.
-            self._summary["validation_loss"].append(self._val_loss)
-            self._summary["epoch_durations_sec"].append(time.time() - epoch_start_time)
 
-            self._maybe_show_progress(self._show_progress_bars, self.epoch)
-
-        self._report_convergence_at_end(self.epoch, stop_after_epochs, max_num_epochs)
+        self._run_training_loop(
+            trainer,
+            train_loader,
+            val_loader,
+            loss_fn,
+            max_num_epochs=max_num_epochs,
+            stop_after_epochs=stop_after_epochs,
+        )
 
         # Update summary.
         self._summary["epochs_trained"].append(self.epoch)
@@ -113,6 +113,8 @@ class NPE_C(PosteriorEstimator):
         retrain_from_scratch: bool = False,
         show_train_summary: bool = False,
         dataloader_kwargs: Optional[Dict] = None,
+        device_dataloader: bool = False,
+        trainer_kwargs: Optional[Dict] = None,
     ) -> nn.Module:
         r"""Return density estimator that approximates the distribution $p(\theta|x)$.
 
@@ -151,6 +153,15 @@ class NPE_C(PosteriorEstimator):
                 loss and leakage after the training.
             dataloader_kwargs: Additional or updated kwargs to be passed to the training
                 and validation dataloaders (like, e.g., a collate_fn)
+            device_dataloader: Whether to move the training data to the training device
+                once and to draw batches by slicing a random permutation of the
+                training indices, instead of using a `torch.utils.data.DataLoader`.
+                This is typically much faster for small networks, but requires the data
+                to fit into the memory of the device. `dataloader_kwargs` are ignored.
+            trainer_kwargs: Additional kwargs for the training engine (see `Trainer`),
+                e.g. `mixed_precision`, `compile`, `gradient_accumulation_steps`,
+                `lr_scheduler` (a function that takes the optimizer and returns a
+                learning rate scheduler) and `callbacks`.
 
         Returns:
             Density estimator that approximates the distribution $p(\theta|x)$.
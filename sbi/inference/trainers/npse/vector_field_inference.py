@@ -1,7 +1,6 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
 
-import time
 from abc import ABC, abstractmethod
 from copy import deepcopy
 from typing import Any, Callable, Optional, Protocol, Union
@@ -9,8 +8,6 @@ from typing import Any, Callable, Optional, Protocol, Union
 import torch
 from torch import Tensor, ones
 from torch.distributions import Distribution
-from torch.nn.utils.clip_grad import clip_grad_norm_
-from torch.optim.adam import Adam
 from torch.utils.tensorboard.writer import SummaryWriter
 
 from sbi import utils as utils
@@ -29,7 +26,7 @@ from sbi.utils import (
     warn_if_zscoring_changes_data,
 )
 from sbi.utils.sbiutils import ImproperEmpirical, mask_sims_from_prior
-from sbi.utils.torchutils import assert_all_finite
+from sbi.utils.torchutils import assert_all_finite, move_to_device
 
 
 class VectorFieldEstimatorBuilder(Protocol):
@@ -169,8 +166,10 @@ class VectorFieldInference(NeuralInference, ABC):
             x, exclude_invalid_x=exclude_invalid_x
         )
 
-        x = x[is_valid_x]
-        theta = theta[is_valid_x]
+        # Only index if needed, such that e.g. memory-mapped data is not copied.
+        if not is_valid_x.all():
+            x = x[is_valid_x]
+            theta = theta[is_valid_x]
 
         # Check for problematic z-scoring
         warn_if_zscoring_changes_data(x)
@@ -185,9 +184,7 @@ class VectorFieldInference(NeuralInference, ABC):
         self._data_round_index.append(current_round)
         prior_masks = mask_sims_from_prior(int(current_round > 0), theta.size(0))
 
-        self._theta_roundwise.append(theta)
-        self._x_roundwise.append(x)
-        self._prior_masks.append(prior_masks)
+        self._append_round(theta, x, prior_masks)
 
         self._proposal_roundwise.append(proposal)
 
@@ -216,6 +213,8 @@ class VectorFieldInference(NeuralInference, ABC):
         retrain_from_scratch: bool = False,
         show_train_summary: bool = False,
         dataloader_kwargs: Optional[dict] = None,
+        device_dataloader: bool = False,
+        trainer_kwargs: Optional[dict] = None,
     ) -> ConditionalVectorFieldEstimator:
         r"""Returns a vector field estimator that approximates the posterior
         $p(\theta|x)$ through a continuous transformation from the base distribution
@@ -264,6 +263,15 @@ class VectorFieldInference(NeuralInference, ABC):
                 loss after the training.
             dataloader_kwargs: Additional or updated kwargs to be passed to the training
                 and validation dataloaders (like, e.g., a collate_fn)
+            device_dataloader: Whether to move the training data to the training device
+                once and to draw batches by slicing a random permutation of the
+                training indices, instead of using a `torch.utils.data.DataLoader`.
+                This is typically much faster for small networks, but requires the data
+                to fit into the memory of the device. `dataloader_kwargs` are ignored.
+            trainer_kwargs: Additional kwargs for the training engine (see `Trainer`),
+                e.g. `mixed_precision`, `compile`, `gradient_accumulation_steps`,
+                `lr_scheduler` (a function that takes the optimizer and returns a
+                learning rate scheduler) and `callbacks`.
 
         Returns:
             Vector field estimator that approximates the posterior.
@@ -309,19 +317,17 @@ class VectorFieldInference(NeuralInference, ABC):
             validation_fraction,
             resume_training,
             dataloader_kwargs=dataloader_kwargs,
+            device_dataloader=device_dataloader,
         )
         # First round or if retraining from scratch:
         # Call the `self._build_neural_net` with the rounds' thetas and xs as
         # arguments, which will build the neural network.
         if self._neural_net is None or retrain_from_scratch:
-            # Get theta,x to initialize NN
-            theta, x, _ = self.get_simulations(starting_round=start_idx)
-            # Use only training data for building the neural net (z-scoring transforms)
-
-            self._neural_net = self._build_neural_net(
-                theta[self.train_indices].to("cpu"),
-                x[self.train_indices].to("cpu"),
-            )
+            # Get theta,x to initialize NN. Use only training data for building the
+            # neural net (z-scoring transforms), gathered without concatenating rounds.
+            train_indices = self.train_indices.sort().values
+            theta, x, _ = self.get_dataset(start_idx)[train_indices]
+            self._neural_net = self._build_neural_net(theta.to("cpu"), x.to("cpu"))
 
             test_posterior_net_for_multi_d_x(
                 self._neural_net,
@@ -342,127 +348,69 @@ class VectorFieldInference(NeuralInference, ABC):
             validation_times, Tensor
         )  # let pyright know validation_times is a Tensor.
 
-        if not resume_training:
-            self.optimizer = Adam(list(self._neural_net.parameters()), lr=learning_rate)
-
-            self.epoch, self._val_loss = 0, float("Inf")
-
-        while self.epoch <= max_num_epochs and not self._converged(
-            self.epoch, stop_after_epochs
-        ):
-            # Train for a single epoch.
-            self._neural_net.train()
-            train_loss_sum = 0
-            epoch_start_time = time.time()
-            for batch in train_loader:
-                self.optimizer.zero_grad()
-                # Get batches on current device.
-                theta_batch, x_batch, masks_batch = (
-                    batch[0].to(self._device),
-                    batch[1].to(self._device),
-                    batch[2].to(self._device),
-                )
-
-                train_losses = self._loss(
-                    theta=theta_batch,
-                    x=x_batch,
-                    masks=masks_batch,
-                    proposal=proposal,
-                    calibration_kernel=calibration_kernel,
-                    force_first_round_loss=force_first_round_loss,
-                )
-
-                train_loss = torch.mean(train_losses)
-
-                train_loss_sum += train_losses.sum().item()
-
-                train_loss.backward()
-                if clip_max_norm is not None:
-                    clip_grad_norm_(
-                        self._neural_net.parameters(), max_norm=clip_max_norm
-                    )
-                self.optimizer.step()
-
-            self.epoch += 1
-
-            train_loss_average = train_loss_sum / (
-                len(train_loader) * train_loader.batch_size  # type: ignore
-            )
+        trainer = self._get_trainer(
+            learning_rate, clip_max_norm, resume_training, trainer_kwargs
+        )
 
-            # NOTE: Due to the inherently noisy nature we do instead log a exponential
-            # moving average of the training loss.
-            if len(self._summary["training_loss"]) == 0:
-                self._summary["training_loss"].append(train_loss_average)
-            else:
-                previous_loss = self._summary["training_loss"][-1]
-                self._summary["training_loss"].append(
-                    (1.0 - ema_loss_decay) * previous_loss
-                    + ema_loss_decay * train_loss_average
-                )
-
-            # Calculate validation performance.
-            self._neural_net.eval()
-            val_loss_sum = 0
-
-            with torch.no_grad():
-                for batch in val_loader:
-                    theta_batch, x_batch, masks_batch = (
-                        batch[0].to(self._device),
-                        batch[1].to(self._device),
-                        batch[2].to(self._device),
-                    )
-
-                    # For validation loss, we evaluate at a fixed set of times to reduce
-                    # the variance in the validation loss, for improved convergence
-                    # checks. We evaluate the entire validation batch at all times, so
-                    # we repeat the batches here to match.
-                    val_batch_size = theta_batch.shape[0]
-                    times_batch = validation_times.shape[0]
-                    theta_batch = theta_batch.repeat(
-                        times_batch, *([1] * (theta_batch.ndim - 1))
-                    )
-                    x_batch = x_batch.repeat(times_batch, *([1] * (x_batch.ndim - 1)))
-                    masks_batch = masks_batch.repeat(
-                        times_batch, *([1] * (masks_batch.ndim - 1))
-                    )
-
-                    validation_times_rep = validation_times.repeat_interleave(
-                        val_batch_size, dim=0
-                    )
-
-                    # Take negative loss here to get validation log_prob.
-                    val_losses = self._loss(
-                        theta=theta_batch,
-                        x=x_batch,
-                        masks=masks_batch,
-                        proposal=proposal,
-                        calibration_kernel=calibration_kernel,
-                        times=validation_times_rep,
-                        force_first_round_loss=force_first_round_loss,
-                    )
-
-                    val_loss_sum += val_losses.sum().item()
-
-            # Take mean over all validation samples.
-            val_loss = val_loss_sum / (
-                len(val_loader) * val_loader.batch_size * times_batch  # type: ignore
+        loss = trainer.compiled(self._loss)
+
+        def loss_fn(batch) -> Tensor:
+            # Get batches on current device.
+            theta_batch, x_batch, masks_batch = move_to_device(batch, self._device)
+            return loss(
+                theta=theta_batch,
+                x=x_batch,
+                masks=masks_batch,
+                proposal=proposal,
+                calibration_kernel=calibration_kernel,
+                force_first_round_loss=force_first_round_loss,
             )
 
-            if len(self._summary["validation_loss"]) == 0:
-                val_loss_ema = val_loss
-            else:
-                previous_loss = self._summary["validation_loss"][-1]
-                val_loss_ema = (
-                    1 - ema_loss_decay
-                ) * previous_loss + ema_loss_decay * val_loss
-
-            self._val_loss = val_loss_ema
-            self._summary["validation_loss"].append(self._val_loss)
-            self._summary["epoch_durations_sec"].append(time.time() - epoch_start_time)
+        def val_loss_fn(batch) -> Tensor:
+            theta_batch, x_batch, masks_batch = move_to_device(batch, self._device)
+
+            # For validation loss, we evaluate at a fixed set of times to reduce
+            # the variance in the validation loss, for improved convergence
+            # checks. We evaluate the entire validation batch at all times, so
+            # we repeat the batches here to match.
+            val_batch_size = theta_batch.shape[0]
+            times_batch = validation_times.shape[0]
+            theta_batch = theta_batch.repeat(
+                times_batch, *([1] * (theta_batch.ndim - 1))
+            )
+            x_batch = x_batch.repeat(times_batch, *([1] * (x_batch.ndim - 1)))
+            masks_batch = masks_batch.repeat(
+                times_batch, *([1] * (masks_batch.ndim - 1))
+            )
 
-            self._maybe_show_progress(self._show_progress_bars, self.epoch)
+            validation_times_rep = validation_times.repeat_interleave(
+                val_batch_size, dim=0
+            )
 
-        self._report_convergence_at_end(self.epoch, stop_after_epochs, max_num_epochs)
+            val_losses = loss(
+                theta=theta_batch,
+                x=x_batch,
+                masks=masks_batch,
+                proposal=proposal,
+                calibration_kernel=calibration_kernel,
+                times=validation_times_rep,
+                force_first_round_loss=force_first_round_loss,
+            )
+            # Average over times, such that there is one loss per sample.
+            return val_losses.reshape(times_batch, val_batch_size).mean(dim=0)
+
+        # NOTE: Due to the inherently noisy nature we do instead log a exponential
+        # moving average of the training and validation loss.
+        self._run_training_loop(
+            trainer,
+            train_loader,
+            val_loader,
+            loss_fn,
+            max_num_epochs=max_num_epochs,
+            stop_after_epochs=stop_after_epochs,
+            val_loss_fn=val_loss_fn,
+            ema_loss_decay=ema_loss_decay,
+        )
 
         # Update summary.
         self._summary["epochs_trained"].append(self.epoch)
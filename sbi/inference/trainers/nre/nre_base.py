@@ -9,8 +9,6 @@ from typing import Any, Callable, Dict, Optional, Union
 import torch
 from torch import Tensor, eye, nn, ones
 from torch.distributions import Distribution
-from torch.nn.utils.clip_grad import clip_grad_norm_
-from torch.optim.adam import Adam
 from torch.utils.tensorboard.writer import SummaryWriter
 
 from sbi.inference.posteriors import MCMCPosterior, RejectionPosterior, VIPosterior
@@ -23,7 +21,7 @@ from sbi.utils import (
     check_prior,
     clamp_and_warn,
 )
-from sbi.utils.torchutils import repeat_rows
+from sbi.utils.torchutils import move_to_device, repeat_rows
 
 
 class RatioEstimator(NeuralInference, ABC):
@@ -150,6 +148,8 @@ class RatioEstimator(NeuralInference, ABC):
         show_train_summary: bool = False,
         dataloader_kwargs: Optional[Dict] = None,
         loss_kwargs: Optional[Dict[str, Any]] = None,
+        device_dataloader: bool = False,
+        trainer_kwargs: Optional[Dict] = None,
     ) -> nn.Module:
         r"""Return classifier that approximates the ratio $p(\theta,x)/p(\theta)p(x)$.
 
@@ -179,6 +179,15 @@ class RatioEstimator(NeuralInference, ABC):
             dataloader_kwargs: Additional or updated kwargs to be passed to the training
                 and validation dataloaders (like, e.g., a collate_fn).
             loss_kwargs: Additional or updated kwargs to be passed to the self._loss fn.
+            device_dataloader: Whether to move the training data to the training device
+                once and to draw batches by slicing a random permutation of the
+                training indices, instead of using a `torch.utils.data.DataLoader`.
+                This is typically much faster for small networks, but requires the data
+                to fit into the memory of the device. `dataloader_kwargs` are ignored.
+            trainer_kwargs: Additional kwargs for the training engine (see `Trainer`),
+                e.g. `mixed_precision`, `compile`, `gradient_accumulation_steps`,
+                `lr_scheduler` (a function that takes the optimizer and returns a
+                learning rate scheduler) and `callbacks`.
 
         Returns:
             Classifier that approximates the ratio $p(\theta,x)/p(\theta)p(x)$.
@@ -197,9 +206,10 @@ class RatioEstimator(NeuralInference, ABC):
             validation_fraction,
             resume_training,
             dataloader_kwargs=dataloader_kwargs,
+            device_dataloader=device_dataloader,
         )
 
-        clipped_batch_size = min(training_batch_size, val_loader.batch_size)  # type: ignore
+        clipped_batch_size = min(training_batch_size, len(self.val_indices))
 
         num_atoms = int(
             clamp_and_warn(
@@ -213,80 +223,32 @@ class RatioEstimator(NeuralInference, ABC):
         # This is passed into NeuralPosterior, to create a neural posterior which
         # can `sample()` and `log_prob()`. The network is accessible via `.net`.
         if self._neural_net is None or retrain_from_scratch:
-            # Get theta,x to initialize NN
-            theta, x, _ = self.get_simulations(starting_round=start_idx)
-            # Use only training data for building the neural net (z-scoring transforms)
-            self._neural_net = self._build_neural_net(
-                theta[self.train_indices].to("cpu"),
-                x[self.train_indices].to("cpu"),
-            )
+            # Get theta,x to initialize NN. Use only training data for building the
+            # neural net (z-scoring transforms), gathered without concatenating rounds.
+            train_indices = self.train_indices.sort().values
+            theta, x, _ = self.get_dataset(start_idx)[train_indices]
+            self._neural_net = self._build_neural_net(theta.to("cpu"), x.to("cpu"))
             del x, theta
         self._neural_net.to(self._device)
 
-        if not resume_training:
-            self.optimizer = Adam(
-                list(self._neural_net.parameters()),
-                lr=learning_rate,
-            )
-            self.epoch, self._val_loss = 0, float("Inf")
-
-        while self.epoch <= max_num_epochs and not self._converged(
-            self.epoch, stop_after_epochs
-        ):
-            # Train for a single epoch.
-            self._neural_net.train()
-            train_loss_sum = 0
-            for batch in train_loader:
-                self.optimizer.zero_grad()
-                theta_batch, x_batch = (
-                    batch[0].to(self._device),
-                    batch[1].to(self._device),
-                )
-
-                train_losses = self._loss(
-                    theta_batch, x_batch, num_atoms, **loss_kwargs
-                )
-                train_loss = torch.mean(train_losses)
-                train_loss_sum += train_losses.sum().item()
-
-                train_loss.backward()
-                if clip_max_norm is not None:
-                    clip_grad_norm_(
-                        self._neural_net.parameters(),
-                        max_norm=clip_max_norm,
-                    )
-                self.optimizer.step()
-
-            self.epoch += 1
-
-            train_loss_average = train_loss_sum / (
-                len(train_loader) * train_loader.batch_size  # type: ignore
-            )
-            self._summary["training_loss"].append(train_loss_average)
-
-            # Calculate validation performance.
-            self._neural_net.eval()
-            val_loss_sum = 0
-            with torch.no_grad():
-                for batch in val_loader:
-                    theta_batch, x_batch = (
-                        batch[0].to(self._device),
-                        batch[1].to(self._device),
-                    )
-                    val_losses = self._loss(
-                        theta_batch, x_batch, num_atoms, **loss_kwargs
-                    )
-                    val_loss_sum += val_losses.sum().item()
-                # Take mean over all validation samples.
-                self._val_loss = val_loss_sum / (
-                    len(val_loader) * val_loader.batch_size  # type: ignore
-                )
-                # Log validation log prob for every epoch.
-                self._summary["validation_loss"].append(self._val_loss)
-
-            self._maybe_show_progress(self._show_progress_bars, self.epoch)
-
-        self._report_convergence_at_end(self.epoch, stop_after_epochs, max_num_epochs)
+        trainer = self._get_trainer(
+            learning_rate, clip_max_norm, resume_training, trainer_kwargs
+        )
+
+        loss = trainer.compiled(self._loss)
+
+        def loss_fn(batch) -> Tensor:
+            theta_batch, x_batch = move_to_device(batch[:2], self._device)
+            return loss(theta_batch, x_batch, num_atoms, **loss_kwargs)
+
+        self._run_training_loop(
+            trainer,
+            train_loader,
+            val_loader,
+            loss_fn,
+            max_num_epochs=max_num_epochs,
+            stop_after_epochs=stop_after_epochs,
+        )
 
         # Update summary.
         self._summary["epochs_trained"].append(self.epoch)
@@ -0,0 +1,193 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
+
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import torch
+from torch import Tensor, nn
+from torch.nn.utils.clip_grad import clip_grad_norm_
+from torch.optim import Optimizer
+from torch.optim.lr_scheduler import ReduceLROnPlateau
+
+from sbi.utils.torchutils import LossAccumulator
+
+# Called after every epoch with the number of epochs trained so far, the training
+# loss and the validation loss of that epoch.
+Callback = Callable[[int, float, float], None]
+
+
+class Trainer:
+    def __init__(
+        self,
+        neural_net: nn.Module,
+        optimizer: Optimizer,
+        clip_max_norm: Optional[float] = None,
+        mixed_precision: bool = False,
+        compile: bool = False,
+        gradient_accumulation_steps: int = 1,
+        lr_scheduler: Optional[Any] = None,
+        callbacks: Optional[Sequence[Callback]] = None,
+        compiled_loss_fns: Optional[Dict[Any, Any]] = None,
+    ):
+        """Training engine that runs the epochs of all neural inference methods.
+
+        The engine is agnostic to the method: it receives a loss function which maps
+        a batch (as returned by the dataloader) to a tensor of losses. All features
+        of the engine therefore apply to every trainer, i.e. NPE, NLE, NRE, NPSE and
+        FMPE.
+
+        Args:
+            neural_net: The network that is trained.
+            optimizer: Optimizer of the parameters of `neural_net`.
+            clip_max_norm: Value at which to clip the total gradient norm in order to
+                prevent exploding gradients. Use None for no clipping.
+            mixed_precision: Whether to evaluate the loss in reduced precision with
+                `torch.autocast` (float16 with gradient scaling on CUDA, bfloat16
+                otherwise).
+            compile: Whether `compiled()` compiles the loss methods of the trainers
+                with `torch.compile`.
+            gradient_accumulation_steps: Number of batches whose gradients are
+                accumulated before each optimizer step.
+            lr_scheduler: Learning rate scheduler of `optimizer`, stepped after every
+                epoch. A `ReduceLROnPlateau` scheduler is stepped with the validation
+                loss.
+            callbacks: Functions which are called after every epoch with the number of
+                epochs trained so far, the training loss and the validation loss.
+            compiled_loss_fns: Cache of the loss methods compiled by `compiled()`.
+                Passing the same cache to the trainers of subsequent calls to
+                `train()` compiles every loss method of `neural_net` only once.
+        """
+        if gradient_accumulation_steps < 1:
+            raise ValueError("`gradient_accumulation_steps` must be at least 1.")
+        if compile and not hasattr(torch, "compile"):
+            raise ValueError("`compile=True` requires PyTorch 2.0 or newer.")
+
+        self.neural_net = neural_net
+        self.optimizer = optimizer
+        self.clip_max_norm = clip_max_norm
+        self.compile = compile
+        self.gradient_accumulation_steps = gradient_accumulation_steps
+        self.lr_scheduler = lr_scheduler
+        self.callbacks: List[Callback] = list(callbacks or [])
+
+        self._device_type = next(neural_net.parameters()).device.type
+        self.mixed_precision = mixed_precision
+        self._autocast_dtype = (
+            torch.float16 if self._device_type == "cuda" else torch.bfloat16
+        )
+        self._scaler = None
+        if mixed_precision and self._device_type == "cuda":
+            self._scaler = (
+                torch.amp.GradScaler("cuda")  # type: ignore
+                if hasattr(torch.amp, "GradScaler")
+                else torch.cuda.amp.GradScaler()
+            )
+        self._compiled_loss_fns = {} if compiled_loss_fns is None else compiled_loss_fns
+
+    def train_epoch(
+        self, loader: Iterable, loss_fn: Callable[[Sequence[Tensor]], Tensor]
+    ) -> float:
+        """Trains the network for one pass over `loader`.
+
+        Args:
+            loader: Dataloader which yields batches.
+            loss_fn: Function which returns the losses of a batch. The mean of these
+                losses is minimized.
+
+        Returns:
+            The sum of all losses, divided by the number of samples of the epoch.
+        """
+        self.neural_net.train()
+        loss_sum = LossAccumulator()
+        num_samples = 0
+        num_batches = len(loader)  # type: ignore
+        steps = self.gradient_accumulation_steps
+        self.optimizer.zero_grad()
+        for i, batch in enumerate(loader):
+            with self._autocast():
+                losses = loss_fn(batch)
+            loss_sum.add(losses)
+            num_samples += losses.shape[0]
+
+            # The last group of accumulated batches may be smaller than the others.
+            group_size = min(steps, num_batches - i + i % steps)
+            loss = torch.mean(losses) / group_size
+            if self._scaler is not None:
+                loss = self._scaler.scale(loss)
+            loss.backward()
+
+            if (i + 1) % steps == 0 or i + 1 == num_batches:
+                self._step()
+
+        return loss_sum.item() / num_samples
+
+    def validate(
+        self, loader: Iterable, loss_fn: Callable[[Sequence[Tensor]], Tensor]
+    ) -> float:
+        """Returns the loss of the network on all batches of `loader`.
+
+        Args:
+            loader: Dataloader which yields batches.
+            loss_fn: Function which returns the losses of a batch.
+
+        Returns:
+            The sum of all losses, divided by the number of samples.
+        """
+        self.neural_net.eval()
+        loss_sum = LossAccumulator()
+        num_samples = 0
+        with torch.no_grad():
+            for batch in loader:
+                with self._autocast():
+                    losses = loss_fn(batch)
+                loss_sum.add(losses)
+                num_samples += losses.shape[0]
+
+        return loss_sum.item() / num_samples
+
+    def end_epoch(self, epoch: int, train_loss: float, val_loss: float) -> None:
+        """Steps the learning rate scheduler and runs the callbacks."""
+        if isinstance(self.lr_scheduler, ReduceLROnPlateau):
+            self.lr_scheduler.step(val_loss)
+        elif self.lr_scheduler is not None:
+            self.lr_scheduler.step()
+
+        for callback in self.callbacks:
+            callback(epoch, train_loss, val_loss)
+
+    def compiled(self, loss: Callable[..., Tensor]) -> Callable[..., Tensor]:
+        """Returns `loss` compiled with `torch.compile` if `compile=True`.
+
+        Args:
+            loss: Bound loss method of the inference object, e.g. `self._loss`.
+                Bound methods of the same object compare equal, such that the method
+                is compiled only once for all calls to `train()` which share the
+                cache.
+
+        Returns:
+            The compiled loss method, or `loss` if `compile=False`.
+        """
+        if not self.compile:
+            return loss
+        if loss not in self._compiled_loss_fns:
+            self._compiled_loss_fns[loss] = torch.compile(loss)
+        return self._compiled_loss_fns[loss]
+
+    def _step(self) -> None:
+        """Clips the accumulated gradients and updates the parameters."""
+        if self._scaler is not None:
+            self._scaler.unscale_(self.optimizer)
+        if self.clip_max_norm is not None:
+            clip_grad_norm_(self.neural_net.parameters(), max_norm=self.clip_max_norm)
+        if self._scaler is not None:
+            self._scaler.step(self.optimizer)
+            self._scaler.update()
+        else:
+            self.optimizer.step()
+        self.optimizer.zero_grad()
+
+    def _autocast(self):
+        if not self.mixed_precision:
+            return nullcontext()
+        return torch.autocast(self._device_type, dtype=self._autocast_dtype)
@@ -295,6 +295,8 @@ class ConditionalVectorFieldEstimator(ConditionalEstimator, ABC):
         self.register_buffer(
             "_std_base", torch.empty(1, *self.input_shape).fill_(std_base)
         )
+        # Condition, a copy of it and its embedding, see `cache_condition_embedding()`.
+        self._condition_cache: Optional[Tuple[Tensor, Tensor, Tensor]] = None
 
     @abstractmethod
     def forward(self, input: Tensor, condition: Tensor, **kwargs) -> Tensor:
@@ -309,6 +311,78 @@ class ConditionalVectorFieldEstimator(ConditionalEstimator, ABC):
         """
         ...
 
+    # -------------------------- CONDITION EMBEDDING --------------------------
+
+    @property
+    def embedding_net(self) -> nn.Module:
+        r"""Embedding network of the condition. Identity unless set by subclasses."""
+        return nn.Identity()
+
+    def embed_condition(self, condition: Tensor) -> Tensor:
+        r"""Returns the embedding of the condition.
+
+        The embedding is computed only once per batch entry of the condition (i.e.
+        before the condition is broadcast to the batch shape of the input). If the
+        embedding of `condition` has been cached with `cache_condition_embedding()`
+        and the estimator is in evaluation mode, the cached embedding is returned.
+        This also holds for slices of the cached condition along its first batch
+        dimension (e.g. batches of i.i.d. observations), for which the corresponding
+        slice of the cached embedding is returned. In both cases, the condition is
+        compared to a copy of the cached condition, such that the embedding is
+        recomputed if the condition was modified in-place.
+
+        Args:
+            condition: Conditioning variable of shape
+                `(*batch_shape, *condition_shape)`.
+
+        Returns:
+            Embedded condition of shape `(*batch_shape, *embedding_shape)`.
+        """
+        cache = getattr(self, "_condition_cache", None)
+        if cache is not None and not self.training:
+            cached_condition, condition_copy, cached_embedding = cache
+            if (
+                condition_copy.shape == condition.shape
+                and condition_copy.device == condition.device
+                and torch.equal(condition_copy, condition)
+            ):
+                return cached_embedding
+            # Slices are located by their memory, but validated by their content.
+            rows = _rows_of(cached_condition, condition)
+            if rows is not None and torch.equal(condition_copy[rows], condition):
+                return cached_embedding[rows]
+
+        batch_shape = condition.shape[: condition.dim() - len(self.condition_shape)]
+        embedded = self.embedding_net(condition.reshape(-1, *self.condition_shape))
+        return embedded.reshape(*batch_shape, *embedded.shape[1:])
+
+    def cache_condition_embedding(self, condition: Tensor) -> None:
+        r"""Computes the embedding of `condition` and caches it.
+
+        While the estimator is in evaluation mode, all subsequent calls with this
+        condition (e.g. every step of an SDE or ODE solver) reuse the cached
+        embedding instead of passing the condition through the embedding net again.
+        The cache is cleared when the estimator is set to training mode.
+
+        Args:
+            condition: Conditioning variable, e.g. the observed data :math:`x_o`.
+        """
+        self._condition_cache = None
+        with torch.no_grad():
+            embedded = self.embed_condition(condition)
+        self._condition_cache = (condition, condition.clone(), embedded)
+
+    def clear_condition_embedding_cache(self) -> None:
+        r"""Removes the cached embedding of the condition."""
+        self._condition_cache = None
+
+    def train(self, mode: bool = True) -> "ConditionalVectorFieldEstimator":
+        r"""Sets the training mode and clears the cached condition embedding, which
+        becomes invalid as soon as the embedding net is updated."""
+        if mode:
+            self.clear_condition_embedding_cache()
+        return super().train(mode)
+
     # -------------------------- BASE DISTRIBUTION METHODS --------------------------
 
     # We assume that the base distribution is a Gaussian distribution
@@ -583,3 +657,24 @@ class UnconditionalDensityEstimator(UnconditionalEstimator):
         samples = self.sample(sample_shape)
         log_probs = self.log_prob(samples)
         return samples, log_probs
+
+
+def _rows_of(tensor: Tensor, view: Tensor) -> Optional[slice]:
+    r"""Returns the rows of `tensor` of which `view` is a slice along the first
+    dimension, or None if `view` is not such a slice (e.g. `tensor[2:5]`)."""
+    if (
+        view.dim() != tensor.dim()
+        or view.dim() == 0
+        or view.shape[1:] != tensor.shape[1:]
+        or view.stride() != tensor.stride()
+        or view.dtype != tensor.dtype
+        or view.device != tensor.device
+        or view.untyped_storage().data_ptr() != tensor.untyped_storage().data_ptr()
+        or tensor.stride(0) == 0
+    ):
+        return None
+    offset = view.storage_offset() - tensor.storage_offset()
+    start, remainder = divmod(offset, tensor.stride(0))
+    if remainder != 0 or start < 0 or start + view.shape[0] > tensor.shape[0]:
+        return None
+    return slice(start, start + view.shape[0])
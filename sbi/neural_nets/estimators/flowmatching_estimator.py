@@ -112,19 +112,24 @@ class FlowMatchingEstimator(ConditionalVectorFieldEstimator):
         )
 
         input = torch.broadcast_to(input, batch_shape + self.input_shape)
-        condition = torch.broadcast_to(condition, batch_shape + self.condition_shape)
         t = torch.broadcast_to(t, batch_shape + t.shape[1:])
 
+        # embed the condition before broadcasting it, such that every condition is
+        # embedded only once (or not at all if its embedding is cached)
+        condition_batch_dims = condition.dim() - len(self.condition_shape)
+        embedded_condition = self.embed_condition(condition)
+        embedding_shape = embedded_condition.shape[condition_batch_dims:]
+        embedded_condition = torch.broadcast_to(
+            embedded_condition, batch_shape + embedding_shape
+        )
+
         # the network expects 2D input, so we flatten the input if necessary
         # and remember the original shape
         target_shape = input.shape
         input = input.reshape(-1, input.shape[-1])
-        condition = condition.reshape(-1, *self.condition_shape)
+        embedded_condition = embedded_condition.reshape(-1, *embedding_shape)
         t = t.reshape(-1, t.shape[-1])
 
-        # embed the input and condition
-        embedded_condition = self._embedding_net(condition)
-
         # call the network to get the estimated vector field
         v = self.net(theta=input, x=embedded_condition, t=t)
 
@@ -3,7 +3,7 @@
 
 import math
 from math import pi
-from typing import Callable, Optional, Union
+from typing import Any, Callable, Dict, Optional, Union
 
 import torch
 from torch import Tensor, nn
@@ -69,6 +69,7 @@ class ConditionalScoreEstimator(ConditionalVectorFieldEstimator):
         std_0: Union[Tensor, float] = 1.0,
         t_min: float = 1e-3,
         t_max: float = 1.0,
+        embedding_net: Optional[nn.Module] = None,
     ) -> None:
         r"""Score estimator class that estimates the
         conditional score function, i.e.,
@@ -87,10 +88,19 @@ class ConditionalScoreEstimator(ConditionalVectorFieldEstimator):
             std_0: Approximate standard deviation of the target distribution.
             t_min: Minimum time value.
             t_max: Maximum time value.
+            embedding_net: Embedding network for the condition. The embedded
+                condition is passed to `net`.
 
         """
         super().__init__(net, input_shape, condition_shape, t_min, t_max)
 
+        self._embedding_net = (
+            embedding_net if embedding_net is not None else nn.Identity()
+        )
+        # State dicts saved before the condition embedding was part of the estimator
+        # hold the condition embedding inside of the input handler of `net`.
+        self._register_load_state_dict_pre_hook(_rename_condition_embedding_keys)
+
         # Set lambdas (variance weights) function.
         self._set_weight_fn(weight_fn)
 
@@ -110,6 +120,12 @@ class ConditionalScoreEstimator(ConditionalVectorFieldEstimator):
         self._mean_base.fill_(mean_base)
         self._std_base.fill_(std_base)
 
+    @property
+    def embedding_net(self) -> nn.Module:
+        # Estimators which were saved before the condition embedding was part of the
+        # estimator embed the condition inside of `net`.
+        return getattr(self, "_embedding_net", nn.Identity())
+
     def forward(self, input: Tensor, condition: Tensor, time: Tensor) -> Tensor:
         r"""Forward pass of the score estimator
         network to compute the conditional score
@@ -129,9 +145,17 @@ class ConditionalScoreEstimator(ConditionalVectorFieldEstimator):
         )
 
         input = torch.broadcast_to(input, batch_shape + self.input_shape)
-        condition = torch.broadcast_to(condition, batch_shape + self.condition_shape)
         time = torch.broadcast_to(time, batch_shape)
 
+        # Embed the condition before broadcasting it, such that every condition is
+        # embedded only once (or not at all if its embedding is cached).
+        condition_batch_dims = condition.dim() - len(self.condition_shape)
+        embedded_condition = self.embed_condition(condition)
+        embedded_condition = torch.broadcast_to(
+            embedded_condition,
+            batch_shape + embedded_condition.shape[condition_batch_dims:],
+        )
+
         # Time dependent mean and std of the target distribution to z-score the input
         # and to approximate the score at the end of the diffusion.
         mean = self.approx_marginal_mean(time)
@@ -148,7 +172,7 @@ class ConditionalScoreEstimator(ConditionalVectorFieldEstimator):
         score_gaussian = (input - mean) / std**2
 
         # Score prediction by the network
-        score_pred = self.net(input_enc, condition, time_enc)
+        score_pred = self.net(input_enc, embedded_condition, time_enc)
 
         # Output pre-conditioned score
         # The learnable part will be largly scaled at the beginning of the diffusion
@@ -411,6 +435,7 @@ class VPScoreEstimator(ConditionalScoreEstimator):
         std_0: Union[Tensor, float] = 1.0,
         t_min: float = 1e-5,
         t_max: float = 1.0,
+        embedding_net: Optional[nn.Module] = None,
     ) -> None:
         self.beta_min = beta_min
         self.beta_max = beta_max
@@ -423,6 +448,7 @@ class VPScoreEstimator(ConditionalScoreEstimator):
             weight_fn=weight_fn,
             t_min=t_min,
             t_max=t_max,
+            embedding_net=embedding_net,
         )
 
     def mean_t_fn(self, times: Tensor) -> Tensor:
@@ -513,6 +539,7 @@ class SubVPScoreEstimator(ConditionalScoreEstimator):
         std_0: float = 1.0,
         t_min: float = 1e-2,
         t_max: float = 1.0,
+        embedding_net: Optional[nn.Module] = None,
     ) -> None:
         self.beta_min = beta_min
         self.beta_max = beta_max
@@ -525,6 +552,7 @@ class SubVPScoreEstimator(ConditionalScoreEstimator):
             std_0=std_0,
             t_min=t_min,
             t_max=t_max,
+            embedding_net=embedding_net,
         )
 
     def mean_t_fn(self, times: Tensor) -> Tensor:
@@ -629,6 +657,7 @@ class VEScoreEstimator(ConditionalScoreEstimator):
         sigma_max: float = 5.0,
         mean_0: float = 0.0,
         std_0: float = 1.0,
+        embedding_net: Optional[nn.Module] = None,
     ) -> None:
         self.sigma_min = sigma_min
         self.sigma_max = sigma_max
@@ -639,6 +668,7 @@ class VEScoreEstimator(ConditionalScoreEstimator):
             weight_fn=weight_fn,
             mean_0=mean_0,
             std_0=std_0,
+            embedding_net=embedding_net,
         )
 
     def mean_t_fn(self, times: Tensor) -> Tensor:
@@ -712,6 +742,18 @@ class VEScoreEstimator(ConditionalScoreEstimator):
         return g
 
 
+def _rename_condition_embedding_keys(
+    state_dict: Dict[str, Tensor], prefix: str, *args: Any
+) -> None:
+    """Moves the condition embedding of state dicts saved before the estimator
+    embedded the condition from the input handler of the score net to the
+    estimator, such that they can still be loaded."""
+    old_prefix = prefix + "net.input_handler.embedding_net_y."
+    for key in [key for key in state_dict if key.startswith(old_prefix)]:
+        new_key = prefix + "_embedding_net." + key[len(old_prefix) :]
+        state_dict[new_key] = state_dict.pop(key)
+
+
 class GaussianFourierTimeEmbedding(nn.Module):
     """Gaussian random features for encoding time steps.
 
@@ -153,13 +153,21 @@ def build_score_estimator(
     if sde_type is None:
         sde_type = "vp"
 
+    # The condition is embedded (and z-scored) by the estimator, such that its
+    # embedding can be cached. The score net receives the embedded condition.
     input_handler = build_input_handler(
         batch_y,
         t_embedding_dim,
-        z_score_y,
+        None,
         embedding_net_x,
-        embedding_net_y,
+        nn.Identity(),
     )
+    z_score_y_bool, structured_y = z_score_parser(z_score_y)
+    condition_embedding_net: Optional[nn.Module] = embedding_net_y
+    if z_score_y_bool:
+        condition_embedding_net = nn.Sequential(
+            standardizing_net(batch_y, structured_y), embedding_net_y
+        )
 
     # Infer the output dimensionalities of the embedding_net by making a forward pass.
     x_numel = embedding_net_x(batch_x).shape[1:].numel()
@@ -184,7 +192,8 @@ def build_score_estimator(
     elif score_net == "resnet":
         raise NotImplementedError
     elif isinstance(score_net, nn.Module):
-        pass
+        # Custom networks receive the condition as it is.
+        condition_embedding_net = None
     else:
         raise ValueError(f"Invalid score network: {score_net}")
 
@@ -200,7 +209,13 @@ def build_score_estimator(
     input_shape = batch_x.shape[1:]
     condition_shape = batch_y.shape[1:]
     return estimator(
-        score_net, input_shape, condition_shape, mean_0=mean_0, std_0=std_0, **kwargs
+        score_net,
+        input_shape,
+        condition_shape,
+        mean_0=mean_0,
+        std_0=std_0,
+        embedding_net=condition_embedding_net,
+        **kwargs,
     )
 
 
@@ -2,11 +2,14 @@ from sbi.samplers.mcmc.init_strategy import (
     IterateParameters,
     proposal_init,
     resample_given_potential_fn,
+    resample_given_potential_fn_batched,
     sir_init,
 )
 from sbi.samplers.mcmc.pymc_wrapper import PyMCSampler
 from sbi.samplers.mcmc.slice_numpy import (
     SliceSampler,
+    SliceSamplerArrayVectorized,
     SliceSamplerSerial,
     SliceSamplerVectorized,
 )
+from sbi.samplers.mcmc.slice_torch import SliceSamplerTorch
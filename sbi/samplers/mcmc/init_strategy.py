@@ -112,3 +112,82 @@ def resample_given_potential_fn(
         idxs = torch.multinomial(probs, 1, replacement=False).cpu()
         # Return transformed sample.
         return transform(init_param_candidates[idxs, :])  # type: ignore
+
+
+def resample_given_potential_fn_batched(
+    proposal: Any,
+    potential_fn: Callable,
+    transform: torch_tf.Transform,
+    num_x: int,
+    num_samples_per_x: int,
+    num_candidate_samples: int = 10_000,
+    num_batches: int = 1,
+    correct_for_proposal: bool = False,
+    max_sampling_batch_size: int = 10_000,
+) -> Tensor:
+    r"""Return samples for a batch of observations via resampling proposal samples
+    with `potential_fn` weights.
+
+    Unlike calling `resample_given_potential_fn()` once per observation and sample,
+    all observations share the same candidates. The potential is evaluated on the
+    `(num_candidates, num_x, *event_shape)` grid of candidates and observations, in
+    tiles of at most `max_sampling_batch_size` pairs, and the samples of every
+    observation are drawn from the weights of its candidates without replacement
+    (Gumbel-top-k), such that no two samples of an observation are the same
+    candidate.
+
+    Args:
+        proposal: Proposal distribution, candidate samples are drawn from it.
+        potential_fn: Potential function that the candidate samples are weighted with.
+            Takes parameters of shape `(num_candidates, num_x, *event_shape)` and
+            returns the log probabilities of shape `(num_candidates, num_x)` given
+            every observation.
+        num_x: Number of observations.
+        num_samples_per_x: Number of samples drawn for every observation. Must not
+            exceed `num_candidate_samples * num_batches`.
+        num_candidate_samples: Number of candidate samples per batch.
+        num_batches: Number of batches drawn.
+        correct_for_proposal: Whether the weights are corrected for the
+            `proposal.log_prob()`, as in sampling importance resampling (SIR).
+        max_sampling_batch_size: Maximum number of pairs of candidates and
+            observations that the potential is evaluated on at once.
+
+    Returns:
+        Samples of shape `(num_x * num_samples_per_x, *event_shape)`, ordered by
+        observation, i.e., the first `num_samples_per_x` samples belong to the first
+        observation.
+    """
+    if num_samples_per_x > num_candidate_samples * num_batches:
+        raise ValueError(
+            f"Can not draw {num_samples_per_x} samples per observation without "
+            f"replacement from {num_candidate_samples * num_batches} candidates. "
+            "Increase `num_candidate_samples` or `num_batches`."
+        )
+    tile_size = max(1, max_sampling_batch_size // num_x)
+
+    with torch.set_grad_enabled(False):
+        log_weights = []
+        init_param_candidates = []
+        for _ in range(num_batches):
+            batch_draws = proposal.sample((num_candidate_samples,)).detach()
+            init_param_candidates.append(batch_draws)
+            for tile in batch_draws.split(tile_size):
+                grid = tile.unsqueeze(1).expand(-1, num_x, *tile.shape[1:])
+                tile_log_weights = potential_fn(grid).detach()
+                if correct_for_proposal:
+                    proposal_log_prob = proposal.log_prob(tile).detach()
+                    tile_log_weights = tile_log_weights - proposal_log_prob.unsqueeze(1)
+                log_weights.append(tile_log_weights)
+        log_weights = torch.cat(log_weights)
+        init_param_candidates = torch.cat(init_param_candidates)
+
+        # Log weights of every observation, shape `(num_x, num_candidates)`.
+        log_weights = torch.nan_to_num(
+            log_weights.T, nan=-float("inf"), posinf=-float("inf")
+        )
+        # The largest perturbed log weights are a sample without replacement.
+        gumbel = -torch.empty_like(log_weights).exponential_().log()
+        idxs = torch.topk(log_weights + gumbel, num_samples_per_x, dim=1).indices
+        idxs = idxs.reshape(-1).to(init_param_candidates.device)
+        # Return transformed samples.
+        return transform(init_param_candidates[idxs])  # type: ignore
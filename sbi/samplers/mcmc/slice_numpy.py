@@ -4,7 +4,6 @@
 import os
 import sys
 from typing import Callable, Optional, Sequence, Union
-from warnings import warn
 
 import numpy as np
 import torch
@@ -362,9 +361,14 @@ class SliceSamplerVectorized:
         init_width: Union[float, np.ndarray] = 0.01,
         max_width: float = float("inf"),
         num_workers: int = 1,
+        shard_log_prob_fn: Optional[Callable[[np.ndarray], Callable]] = None,
     ):
         """Slice sampler in pure Numpy, vectorized evaluations across chains.
 
+        Parallelization across CPUs is possible by setting num_workers > 1. The chains
+        are then split into `num_workers` shards, each of which is run vectorized in
+        its own process.
+
         Args:
             log_prob_fn: Log prob function.
             init_params: Initial parameters.
@@ -374,7 +378,12 @@ class SliceSamplerVectorized:
             verbose: Show/hide additional info such as progress bars.
             init_width: Inital width of brackets.
             max_width: Maximum width of brackets.
-            num_workers: Number of parallel workers to use (not implemented.)
+            num_workers: Number of parallel workers to use.
+            shard_log_prob_fn: Function that takes the indices of a shard of chains
+                and returns the log prob function for these chains. Only needed if
+                the log prob of a chain depends on its index, e.g., when every chain
+                targets a different observation. If None, `log_prob_fn` is used for
+                every shard.
         """
         self._log_prob_fn = log_prob_fn
 
@@ -388,16 +397,10 @@ class SliceSamplerVectorized:
         self.max_width = max_width
 
         self.n_dims = self.x.size
+        self.num_workers = num_workers
+        self._shard_log_prob_fn = shard_log_prob_fn
 
         self._samples = None
-
-        # TODO: implement parallelization across batches of chains.
-        if num_workers > 1:
-            warn(
-                "Parallelization of vectorized slice sampling not implement, running "
-                "serially.",
-                stacklevel=2,
-            )
         self._reset()
 
     def _reset(self):
@@ -412,14 +415,92 @@ class SliceSamplerVectorized:
     def run(self, num_samples: int) -> np.ndarray:
         """Runs MCMC
 
+        Sampling is performed parallelized across CPUs if self.num_workers > 1.
+        Parallelization is seeded across workers.
+
         Args:
             num_samples: Number of samples to generate
 
         Returns:
-            MCMC samples
+            MCMC samples in shape (num_chains, num_samples_per_chain, num_dim)
         """
         assert num_samples >= 0
 
+        if self.num_workers > 1 and self.num_chains > 1:
+            samples = self._run_sharded(num_samples)
+        else:
+            samples = self._run_vectorized(num_samples)
+
+        samples = samples[:, :: self.thin, :]  # thin chains
+
+        self._samples = samples
+
+        return samples
+
+    def _run_sharded(self, num_samples: int) -> np.ndarray:
+        """Splits the chains into shards and runs each shard in its own process.
+
+        Args:
+            num_samples: Number of samples to generate
+
+        Returns:
+            Unthinned MCMC samples of all shards, in the order of the chains.
+        """
+        num_shards = min(self.num_workers, self.num_chains)
+        shards = np.array_split(np.arange(self.num_chains), num_shards)
+
+        # Generate seeds for workers from current random state.
+        seeds = torch.randint(high=2**31, size=(num_shards,))
+
+        with tqdm_joblib(
+            tqdm(
+                range(num_shards),  # type: ignore
+                disable=not self.verbose,
+                desc=f"""Running {self.num_chains} MCMC chains in {num_shards}
+                    shards with {self.num_workers} worker(s).""",
+                total=num_shards,
+            )
+        ):
+            all_samples: Sequence[np.ndarray] = Parallel(n_jobs=self.num_workers)(  # pyright: ignore[reportAssignmentType]
+                delayed(self._run_shard)(num_samples, chain_indices, int(seed))
+                for chain_indices, seed in zip(shards, seeds, strict=True)
+            )
+
+        return np.concatenate(all_samples)
+
+    def _run_shard(
+        self, num_samples: int, chain_indices: np.ndarray, seed: int
+    ) -> np.ndarray:
+        """Runs the chains with the given indices vectorized in a single process."""
+        np.random.seed(seed)
+        torch.manual_seed(seed)
+        log_prob_fn = (
+            self._log_prob_fn
+            if self._shard_log_prob_fn is None
+            else self._shard_log_prob_fn(chain_indices)
+        )
+        shard_sampler = type(self)(
+            log_prob_fn=log_prob_fn,
+            init_params=self.x[chain_indices],
+            num_chains=len(chain_indices),
+            thin=self.thin,
+            tuning=self.tuning,
+            verbose=False,
+            init_width=self.init_width,
+            max_width=self.max_width,
+            num_workers=1,
+        )
+        return shard_sampler._run_vectorized(num_samples)
+
+    def _run_vectorized(self, num_samples: int) -> np.ndarray:
+        """Runs all chains vectorized in the current process.
+
+        Args:
+            num_samples: Number of samples to generate
+
+        Returns:
+            Unthinned MCMC samples in shape (num_chains, num_samples, num_dim)
+        """
         self.n_dims = self.x.shape[1]
 
         # Init chains
@@ -578,13 +659,7 @@ class SliceSamplerVectorized:
                 if sc["state"] == "DONE":
                     num_chains_finished += 1
 
-        samples = np.stack([self.state[c]["samples"] for c in range(self.num_chains)])
-
-        samples = samples[:, :: self.thin, :]  # thin chains
-
-        self._samples = samples
-
-        return samples
+        return np.stack([self.state[c]["samples"] for c in range(self.num_chains)])
 
     def get_samples(
         self, num_samples: Optional[int] = None, group_by_chain: bool = True
@@ -618,3 +693,202 @@ class SliceSamplerVectorized:
             return samples[:, -num_samples:, :]
         else:
             return samples[-num_samples:, :]
+
+
+# Phases of the per-chain slice sampling state machine, see
+# `SliceSamplerArrayVectorized`.
+_BEGIN, _LOWER, _UPPER, _SAMPLE_SLICE, _DONE = range(5)
+
+
+class SliceSamplerArrayVectorized(SliceSamplerVectorized):
+    def __init__(
+        self,
+        log_prob_fn: Callable,
+        init_params: np.ndarray,
+        num_chains: int = 1,
+        thin: int = 1,
+        tuning: int = 50,
+        verbose: bool = True,
+        init_width: Union[float, np.ndarray] = 0.01,
+        max_width: float = float("inf"),
+        num_workers: int = 1,
+        shard_log_prob_fn: Optional[Callable[[np.ndarray], Callable]] = None,
+    ):
+        """Slice sampler in pure Numpy, with the state of all chains held in arrays.
+
+        Runs the same state machine as `SliceSamplerVectorized`, but instead of
+        keeping one Python dict per chain, the position, bracket ends, bracket
+        widths, dimension order and phase of all chains are stored in arrays and
+        advanced with masked array operations. This removes the per-chain Python
+        overhead, which dominates the runtime for a large number of chains.
+
+        Args:
+            log_prob_fn: Log prob function.
+            init_params: Initial parameters.
+            num_chains: Number of MCMC chains to run in parallel
+            thin: Thinning (subsampling) factor, default 1 (no thinning).
+            tuning: Number of tuning steps for brackets.
+            verbose: Show/hide additional info such as progress bars.
+            init_width: Inital width of brackets.
+            max_width: Maximum width of brackets.
+            num_workers: Number of parallel workers to use, see
+                `SliceSamplerVectorized`.
+            shard_log_prob_fn: Function that takes the indices of a shard of chains
+                and returns the log prob function for these chains, see
+                `SliceSamplerVectorized`.
+        """
+        super().__init__(
+            log_prob_fn=log_prob_fn,
+            init_params=init_params,
+            num_chains=num_chains,
+            thin=thin,
+            tuning=tuning,
+            verbose=verbose,
+            init_width=init_width,
+            max_width=max_width,
+            num_workers=num_workers,
+            shard_log_prob_fn=shard_log_prob_fn,
+        )
+
+    def _reset(self):
+        self.rng = np.random  # type: ignore
+
+    def _shuffled_orders(self, num_chains: int) -> np.ndarray:
+        """Returns a random permutation of the dimensions for each chain."""
+        return np.argsort(self.rng.rand(num_chains, self.n_dims), axis=1)
+
+    def _log_probs(self, params: np.ndarray) -> np.ndarray:
+        """Evaluates the log prob of all chains and returns it as flat array."""
+        log_probs = self._log_prob_fn(params)
+        if isinstance(log_probs, torch.Tensor):
+            log_probs = log_probs.detach().cpu().numpy()
+        return np.asarray(log_probs, dtype=float).reshape(-1)[: self.num_chains]
+
+    def _run_vectorized(self, num_samples: int) -> np.ndarray:
+        """Runs all chains vectorized in the current process.
+
+        Args:
+            num_samples: Number of samples to generate
+
+        Returns:
+            Unthinned MCMC samples in shape (num_chains, num_samples, num_dim)
+        """
+        num_chains = self.num_chains
+        self.n_dims = self.x.shape[1]
+        num_steps = num_samples + self.tuning
+        chains = np.arange(num_chains)
+
+        # Current position and bracket width per dimension of each chain.
+        x = np.array(self.x, dtype=float)
+        width = np.broadcast_to(
+            np.asarray(self.init_width, dtype=float), x.shape
+        ).copy()
+
+        # Order of dimensions, index into the order and number of full sweeps.
+        order = self._shuffled_orders(num_chains)
+        i = np.zeros(num_chains, dtype=int)
+        t = np.zeros(num_chains, dtype=int)
+        phase = np.full(num_chains, _DONE if num_steps == 0 else _BEGIN)
+
+        # Current value, bracket and proposal of the dimension being sampled.
+        cxi = np.zeros(num_chains)
+        wi = np.zeros(num_chains)
+        logu = np.zeros(num_chains)
+        lx = np.zeros(num_chains)
+        ux = np.zeros(num_chains)
+        xi = np.zeros(num_chains)
+
+        samples = np.empty([num_chains, int(num_samples), int(self.n_dims)])
+
+        if self.verbose:
+            pbar = tqdm(
+                range(num_chains * num_steps),
+                desc=f"Running vectorized MCMC with {num_chains} chains",
+            )
+
+        while not np.all(phase == _DONE):
+            dim = order[chains, i]
+
+            begin = phase == _BEGIN
+            cxi[begin] = x[chains[begin], dim[begin]]
+            wi[begin] = width[chains[begin], dim[begin]]
+            # Chains that are done keep evaluating their last position.
+            next_value = np.where(begin, cxi, x[chains, dim])
+            next_value[phase == _LOWER] = lx[phase == _LOWER]
+            next_value[phase == _UPPER] = ux[phase == _UPPER]
+            next_value[phase == _SAMPLE_SLICE] = xi[phase == _SAMPLE_SLICE]
+
+            params = x.copy()
+            params[chains, dim] = next_value
+            log_probs = self._log_probs(params)
+
+            # All masks refer to the phase at the start of this iteration, such
+            # that every chain advances by exactly one step.
+            lower = phase == _LOWER
+            upper = phase == _UPPER
+            sample_slice = phase == _SAMPLE_SLICE
+
+            # Position the bracket randomly around the current sample.
+            num_begin = int(begin.sum())
+            logu[begin] = log_probs[begin] + np.log(1.0 - self.rng.rand(num_begin))
+            lx[begin] = cxi[begin] - wi[begin] * self.rng.rand(num_begin)
+            ux[begin] = lx[begin] + wi[begin]
+            phase[begin] = _LOWER
+
+            # Decrease lower end of bracket, or move to upper end once calibrated.
+            outside_lower = (log_probs >= logu) & (cxi - lx < self.max_width)
+            lx[lower & outside_lower] -= wi[lower & outside_lower]
+            phase[lower & ~outside_lower] = _UPPER
+
+            # Increase upper end of bracket, or sample uniformly from bracket once
+            # calibrated.
+            outside_upper = (log_probs >= logu) & (ux - cxi < self.max_width)
+            ux[upper & outside_upper] += wi[upper & outside_upper]
+            start_sampling = upper & ~outside_upper
+            xi[start_sampling] = (ux - lx)[start_sampling] * self.rng.rand(
+                int(start_sampling.sum())
+            ) + lx[start_sampling]
+            phase[start_sampling] = _SAMPLE_SLICE
+
+            # If outside slice, reject sample and shrink bracket.
+            rejected = sample_slice & (log_probs < logu)
+            shrink_lower = rejected & (xi < cxi)
+            shrink_upper = rejected & (xi >= cxi)
+            lx[shrink_lower] = xi[shrink_lower]
+            ux[shrink_upper] = xi[shrink_upper]
+            xi[rejected] = (ux - lx)[rejected] * self.rng.rand(
+                int(rejected.sum())
+            ) + lx[rejected]
+
+            # Accept sample and move on to the next dimension.
+            accepted = sample_slice & (log_probs >= logu)
+            if np.any(accepted):
+                acc_chains = chains[accepted]
+                acc_dims = dim[accepted]
+                x[acc_chains, acc_dims] = xi[accepted]
+
+                # If tuning, update bracket width.
+                tune = accepted & (t < self.tuning)
+                width[chains[tune], dim[tune]] += (
+                    (ux - lx)[tune] - width[chains[tune], dim[tune]]
+                ) / (t[tune] + 1)
+
+                # Save accepted sample and shuffle dimensions after a full sweep.
+                sweep_done = accepted & (i == self.n_dims - 1)
+                i[accepted & ~sweep_done] += 1
+                save = sweep_done & (t >= self.tuning)
+                samples[chains[save], t[save] - self.tuning] = x[save]
+                t[sweep_done] += 1
+                i[sweep_done] = 0
+                order[sweep_done] = self._shuffled_orders(int(sweep_done.sum()))
+
+                phase[accepted] = _BEGIN
+                phase[sweep_done & (t >= num_steps)] = _DONE
+
+                if self.verbose:
+                    pbar.update(int(sweep_done.sum()))  # type: ignore
+
+        if self.verbose:
+            pbar.close()  # type: ignore
+
+        return samples
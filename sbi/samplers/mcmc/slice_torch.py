@@ -0,0 +1,255 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
+
+from typing import Callable, Optional, Union
+from warnings import warn
+
+import torch
+from torch import Tensor
+from tqdm.auto import tqdm
+
+# Phases of the per-chain slice sampling state machine.
+_BEGIN, _LOWER, _UPPER, _SAMPLE_SLICE, _DONE = range(5)
+
+
+class SliceSamplerTorch:
+    def __init__(
+        self,
+        log_prob_fn: Callable,
+        init_params: Tensor,
+        num_chains: int = 1,
+        thin: int = 1,
+        tuning: int = 50,
+        verbose: bool = True,
+        init_width: Union[float, Tensor] = 0.01,
+        max_width: float = float("inf"),
+        num_workers: int = 1,
+    ):
+        """Slice sampler in pure PyTorch, vectorized evaluations across chains.
+
+        Chains, brackets and random numbers are kept as tensors on the device of
+        `init_params`, such that the potential can be evaluated on that device
+        without converting parameters and log probs to NumPy and back. All chains
+        are advanced with `torch.where` instead of boolean indexing, such that a
+        single host synchronization per step remains (checking whether all chains
+        are finished, combined with the progress bar update if `verbose`).
+
+        Args:
+            log_prob_fn: Log prob function, takes and returns tensors.
+            init_params: Initial parameters of shape (num_chains, dim).
+            num_chains: Number of MCMC chains to run in parallel
+            thin: Thinning (subsampling) factor, default 1 (no thinning).
+            tuning: Number of tuning steps for brackets.
+            verbose: Show/hide additional info such as progress bars.
+            init_width: Inital width of brackets.
+            max_width: Maximum width of brackets.
+            num_workers: Number of parallel workers to use (not implemented.)
+        """
+        self._log_prob_fn = log_prob_fn
+
+        self.x = init_params
+        self.num_chains = num_chains
+        self.thin = 1 if thin is None else thin
+        self.tuning = tuning
+        self.verbose = verbose
+
+        self.init_width = init_width
+        self.max_width = max_width
+
+        self._samples = None
+
+        if num_workers > 1:
+            warn(
+                "Parallelization of torch slice sampling not implemented, running "
+                "vectorized on a single device.",
+                stacklevel=2,
+            )
+
+    def _shuffled_orders(self, num_chains: int, num_dims: int) -> Tensor:
+        """Returns a random permutation of the dimensions for each chain."""
+        return torch.argsort(
+            torch.rand(num_chains, num_dims, device=self.x.device), dim=1
+        )
+
+    def run(self, num_samples: int) -> Tensor:
+        """Runs MCMC
+
+        Args:
+            num_samples: Number of samples to generate
+
+        Returns:
+            MCMC samples in shape (num_chains, num_samples_per_chain, num_dim)
+        """
+        assert num_samples >= 0
+
+        num_chains, num_dims = self.x.shape
+        num_steps = num_samples + self.tuning
+        device = self.x.device
+        chains = torch.arange(num_chains, device=device)
+
+        def rand() -> Tensor:
+            return torch.rand(num_chains, dtype=x.dtype, device=device)
+
+        def at(values: Tensor, dim: Tensor) -> Tensor:
+            return values.gather(1, dim.unsqueeze(1)).squeeze(1)
+
+        # Current position and bracket width per dimension of each chain.
+        x = self.x.clone()
+        width = torch.as_tensor(self.init_width, dtype=x.dtype, device=device)
+        width = width.expand(num_chains, num_dims).clone()
+
+        # Order of dimensions, index into the order and number of full sweeps.
+        order = self._shuffled_orders(num_chains, num_dims)
+        i = torch.zeros(num_chains, dtype=torch.long, device=device)
+        t = torch.zeros(num_chains, dtype=torch.long, device=device)
+        phase = torch.full(
+            (num_chains,), _DONE if num_steps == 0 else _BEGIN, device=device
+        )
+
+        # Current value, bracket and proposal of the dimension being sampled.
+        cxi = torch.zeros(num_chains, dtype=x.dtype, device=device)
+        wi = torch.zeros_like(cxi)
+        logu = torch.zeros_like(cxi)
+        lx = torch.zeros_like(cxi)
+        ux = torch.zeros_like(cxi)
+        xi = torch.zeros_like(cxi)
+
+        samples = torch.empty(
+            (num_chains, num_samples, num_dims), dtype=x.dtype, device=device
+        )
+
+        pbar: Optional[tqdm] = None
+        if self.verbose:
+            pbar = tqdm(
+                range(num_chains * num_steps),
+                desc=f"Running vectorized MCMC with {num_chains} chains",
+            )
+
+        all_done = num_steps == 0
+        while not all_done:
+            dim = order.gather(1, i.unsqueeze(1)).squeeze(1)
+            current = at(x, dim)
+
+            begin = phase == _BEGIN
+            lower = phase == _LOWER
+            upper = phase == _UPPER
+            sample_slice = phase == _SAMPLE_SLICE
+
+            cxi = torch.where(begin, current, cxi)
+            wi = torch.where(begin, at(width, dim), wi)
+            # Chains that are done keep evaluating their last position.
+            next_value = torch.where(lower, lx, current)
+            next_value = torch.where(upper, ux, next_value)
+            next_value = torch.where(sample_slice, xi, next_value)
+
+            params = x.scatter(1, dim.unsqueeze(1), next_value.unsqueeze(1))
+            log_probs = self._log_prob_fn(params).reshape(-1)[:num_chains]
+            log_probs = log_probs.to(x.dtype)
+
+            # Position the bracket randomly around the current sample.
+            logu = torch.where(begin, log_probs + torch.log(1.0 - rand()), logu)
+            lx = torch.where(begin, cxi - wi * rand(), lx)
+            ux = torch.where(begin, lx + wi, ux)
+
+            # Decrease lower end of bracket, or move to upper end once calibrated.
+            outside_lower = (log_probs >= logu) & (cxi - lx < self.max_width)
+            lx = torch.where(lower & outside_lower, lx - wi, lx)
+
+            # Increase upper end of bracket, or sample uniformly from bracket once
+            # calibrated.
+            outside_upper = (log_probs >= logu) & (ux - cxi < self.max_width)
+            ux = torch.where(upper & outside_upper, ux + wi, ux)
+            start_sampling = upper & ~outside_upper
+
+            # If outside slice, reject sample and shrink bracket.
+            rejected = sample_slice & (log_probs < logu)
+            lx = torch.where(rejected & (xi < cxi), xi, lx)
+            ux = torch.where(rejected & (xi >= cxi), xi, ux)
+            xi = torch.where(start_sampling | rejected, (ux - lx) * rand() + lx, xi)
+
+            # Accept sample and move on to the next dimension.
+            accepted = sample_slice & (log_probs >= logu)
+            x = x.scatter(
+                1, dim.unsqueeze(1), torch.where(accepted, xi, current).unsqueeze(1)
+            )
+
+            # If tuning, update bracket width.
+            tune = accepted & (t < self.tuning)
+            wd = at(width, dim)
+            wd = torch.where(tune, wd + ((ux - lx) - wd) / (t + 1), wd)
+            width = width.scatter(1, dim.unsqueeze(1), wd.unsqueeze(1))
+
+            # Save accepted sample and shuffle dimensions after a full sweep.
+            sweep_done = accepted & (i == num_dims - 1)
+            save = sweep_done & (t >= self.tuning)
+            idx = (t - self.tuning).clamp(0, max(num_samples - 1, 0))
+            if num_samples > 0:
+                samples[chains, idx] = torch.where(
+                    save.unsqueeze(1), x, samples[chains, idx]
+                )
+            i = torch.where(sweep_done, 0, torch.where(accepted, i + 1, i))
+            t = torch.where(sweep_done, t + 1, t)
+            order = torch.where(
+                sweep_done.unsqueeze(1),
+                self._shuffled_orders(num_chains, num_dims),
+                order,
+            )
+
+            phase = torch.where(begin, _LOWER, phase)
+            phase = torch.where(lower & ~outside_lower, _UPPER, phase)
+            phase = torch.where(start_sampling, _SAMPLE_SLICE, phase)
+            phase = torch.where(accepted, _BEGIN, phase)
+            phase = torch.where(sweep_done & (t >= num_steps), _DONE, phase)
+
+            # Transfer the stopping criterion and the number of finished sweeps to
+            # the host together, such that the progress bar costs no extra sync.
+            if pbar is None:
+                all_done = bool((phase == _DONE).all())
+            else:
+                all_done, num_sweeps = torch.stack([
+                    (phase == _DONE).all().long(),
+                    sweep_done.sum(),
+                ]).tolist()
+                pbar.update(num_sweeps)
+
+        if pbar is not None:
+            pbar.close()
+
+        samples = samples[:, :: self.thin, :]  # thin chains
+
+        self._samples = samples
+
+        return samples
+
+    def get_samples(
+        self, num_samples: Optional[int] = None, group_by_chain: bool = True
+    ) -> Tensor:
+        """Returns samples from last call to self.run.
+
+        Raises ValueError if no samples have been generated yet.
+
+        Args:
+            num_samples: Number of samples to return (for each chain if grouped by
+                chain), if too large, all samples are returned (no error).
+            group_by_chain: Whether to return samples grouped by chain (chain x samples
+                x dim_params) or flattened (all_samples, dim_params).
+
+        Returns:
+            samples
+        """
+        if self._samples is None:
+            raise ValueError("No samples found from MCMC run.")
+        # if not grouped by chain, flatten samples into (all_samples, dim_params)
+        if not group_by_chain:
+            samples = self._samples.reshape(-1, self._samples.shape[2])
+        else:
+            samples = self._samples
+
+        # if not specified return all samples
+        if num_samples is None:
+            return samples
+        # otherwise return last num_samples (for each chain when grouped).
+        elif group_by_chain:
+            return samples[:, -num_samples:, :]
+        else:
+            return samples[-num_samples:, :]
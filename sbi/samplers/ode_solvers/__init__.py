@@ -6,10 +6,12 @@ Neural ODEs for sampling.
 """
 
 from sbi.samplers.ode_solvers.base import NeuralODE, NeuralODEFunc
+from sbi.samplers.ode_solvers.fixed_step_ode import FixedStepNeuralODE
 from sbi.samplers.ode_solvers.ode_builder import build_neural_ode
 from sbi.samplers.ode_solvers.zuko_ode import ZukoNeuralODE
 
 __all__ = [
+    "FixedStepNeuralODE",
     "NeuralODE",
     "NeuralODEFunc",
     "ZukoNeuralODE",
@@ -0,0 +1,290 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
+
+"""
+Fixed-step ODE solver.
+"""
+
+from typing import Callable, Iterable, Sequence, Tuple, Union
+
+import torch
+import torch.nn as nn
+from torch import Tensor
+from torch.distributions import Distribution, constraints
+from zuko.distributions import DiagNormal, NormalizingFlow
+from zuko.transforms import Transform
+
+from sbi.samplers.ode_solvers.base import NeuralODE, NeuralODEFunc
+
+State = Union[Tensor, Tuple[Tensor, ...]]
+
+# Butcher tableaus (nodes, coefficients of the stages and weights of the stages) of
+# the explicit Runge-Kutta methods.
+_TABLEAUS = {
+    "euler": ([0.0], [[]], [1.0]),
+    "midpoint": ([0.0, 0.5], [[], [0.5]], [0.0, 1.0]),
+    "rk4": (
+        [0.0, 0.5, 0.5, 1.0],
+        [[], [0.5], [0.0, 0.5], [0.0, 0.0, 1.0]],
+        [1 / 6, 1 / 3, 1 / 3, 1 / 6],
+    ),
+}
+
+
+def fixed_step_odeint(
+    f: Callable[[Tensor, State], State],
+    x: State,
+    t0: Tensor,
+    t1: Tensor,
+    num_steps: int,
+    method: str = "rk4",
+) -> State:
+    r"""Integrates a system of ODEs with an explicit Runge-Kutta method with
+    `num_steps` equidistant steps from `t0` to `t1`.
+
+    Args:
+        f: The system of ODEs :math:`f(t, x)`. If the state is a tuple of tensors,
+            `f` must return a tuple of their derivatives.
+        x: The initial state, a tensor or a tuple of tensors.
+        t0: The initial time.
+        t1: The final time.
+        num_steps: The number of integration steps.
+        method: The integration method, one of "euler", "midpoint" or "rk4".
+
+    Returns:
+        The state at time `t1`.
+    """
+    if method not in _TABLEAUS:
+        raise ValueError(
+            f"Method {method} not supported, use one of {list(_TABLEAUS)}."
+        )
+    nodes, coefficients, weights = _TABLEAUS[method]
+    is_tuple = isinstance(x, tuple)
+    state: Tuple[Tensor, ...] = x if is_tuple else (x,)  # type: ignore
+
+    def g(t: Tensor, state: Sequence[Tensor]) -> Tuple[Tensor, ...]:
+        dx = f(t, tuple(state) if is_tuple else state[0])
+        return dx if is_tuple else (dx,)  # type: ignore
+
+    def combine(stages: Sequence[Sequence[Tensor]], factors: Sequence[float]):
+        """Returns the state plus `dt` times the weighted sum of the stages."""
+        return tuple(
+            s + dt * sum(w * k[j] for w, k in zip(factors, stages, strict=True) if w)
+            for j, s in enumerate(state)
+        )
+
+    dt = (t1 - t0) / num_steps
+    for i in range(num_steps):
+        t = t0 + i * dt
+        stages = []
+        for node, stage_coefficients in zip(nodes, coefficients, strict=True):
+            stages.append(g(t + node * dt, combine(stages, stage_coefficients)))
+        state = combine(stages, weights)
+
+    return state if is_tuple else state[0]
+
+
+class FixedStepJacobianTransform(Transform):
+    r"""Free-form Jacobian transformation, integrated with a fixed number of steps.
+
+    Like zuko's `FreeFormJacobianTransform`, the transformation is the integration of
+    a system of first-order ODEs from :math:`t_0` to :math:`t_1`, but it uses an
+    explicit Runge-Kutta method with a fixed number of steps instead of an adaptive
+    solver. The log-determinant of the Jacobian is either computed exactly, which
+    requires one backward pass per dimension and function evaluation, or estimated
+    with Hutchinson's trace estimator [1], which requires one backward pass per
+    probe vector.
+
+    References:
+        | A stochastic estimator of the trace of the influence matrix for Laplacian
+        | smoothing splines (Hutchinson, 1989)
+    """
+
+    domain = constraints.real_vector
+    codomain = constraints.real_vector
+    bijective = True
+
+    def __init__(
+        self,
+        f: Callable[[Tensor, Tensor], Tensor],
+        t0: Tensor,
+        t1: Tensor,
+        phi: Iterable[Tensor] = (),
+        num_steps: int = 50,
+        method: str = "rk4",
+        exact: bool = False,
+        num_probes: int = 1,
+        **kwargs,
+    ) -> None:
+        r"""
+        Args:
+            f: A system of first-order ODEs :math:`f(t, x)`.
+            t0: The initial integration time :math:`t_0`.
+            t1: The final integration time :math:`t_1`.
+            phi: The parameters of :math:`f`, used to decide whether the graph of
+                the log-determinant has to be created.
+            num_steps: The number of integration steps.
+            method: The integration method, one of "euler", "midpoint" or "rk4".
+            exact: Whether the exact log-determinant of the Jacobian or a stochastic
+                estimate thereof is calculated.
+            num_probes: The number of Rademacher probe vectors of the stochastic
+                trace estimator. Ignored if `exact=True`.
+        """
+        super().__init__(**kwargs)
+        if num_steps < 1 or num_probes < 1:
+            raise ValueError("`num_steps` and `num_probes` must be at least 1.")
+
+        self.f = f
+        self.t0 = t0
+        self.t1 = t1
+        self.phi = tuple(filter(lambda p: p.requires_grad, phi))
+        self.num_steps = num_steps
+        self.method = method
+        self.exact = exact
+        self.num_probes = num_probes
+
+    def _call(self, x: Tensor) -> Tensor:
+        return fixed_step_odeint(
+            self.f, x, self.t0, self.t1, self.num_steps, self.method
+        )  # type: ignore
+
+    @property
+    def inv(self) -> Transform:
+        return FixedStepJacobianTransform(
+            f=self.f,
+            t0=self.t1,
+            t1=self.t0,
+            phi=self.phi,
+            num_steps=self.num_steps,
+            method=self.method,
+            exact=self.exact,
+            num_probes=self.num_probes,
+        )
+
+    def _inverse(self, y: Tensor) -> Tensor:
+        return fixed_step_odeint(
+            self.f, y, self.t1, self.t0, self.num_steps, self.method
+        )  # type: ignore
+
+    def log_abs_det_jacobian(self, x: Tensor, y: Tensor) -> Tensor:
+        _, ladj = self.call_and_ladj(x)
+        return ladj
+
+    def call_and_ladj(self, x: Tensor) -> Tuple[Tensor, Tensor]:
+        create_graph = torch.is_grad_enabled() and (x.requires_grad or bool(self.phi))
+
+        if self.exact:
+            probes = torch.eye(x.shape[-1], dtype=x.dtype, device=x.device)
+            probes = probes.expand(*x.shape, -1).movedim(-1, 0)
+        else:
+            # The same probes are used in all steps, such that the estimate of the
+            # integrated trace is unbiased.
+            probes = torch.randint_like(x.expand(self.num_probes, *x.shape), 2)
+            probes = 2 * probes - 1
+
+        def f_aug(t: Tensor, state: Tuple[Tensor, Tensor]) -> Tuple[Tensor, Tensor]:
+            x = state[0]
+            with torch.enable_grad():
+                x = x.clone().requires_grad_()
+                dx = self.f(t, x)
+
+            vjp = torch.autograd.grad(
+                dx, x, probes, create_graph=create_graph, is_grads_batched=True
+            )[0]
+            if self.exact:
+                trace = torch.einsum("i...i", vjp)
+            else:
+                trace = (vjp * probes).sum(dim=-1).mean(dim=0)
+            return dx, trace
+
+        ladj = torch.zeros_like(x[..., 0])
+        y, ladj = fixed_step_odeint(
+            f_aug, (x, ladj), self.t0, self.t1, self.num_steps, self.method
+        )  # type: ignore
+        return y, ladj
+
+
+class FixedStepNeuralODE(NeuralODE):
+    def __init__(
+        self,
+        f: NeuralODEFunc,
+        net: nn.Module,
+        mean_base: Tensor,
+        std_base: Tensor,
+        t_min: float = 0.0,
+        t_max: float = 1.0,
+        num_steps: int = 50,
+        method: str = "rk4",
+        exact: bool = False,
+        num_probes: int = 1,
+    ) -> None:
+        r"""
+        Initialize the FixedStepNeuralODE class.
+
+        Solves the ODE with a fixed number of steps of an explicit Runge-Kutta
+        method. Unlike the adaptive `ZukoNeuralODE`, the cost of sampling and of
+        evaluating the log-probability is known in advance (`num_steps` times the
+        number of stages of `method` evaluations of `f`), and, by default, the
+        log-determinant of the Jacobian is estimated with Hutchinson's trace
+        estimator instead of being computed exactly.
+
+        Args:
+            f: The function to be integrated that implements the `NeuralODEFunc`
+                protocol. Must accept three arguments in the order:
+                - input (Tensor): The input state tensor :math:`\theta_t`
+                - condition (Tensor): The conditioning tensor :math:`x_o`
+                - times (Tensor): The time parameter tensor :math:`t`
+            net: The neural network that is used by the function :math:`f`.
+                This is never called explicitly by the NeuralODE class,
+                but is used to track the parameters of the neural network.
+            mean_base: The mean of the base distribution.
+                Expected shape: (1, theta_dim).
+            std_base: The std of the base distribution.
+                Expected shape: (1, theta_dim).
+            t_min: The minimum time value for the ODE solver.
+            t_max: The maximum time value for the ODE solver.
+            num_steps: The number of integration steps.
+            method: The integration method, one of "euler", "midpoint" or "rk4".
+            exact: Whether the exact log-determinant of the Jacobian or an unbiased
+                stochastic estimate thereof is calculated.
+            num_probes: The number of probe vectors of the stochastic estimate of
+                the log-determinant. More probes reduce its variance.
+        """
+
+        super().__init__(
+            f,
+            net,
+            mean_base,
+            std_base,
+            t_min,
+            t_max,
+            num_steps=num_steps,
+            method=method,
+            exact=exact,
+            num_probes=num_probes,
+        )
+
+    def get_distribution(self, condition: Tensor, **kwargs) -> Distribution:
+        """
+        Get the distribution that wraps the ODE solver.
+
+        Args:
+            condition: The condition tensor.
+            **kwargs: Additional arguments for the ODE solver.
+
+        Returns:
+            The distribution object with `log_prob` and
+            `sample` methods that wraps the ODE solver.
+        """
+        transform = FixedStepJacobianTransform(
+            f=lambda t, input: self.f(input, condition, t),
+            t0=condition.new_tensor(self.t_min),
+            t1=condition.new_tensor(self.t_max),
+            phi=(condition, *self.net.parameters()),
+            **kwargs,
+        )
+
+        return NormalizingFlow(
+            transform=transform,
+            base=DiagNormal(self.mean_base, self.std_base).expand(condition.shape[:-1]),
+        )
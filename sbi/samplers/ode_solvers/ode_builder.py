@@ -8,6 +8,7 @@ Builder for ODE solvers.
 from torch import Tensor, nn
 
 from sbi.samplers.ode_solvers.base import NeuralODE, NeuralODEFunc
+from sbi.samplers.ode_solvers.fixed_step_ode import FixedStepNeuralODE
 from sbi.samplers.ode_solvers.zuko_ode import ZukoNeuralODE
 
 
@@ -35,7 +36,9 @@ def build_neural_ode(
             but is used to track the parameters of the neural network.
         mean_base: The mean of the base distribution.
         std_base: The std of the base distribution.
-        backend: The backend to be used. Currently only "zuko" is supported.
+        backend: The backend to be used. Either "zuko" (adaptive step sizes and, by
+            default, exact log-determinants) or "fixed_step" (fixed number of
+            Runge-Kutta steps and, by default, stochastic log-determinants).
         t_min: The minimum time value.
         t_max: The maximum time value.
         **kwargs: Additional arguments provided to the backend.
@@ -48,5 +51,7 @@ def build_neural_ode(
     """
     if backend == "zuko":
         return ZukoNeuralODE(f, net, mean_base, std_base, t_min, t_max, **kwargs)
+    elif backend == "fixed_step":
+        return FixedStepNeuralODE(f, net, mean_base, std_base, t_min, t_max, **kwargs)
     else:
         raise ValueError(f"Backend {backend} not supported")
@@ -260,8 +260,13 @@ def accept_reject_sample(
     # NOTE: We might want to change this to a more general approach in the future.
     # Currently limited to a single "batch_dim" for the condition.
     # But this would require giving the method the condition_shape explicitly...
-    if "condition" in proposal_sampling_kwargs:
-        num_xos = proposal_sampling_kwargs["condition"].shape[0]
+    condition = proposal_sampling_kwargs.get("condition")
+    if condition is not None:
+        num_xos = condition.shape[0]
+    # Observations for which enough samples have been accepted are retired, i.e. no
+    # longer passed to the proposal. This requires the condition to be passed
+    # explicitly.
+    retire_completed = condition is not None and num_xos > 1
 
     pbar = tqdm(
         disable=not show_progress_bars,
@@ -269,47 +274,81 @@ def accept_reject_sample(
         desc=f"Drawing {num_samples} posterior samples for {num_xos} observations",
     )
 
-    accepted = [[] for _ in range(num_xos)]
-    acceptance_rate = torch.full((num_xos,), float("Nan"))
+    # Accepted samples are written into a preallocated buffer of shape
+    # `(num_samples, num_xos, *event_shape)`, which is created after the first draw.
+    samples = torch.empty(0)
+    output_shape = torch.Size()
+    # Indices of the observations for which the proposal draws candidates.
+    proposed_xos = torch.arange(num_xos)
+    num_filled = torch.zeros(num_xos, dtype=torch.long)
+    num_accepted_total = torch.zeros(num_xos)
+    num_proposed = torch.zeros(num_xos)
     leakage_warning_raised = False
-    # Ruff suggestion
 
     # To cover cases with few samples without leakage:
     sampling_batch_size = min(num_samples, max_sampling_batch_size)
-    num_sampled_total = torch.zeros(num_xos)
-    num_samples_possible = 0
     while num_remaining > 0:
         # Sample and reject.
-        candidates = proposal(
-            (sampling_batch_size,),  # type: ignore
-            **proposal_sampling_kwargs,
-        )
+        if retire_completed and len(proposed_xos) < num_xos:
+            candidates = proposal(
+                (sampling_batch_size,),  # type: ignore
+                **{
+                    **proposal_sampling_kwargs,
+                    "condition": condition[proposed_xos.to(condition.device)],  # type: ignore
+                },
+            )
+        else:
+            candidates = proposal(
+                (sampling_batch_size,),  # type: ignore
+                **proposal_sampling_kwargs,
+            )
+        if samples.numel() == 0:
+            output_shape = candidates.shape[1:]
+            event_shape = candidates.shape[candidates.ndim - 1 :]
+            samples = candidates.new_empty((num_samples, num_xos, *event_shape))
+            device = candidates.device
+            proposed_xos = proposed_xos.to(device)
+            num_filled = num_filled.to(device)
+            num_accepted_total = num_accepted_total.to(device)
+            num_proposed = num_proposed.to(device)
+
         # SNPE-style rejection-sampling when the proposal is the neural net.
         are_accepted = accept_reject_fn(candidates)
         # Reshape necessary in certain cases which do not follow the shape conventions
         # of the "DensityEstimator" class.
-        are_accepted = are_accepted.reshape(sampling_batch_size, num_xos)
-        candidates_to_reject = candidates.reshape(
-            sampling_batch_size, num_xos, *candidates.shape[candidates.ndim - 1 :]
+        num_proposed_xos = len(proposed_xos)
+        are_accepted = are_accepted.reshape(sampling_batch_size, num_proposed_xos)
+        are_accepted = are_accepted.to(samples.device)
+        candidates = candidates.reshape(
+            sampling_batch_size, num_proposed_xos, *samples.shape[2:]
         )
 
-        for i in range(num_xos):
-            accepted[i].append(candidates_to_reject[are_accepted[:, i], i])
-
-        # Update.
+        # The i-th accepted candidate of an observation is written to the row
+        # `num_filled + i` of the buffer, unless the buffer is full.
         # Note: For any condition of shape (*batch_shape, *condition_shape), the
         # samples will be of shape(sampling_batch_size,*batch_shape, *event_shape)
         # and hence work in dim = 0.
-        num_accepted = are_accepted.sum(dim=0)
-        num_sampled_total += num_accepted.to(num_sampled_total.device)
-        num_samples_possible += sampling_batch_size
-        min_num_accepted = num_accepted.min().item()
-        num_remaining -= min_num_accepted
-        pbar.update(min_num_accepted)
+        rows = torch.cumsum(are_accepted, dim=0) - 1 + num_filled[proposed_xos]
+        are_kept = are_accepted & (rows < num_samples)
+        sample_idx, xo_idx = torch.nonzero(are_kept, as_tuple=True)
+        samples[rows[sample_idx, xo_idx], proposed_xos[xo_idx]] = candidates[
+            sample_idx, xo_idx
+        ]
+
+        # Update.
+        num_filled[proposed_xos] += are_kept.sum(dim=0)
+        num_accepted_total[proposed_xos] += are_accepted.sum(dim=0)
+        num_proposed[proposed_xos] += sampling_batch_size
+        num_remaining_new = num_samples - int(num_filled.min().item())
+        pbar.update(num_remaining - num_remaining_new)
+        num_remaining = num_remaining_new
+
+        if retire_completed:
+            proposed_xos = torch.nonzero(num_filled < num_samples).squeeze(-1)
 
         # To avoid endless sampling when leakage is high, we raise a warning if the
         # acceptance rate is too low after the first 1_000 samples.
-        acceptance_rate = num_sampled_total / num_samples_possible
+        acceptance_rate = num_accepted_total / num_proposed
         min_acceptance_rate = acceptance_rate.min().item()
 
         # For remaining iterations (leakage or many samples) continue
@@ -321,7 +360,7 @@ def accept_reject_sample(
             max(int(1.5 * num_remaining / max(min_acceptance_rate, 1e-12)), 100),
         )
         if (
-            num_samples_possible > 1000
+            num_proposed.max().item() > 1000
             and min_acceptance_rate < warn_acceptance
             and not leakage_warning_raised
         ):
@@ -356,12 +395,6 @@ def accept_reject_sample(
 
     pbar.close()
 
-    # When in case of leakage a batch size was used there could be too many samples.
-    samples = [torch.cat(accepted[i], dim=0)[:num_samples] for i in range(num_xos)]
-    samples = torch.stack(samples, dim=1)
-    samples = samples.reshape(num_samples, *candidates.shape[1:])
-    assert samples.shape[0] == num_samples, (
-        "Number of accepted samples must match required samples."
-    )
+    samples = samples.reshape(num_samples, *output_shape)
 
     return samples, as_tensor(acceptance_rate, device=samples.device)
@@ -2,7 +2,12 @@
 # under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
 
 import math
-from typing import Optional, Union
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from copy import copy
+from itertools import islice
+from queue import Queue
+from typing import Deque, Iterator, Optional, Union
 
 import torch
 from torch import Tensor
@@ -166,3 +171,89 @@ class Diffuser:
             return torch.cat(intermediate_samples, dim=0)
         else:
             return samples
+
+    def run_in_chunks(
+        self,
+        num_samples: int,
+        ts: Tensor,
+        chunk_size: int,
+        num_workers: int = 1,
+        show_progress_bars: bool = True,
+    ) -> Iterator[Tensor]:
+        """Yields samples from the distribution at the final time point in chunks.
+
+        Every chunk is propagated over the whole time grid by `run()`, and is yielded
+        as soon as it is done. Hence, at most `num_workers` chunks are held in memory
+        at the same time (plus the chunks which are kept by the caller).
+
+        Args:
+            num_samples: Total number of samples to draw.
+            ts: Time grid to propagate samples forward, or "solve" the SDE.
+            chunk_size: Maximum number of samples per chunk.
+            num_workers: Number of threads which propagate chunks concurrently. This
+                can keep all cores busy on CPU if every chunk alone does not (e.g.
+                for small networks). In that case, consider limiting the number of
+                threads used by each operation with `torch.set_num_threads()`. Every
+                thread uses its own (shallow) copy of the predictor and corrector,
+                whereas the potential and its network are shared and must not be
+                modified while sampling. Random numbers are drawn from the global
+                generator by all threads, such that the samples are not reproducible
+                by seeding if `num_workers > 1`.
+            show_progress_bars: Whether to show a progress bar.
+
+        Yields:
+            Chunks of samples, in order, of shape `(chunk_size, *batch_shape,
+            *input_shape)` (the last chunk may be smaller).
+        """
+        chunk_sizes = [
+            min(chunk_size, num_samples - start)
+            for start in range(0, num_samples, chunk_size)
+        ]
+
+        if num_workers <= 1:
+            for size in chunk_sizes:
+                yield self.run(size, ts, show_progress_bars=show_progress_bars)
+            return
+
+        pbar = tqdm(
+            total=num_samples,
+            disable=not show_progress_bars,
+            desc=f"Drawing {num_samples} posterior samples",
+        )
+        # Every running chunk takes a diffuser from the queue, such that no two
+        # threads share a predictor or corrector.
+        diffusers: Queue = Queue()
+        for _ in range(num_workers):
+            diffusers.put(self._copy_for_worker())
+
+        def run_chunk(size: int) -> Tensor:
+            diffuser = diffusers.get()
+            try:
+                return diffuser.run(size, ts, show_progress_bars=False)
+            finally:
+                diffusers.put(diffuser)
+
+        remaining_sizes = iter(chunk_sizes)
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            # Keep all workers busy while the caller processes the yielded chunk.
+            pending: Deque[Future] = deque(
+                pool.submit(run_chunk, size)
+                for size in islice(remaining_sizes, num_workers)
+            )
+            while pending:
+                chunk = pending.popleft().result()
+                for size in islice(remaining_sizes, 1):
+                    pending.append(pool.submit(run_chunk, size))
+                pbar.update(chunk.shape[0])
+                yield chunk
+        pbar.close()
+
+    def _copy_for_worker(self) -> "Diffuser":
+        """Returns a copy with its own predictor and corrector, which share the
+        potential with the ones of this diffuser."""
+        diffuser = copy(self)
+        diffuser.predictor = copy(self.predictor)
+        if self.corrector is not None:
+            diffuser.corrector = copy(self.corrector)
+            diffuser.corrector.predictor = diffuser.predictor
+        return diffuser
@@ -0,0 +1,277 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
+
+from bisect import bisect_right
+from contextlib import suppress
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+from torch import Tensor
+from torch.utils import data
+
+
+class RoundwiseDataset(data.Dataset):
+    def __init__(self, *roundwise_tensors: Sequence[Tensor]):
+        """Dataset over data that is stored in several chunks (e.g. one per round).
+
+        Unlike a `TensorDataset` over the concatenated rounds, the chunks are never
+        concatenated. A global index is mapped to the chunk it falls into and to the
+        index within that chunk, such that chunks can be memory-mapped arrays which
+        are only read when a sample is requested.
+
+        Args:
+            roundwise_tensors: One sequence of tensors per variable (e.g. theta, x and
+                prior masks). All sequences must contain the same number of chunks,
+                and the i-th chunk of each variable must have the same length.
+        """
+        if len({len(tensors) for tensors in roundwise_tensors}) != 1:
+            raise ValueError(
+                "All variables must be stored in the same number of rounds."
+            )
+        for chunks in zip(*roundwise_tensors, strict=True):
+            if len({chunk.shape[0] for chunk in chunks}) != 1:
+                raise ValueError("Chunks of a round must all have the same length.")
+
+        self._roundwise_tensors = [list(tensors) for tensors in roundwise_tensors]
+        sizes = [chunk.shape[0] for chunk in self._roundwise_tensors[0]]
+        self._offsets: List[int] = np.concatenate([[0], np.cumsum(sizes)]).tolist()
+
+    def __len__(self) -> int:
+        return self._offsets[-1]
+
+    def __getitem__(
+        self, index: Union[int, List[int], Tensor]
+    ) -> Tuple[Tensor, ...]:
+        """Returns the samples at `index` for all variables.
+
+        Args:
+            index: Either a single integer, or a one-dimensional tensor or list of
+                indices (e.g. as drawn by a `BatchSampler`), in which case the
+                selected samples are gathered round by round.
+        """
+        if isinstance(index, list):
+            index = torch.as_tensor(index, dtype=torch.long)
+        if isinstance(index, Tensor) and index.ndim > 0:
+            return self._gather(index)
+
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Index {index} out of range for {len(self)} samples.")
+        chunk = bisect_right(self._offsets, index) - 1
+        local_index = index - self._offsets[chunk]
+        return tuple(tensors[chunk][local_index] for tensors in self._roundwise_tensors)
+
+    def _gather(self, indices: Tensor) -> Tuple[Tensor, ...]:
+        """Returns the samples at `indices`, reading only the selected rows."""
+        indices = indices.to("cpu", torch.long)
+        offsets = torch.as_tensor(self._offsets)
+        chunks = torch.searchsorted(offsets, indices, right=True) - 1
+
+        gathered = []
+        for tensors in self._roundwise_tensors:
+            out = torch.empty(
+                (len(indices), *tensors[0].shape[1:]),
+                dtype=tensors[0].dtype,
+                device=tensors[0].device,
+            )
+            for chunk in chunks.unique().tolist():
+                in_chunk = chunks == chunk
+                local_indices = indices[in_chunk] - self._offsets[chunk]
+                rows = tensors[chunk][local_indices.to(tensors[chunk].device)]
+                out[in_chunk.to(out.device)] = rows.to(out.device)
+            gathered.append(out)
+        return tuple(gathered)
+
+
+class DeviceDataLoader:
+    def __init__(
+        self,
+        tensors: Sequence[Tensor],
+        indices: Tensor,
+        batch_size: int,
+        shuffle: bool = True,
+        drop_last: bool = True,
+    ):
+        """Loader which draws batches from tensors by indexing, without a `DataLoader`.
+
+        All tensors are kept on their device (typically the training device). Every
+        epoch, `indices` are permuted on that device and batches are gathered from
+        consecutive slices of the permutation. This avoids the per-sample indexing,
+        collation and host-to-device copies of a `torch.utils.data.DataLoader`.
+
+        Args:
+            tensors: Tensors of equal length and on the same device, e.g. theta, x and
+                prior masks.
+            indices: Indices of the samples to draw batches from (e.g. the indices of
+                the training set).
+            batch_size: Number of samples per batch.
+            shuffle: Whether to permute the indices at the start of every epoch.
+            drop_last: Whether to drop the last batch if it is incomplete.
+        """
+        self.tensors = list(tensors)
+        self.indices = indices.to(self.tensors[0].device)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            return len(self.indices) // self.batch_size
+        return -(-len(self.indices) // self.batch_size)
+
+    def __iter__(self) -> Iterator[Tuple[Tensor, ...]]:
+        indices = self.indices
+        if self.shuffle:
+            indices = indices[torch.randperm(len(indices), device=indices.device)]
+        for start in range(0, len(self) * self.batch_size, self.batch_size):
+            batch_indices = indices[start : start + self.batch_size]
+            yield tuple(tensor[batch_indices] for tensor in self.tensors)
+
+
+class SimulationBuffer:
+    def __init__(self, names: Sequence[str]):
+        """Contiguous storage for variables that are appended round by round.
+
+        Each variable (e.g. theta, x and prior masks) is kept in a single
+        preallocated tensor whose capacity is doubled whenever an appended round does
+        not fit, such that appending is amortized linear in the number of samples.
+        The first round is adopted as it is (e.g. a memory-mapped tensor stays
+        memory-mapped), such that a single round is never copied. Rounds, and all
+        rounds from a contiguous range, are returned as views into that tensor, i.e.
+        without copying.
+
+        Args:
+            names: Names of the stored variables, used as file names if the buffer
+                is stored on disk (see `to_disk()`).
+        """
+        self._names = list(names)
+        self._data: List[Tensor] = []
+        self._bounds: List[Tuple[int, int]] = []
+        self._size = 0
+        self._directory: Optional[Path] = None
+        self._files: List[Optional[Path]] = []
+        self._num_allocations = 0
+
+    def __len__(self) -> int:
+        """Returns the number of appended rounds."""
+        return len(self._bounds)
+
+    @property
+    def capacity(self) -> int:
+        return self._data[0].shape[0] if self._data else 0
+
+    def append(self, *tensors: Tensor):
+        """Appends one round of data, one tensor per variable.
+
+        Args:
+            tensors: Tensors of the same length, whose trailing shapes must match the
+                ones of previously appended rounds. They are cast to the dtype and
+                device of the buffer.
+        """
+        if len(tensors) != len(self._names):
+            raise ValueError(
+                f"Expected {len(self._names)} tensors, got {len(tensors)}."
+            )
+        num_samples = tensors[0].shape[0]
+        if any(t.shape[0] != num_samples for t in tensors):
+            raise ValueError("All appended tensors must have the same length.")
+        for name, tensor, data_ in zip(self._names, tensors, self._data, strict=False):
+            if tensor.shape[1:] != data_.shape[1:]:
+                raise ValueError(
+                    f"Shape {tuple(tensor.shape[1:])} of appended `{name}` does not "
+                    f"match the shape {tuple(data_.shape[1:])} of previous rounds."
+                )
+
+        if not self._data and self._directory is None:
+            # Adopt the first round without copying. Its capacity is exhausted, so
+            # the next round reallocates instead of writing into the tensors.
+            self._data = list(tensors)
+            self._files = [None] * len(tensors)
+            self._bounds.append((0, num_samples))
+            self._size = num_samples
+            return
+
+        if self._size + num_samples > self.capacity:
+            self._reallocate(
+                max(2 * self.capacity, self._size + num_samples),
+                like=self._data or list(tensors),
+            )
+        start, end = self._size, self._size + num_samples
+        for data_, tensor in zip(self._data, tensors, strict=True):
+            data_[start:end] = tensor.to(data_.device)
+        self._bounds.append((start, end))
+        self._size = end
+
+    def round(self, index: int) -> Tuple[Tensor, ...]:
+        """Returns views of all variables for the round at position `index`."""
+        start, end = self._bounds[index]
+        return tuple(data_[start:end] for data_ in self._data)
+
+    def get(self, indices: Sequence[int]) -> Tuple[Tensor, ...]:
+        """Returns all variables of the rounds at positions `indices`.
+
+        If the rounds are stored contiguously (which is the case for any range of
+        rounds in the order they were appended), views are returned. Otherwise, the
+        rounds are concatenated.
+        """
+        indices = list(indices)
+        if not indices:
+            raise ValueError("No rounds selected.")
+        if indices == list(range(indices[0], indices[-1] + 1)):
+            start, end = self._bounds[indices[0]][0], self._bounds[indices[-1]][1]
+            return tuple(data_[start:end] for data_ in self._data)
+        rounds = [self.round(i) for i in indices]
+        return tuple(torch.cat(chunks) for chunks in zip(*rounds, strict=True))
+
+    def to_disk(self, directory: Union[str, Path]):
+        """Moves all data to memory-mapped `.npy` files in `directory`.
+
+        Data appended afterwards is also written to `directory`. Memory-mapped data
+        lives on the CPU.
+        """
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        if self._data:
+            self._reallocate(self.capacity, like=self._data)
+
+    def _reallocate(self, capacity: int, like: Sequence[Tensor]):
+        """Moves the stored data into new tensors with `capacity` rows."""
+        new_data, new_files = [], []
+        for name, tensor in zip(self._names, like, strict=True):
+            shape = (capacity, *tensor.shape[1:])
+            if self._directory is None:
+                new = torch.empty(shape, dtype=tensor.dtype, device=tensor.device)
+                file = None
+            else:
+                file = self._directory / f"{name}_{self._num_allocations:04d}.npy"
+                dtype = torch.empty(0, dtype=tensor.dtype).numpy().dtype
+                new = torch.from_numpy(
+                    np.lib.format.open_memmap(
+                        str(file), mode="w+", dtype=dtype, shape=shape
+                    )
+                )
+            new_data.append(new)
+            new_files.append(file)
+        for new, old in zip(new_data, self._data, strict=False):
+            new[: self._size] = old[: self._size].to(new.device)
+
+        # Files of the previous allocation are no longer needed. On some platforms,
+        # they can not be removed while views of them are still alive.
+        for file in self._files:
+            if file is not None:
+                with suppress(OSError):
+                    file.unlink()
+        self._data, self._files = new_data, new_files
+        self._num_allocations += 1
+
+    def __getstate__(self) -> Dict:
+        """Returns the state without the unused capacity of the buffer."""
+        state = self.__dict__.copy()
+        state["_data"] = [data_[: self._size].clone() for data_ in self._data]
+        state["_directory"] = None
+        state["_files"] = [None] * len(self._data)
+        return state
@@ -273,13 +273,13 @@ def wasserstein_2_squared(
     )
     if x.ndim == 2:
         nx, ny = x.shape[0], y.shape[0]
-        a = torch.ones(nx) / nx
-        b = torch.ones(ny) / ny
+        a = torch.ones(nx, device=x.device) / nx
+        b = torch.ones(ny, device=x.device) / ny
     elif x.ndim == 3:
         batch_size = x.shape[0]
         nx, ny = x.shape[1], y.shape[1]
-        a = torch.ones((batch_size, nx)) / nx
-        b = torch.ones((batch_size, ny)) / ny
+        a = torch.ones((batch_size, nx), device=x.device) / nx
+        b = torch.ones((batch_size, ny), device=x.device) / ny
     else:
         raise ValueError(
             "This implementation of Wasserstein is only implemented, "
@@ -332,46 +332,55 @@ def regularized_ot_dual(
     batched = True
     if a.ndim == 1 and b.ndim == 1:
         batched = False
-        na, nb = a.shape[0], b.shape[0]
         a = torch.atleast_2d(a)
         b = torch.atleast_2d(b)
         cost = cost.unsqueeze(0)
-    na, nb = a.shape[1], b.shape[1]
 
     # Define potentials
     f, g = torch.zeros_like(a), torch.zeros_like(b)
+    log_a, log_b = torch.log(a), torch.log(b)
 
-    def s(f, g):
+    def s(cost, f, g):
         return cost - f.unsqueeze(2) - g.unsqueeze(1)
 
-    err = torch.inf
-    iters = torch.zeros(a.shape[0])
-    terminated = torch.zeros(a.shape[0], dtype=torch.bool)
+    # The Sinkhorn iterations only run on the batch entries which have not converged
+    # yet. Converged entries are written back to `f` and `g` and dropped.
+    active = torch.arange(a.shape[0], device=a.device)
+    cost_active, f_active, g_active = cost, f, g
+    log_a_active, log_b_active = log_a, log_b
     for _ in range(max_iter):
-        f_prev, g_prev = f, g
-        f_tmp = f + epsilon * (
-            torch.log(a) - torch.logsumexp(-s(f, g) / epsilon, dim=2)
+        f_next = f_active + epsilon * (
+            log_a_active
+            - torch.logsumexp(-s(cost_active, f_active, g_active) / epsilon, dim=2)
         )
-        g_tmp = g + epsilon * (
-            torch.log(b) - torch.logsumexp(-s(f_tmp, g) / epsilon, dim=1)
+        g_next = g_active + epsilon * (
+            log_b_active
+            - torch.logsumexp(-s(cost_active, f_next, g_active) / epsilon, dim=1)
         )
-        f = torch.where(terminated.unsqueeze(-1).repeat((1, na)), f, f_tmp)
-        g = torch.where(terminated.unsqueeze(-1).repeat((1, nb)), g, g_tmp)
-
-        err = torch.max((f_prev - f).abs().sum(dim=1), (g_prev - g).abs().sum(dim=1))
-        terminated = torch.logical_or(terminated, err < tol)
-        if torch.all(terminated):
-            break
-        if iters.max() == max_iter:
-            warning(
-                f"Sinkhorn iterations did not converge within {max_iter} iterations. "
-                f"Consider a bigger regularization parameter 'epsilon' "
-                "or increasing 'max_iter'."
-            )
+        err = torch.max(
+            (f_active - f_next).abs().sum(dim=1), (g_active - g_next).abs().sum(dim=1)
+        )
+        f_active, g_active = f_next, g_next
+
+        is_active = err >= tol
+        if not torch.all(is_active):
+            f[active], g[active] = f_active, g_active
+            active = active[is_active]
+            cost_active = cost_active[is_active]
+            f_active, g_active = f_active[is_active], g_active[is_active]
+            log_a_active = log_a_active[is_active]
+            log_b_active = log_b_active[is_active]
+        if active.shape[0] == 0:
             break
-        iters = torch.where(terminated, iters, iters + 1)
+    else:
+        f[active], g[active] = f_active, g_active
+        warning(
+            f"Sinkhorn iterations did not converge within {max_iter} iterations. "
+            f"Consider a bigger regularization parameter 'epsilon' "
+            "or increasing 'max_iter'."
+        )
 
-    coupling = torch.exp(-s(f, g) / epsilon)
+    coupling = torch.exp(-s(cost, f, g) / epsilon)
 
     if not batched:
         coupling = coupling.squeeze(0)
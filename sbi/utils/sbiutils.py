@@ -994,6 +994,147 @@ def gradient_ascent(
     return theta_transform.inv(best_theta_overall), max_val  # type: ignore
 
 
+def gradient_ascent_batched(
+    potential_fn: Callable[[Tensor, Tensor], Tensor],
+    inits: Tensor,
+    x: Tensor,
+    theta_transform: Optional[torch_tf.Transform] = None,
+    num_iter: int = 1_000,
+    num_to_optimize: int = 100,
+    learning_rate: float = 0.01,
+    patience: int = 50,
+    tolerance: float = 1e-4,
+    show_progress_bars: bool = False,
+    interruption_note: str = "",
+) -> Tuple[Tensor, Tensor]:
+    """Returns the `argmax` and `max` of a `potential_fn` for every observation in a
+    batch via gradient ascent.
+
+    Unlike `gradient_ascent()`, the parameters of all observations are optimized
+    jointly by a single optimizer. The best parameters of every observation are
+    tracked with the potentials which are computed anyways for the gradient steps,
+    such that no additional evaluations of the `potential_fn` are needed. An
+    observation is no longer optimized once its best potential has not improved by
+    more than `tolerance` for `patience` consecutive iterations.
+
+    The method can be interrupted (Ctrl-C), in which case the currently best
+    estimates are returned.
+
+    Args:
+        potential_fn: The function on which to optimize. Takes parameters of shape
+            `(num_x, num_thetas, *theta_shape)` and the corresponding observations of
+            shape `(num_x, *x_shape)`, and returns potentials of shape
+            `(num_x, num_thetas)`.
+        inits: The initial parameters at which to start the gradient ascent steps,
+            of shape `(num_x, num_inits, *theta_shape)`.
+        x: The observations, of shape `(num_x, *x_shape)`.
+        theta_transform: If passed, this transformation will be applied during the
+            optimization.
+        num_iter: Maximal number of optimization steps.
+        num_to_optimize: From the `num_inits` initial parameters of every
+            observation, use the `num_to_optimize` with highest potential as the
+            initial points for the optimization.
+        learning_rate: Learning rate of the optimizer.
+        patience: Number of iterations without improvement after which the
+            optimization of an observation is stopped.
+        tolerance: Minimal increase of the best potential of an observation which
+            counts as an improvement.
+        show_progress_bars: Whether to show a progressbar for the optimization.
+        interruption_note: The message printed when the user interrupts the
+            optimization.
+
+    Returns:
+        The `argmax` of shape `(num_x, *theta_shape)` and the `max` of shape
+        `(num_x,)` of the `potential_fn` for every observation.
+    """
+
+    if theta_transform is None:
+        theta_transform = torch_tf.IndependentTransform(
+            torch_tf.identity_transform, reinterpreted_batch_ndims=1
+        )
+
+    num_x = x.shape[0]
+    init_log_probs = potential_fn(inits, x).detach()
+    inits = inits.to(init_log_probs.device)
+
+    # Pick the `num_to_optimize` best init locations of every observation.
+    num_to_optimize = min(num_to_optimize, inits.shape[1])
+    top_indices = torch.topk(init_log_probs, num_to_optimize, dim=1).indices
+    optimize_inits = inits[torch.arange(num_x).unsqueeze(1), top_indices]
+
+    best_theta = optimize_inits[:, 0].detach().clone()
+    best_log_prob = init_log_probs.gather(1, top_indices[:, :1]).squeeze(1)
+
+    params = theta_transform(optimize_inits).detach()  # type: ignore
+    params.requires_grad_(True)
+    optimizer = Adam([params], lr=learning_rate)
+
+    active = torch.ones(num_x, dtype=torch.bool, device=best_log_prob.device)
+    num_stale_iters = torch.zeros(num_x, dtype=torch.long, device=active.device)
+
+    def update_best(indices: Tensor, theta: Tensor, log_probs: Tensor) -> Tensor:
+        """Updates the best estimates of the observations `indices` and returns
+        whether they improved by more than `tolerance`."""
+        iter_max, iter_argmax = log_probs.max(dim=1)
+        improvement = iter_max - best_log_prob[indices]
+        improved = improvement > 0
+        best_log_prob[indices[improved]] = iter_max[improved]
+        best_theta[indices[improved]] = theta[improved, iter_argmax[improved]]
+        return improvement > tolerance
+
+    iter_ = 0
+
+    # Try-except block in case the user interrupts the program and wants to fall
+    # back on the best estimates so far.
+    try:
+        while iter_ < num_iter and active.any():
+            indices = torch.nonzero(active).squeeze(1)
+            optimizer.zero_grad()
+            theta = theta_transform.inv(params[indices])  # type: ignore
+            log_probs = potential_fn(theta, x[indices]).reshape(len(indices), -1)
+            loss = -log_probs.sum()
+            loss.backward()
+
+            with torch.no_grad():
+                # The potentials of the current step are those before the update
+                # of the parameters.
+                improved = update_best(indices, theta.detach(), log_probs.detach())
+                num_stale_iters[indices] = torch.where(
+                    improved, 0, num_stale_iters[indices] + 1
+                )
+                active[indices] = num_stale_iters[indices] < patience
+
+            # Parameters of stopped observations receive zero gradients. They may
+            # still be moved by the momentum of the optimizer, but are not
+            # evaluated anymore.
+            optimizer.step()
+            iter_ += 1
+
+            if show_progress_bars:
+                print(
+                    "\r",
+                    f"Optimizing MAP estimates. Iterations: {iter_} / {num_iter}. "
+                    f"Converged observations: {num_x - int(active.sum())} / "
+                    f"{num_x}. Press Ctrl-C to interrupt.",
+                    end="",
+                )
+
+        # Evaluate the parameters after the last step of the observations which
+        # were optimized until the end.
+        if active.any():
+            with torch.no_grad():
+                indices = torch.nonzero(active).squeeze(1)
+                theta = theta_transform.inv(params[indices])  # type: ignore
+                log_probs = potential_fn(theta, x[indices]).reshape(len(indices), -1)
+                update_best(indices, theta, log_probs.detach())
+
+    except KeyboardInterrupt:
+        interruption = f"Optimization was interrupted after {iter_} iterations. "
+        print(interruption + interruption_note)
+
+    return best_theta, best_log_prob
+
+
 def seed_all_backends(seed: Optional[Union[int, Tensor]] = None) -> None:
     """Sets all python, numpy and pytorch seeds."""
 
@@ -1,7 +1,13 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
 
-from typing import Any, Callable, Optional, Tuple, Union
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import torch
@@ -26,6 +32,9 @@ def simulate_for_sbi(
     simulation_batch_size: Union[int, None] = 1,
     seed: Optional[int] = None,
     show_progress_bar: bool = True,
+    preallocate_x: bool = False,
+    x_memmap_file: Optional[str] = None,
+    store: Optional["SimulationStore"] = None,
 ) -> Tuple[Tensor, Tensor]:
     r"""Returns pairs :math:`(\theta, x)` by sampling proposal and running simulations.
 
@@ -55,9 +64,28 @@ def simulate_for_sbi(
         show_progress_bar: Whether to show a progress bar for simulating. This will not
             affect whether there will be a progressbar while drawing samples from the
             proposal.
+        preallocate_x: Whether to write the simulation outputs directly into a
+            preallocated, memory-mapped array instead of collecting all batches in a
+            list and concatenating them. Each worker writes its batch into its slice
+            of the array, such that at most one copy of `x` is held in memory. The
+            first batch is simulated in the main process to infer the shape and dtype
+            of `x`.
+        x_memmap_file: Path of the `.npy` file that backs `x` if
+            `preallocate_x=True`. The file is kept after simulating. If None, a
+            temporary file is used, which is removed once it is no longer needed
+            (on POSIX systems).
+        store: `SimulationStore` to which every batch of simulations is written as
+            soon as it is complete. Batches that the store already holds from a
+            previous (e.g. interrupted) call are skipped. If passed, the returned
+            $\theta$ and $x$ are read from the store, see `SimulationStore.load()`.
+            Resuming requires the same `num_simulations`, `simulation_batch_size`
+            and `num_workers`, and the same `seed` to reproduce the parameters,
+            which are checked against the ones in the store.
 
     Returns: Sampled parameters $\theta$ and simulation-outputs $x$.
     """
+    if store is not None and preallocate_x:
+        raise ValueError("`store` and `preallocate_x=True` can not be combined.")
 
     if num_simulations == 0:
         theta = torch.tensor([], dtype=float32)
@@ -88,17 +116,38 @@ def simulate_for_sbi(
                 return simulator(theta)
 
             try:  # catch TypeError to give more informative error message
-                simulation_outputs: list[Tensor] = [  # pyright: ignore
-                    xx
-                    for xx in tqdm(
-                        Parallel(return_as="generator", n_jobs=num_workers)(
-                            delayed(simulator_seeded)(batch, seed)
-                            for batch, seed in zip(batches, batch_seeds, strict=False)
-                        ),
-                        total=num_simulations,
-                        disable=not show_progress_bar,
+                if store is not None:
+                    _simulate_into_store(
+                        simulator,
+                        batches,
+                        batch_seeds,
+                        num_workers=num_workers,
+                        store=store,
+                        show_progress_bar=show_progress_bar,
                     )
-                ]
+                elif preallocate_x:
+                    x = _simulate_into_memmap(
+                        simulator,
+                        batches,
+                        batch_seeds,
+                        num_workers=num_workers,
+                        x_memmap_file=x_memmap_file,
+                        show_progress_bar=show_progress_bar,
+                    )
+                else:
+                    simulation_outputs: list[Tensor] = [  # pyright: ignore
+                        xx
+                        for xx in tqdm(
+                            Parallel(return_as="generator", n_jobs=num_workers)(
+                                delayed(simulator_seeded)(batch, seed)
+                                for batch, seed in zip(
+                                    batches, batch_seeds, strict=False
+                                )
+                            ),
+                            total=num_simulations,
+                            disable=not show_progress_bar,
+                        )
+                    ]
             except TypeError as err:
                 raise TypeError(
                     "For multiprocessing, we switch to numpy arrays. Make sure to "
@@ -106,6 +155,28 @@ def simulate_for_sbi(
                     " arrays."
                 ) from err
 
+        elif store is not None:
+            # Seed every batch, such that resuming reproduces the simulations of an
+            # uninterrupted run.
+            batches = torch.split(theta, simulation_batch_size)
+            _simulate_into_store(
+                simulator,
+                batches,
+                np.random.randint(low=0, high=1_000_000, size=(len(batches),)),
+                num_workers=1,
+                store=store,
+                show_progress_bar=show_progress_bar,
+            )
+
+        elif preallocate_x:
+            x = _simulate_into_memmap(
+                simulator,
+                torch.split(theta, simulation_batch_size),
+                num_workers=1,
+                x_memmap_file=x_memmap_file,
+                show_progress_bar=show_progress_bar,
+            )
+
         else:
             simulation_outputs: list[Tensor] = []
             batches = torch.split(theta, simulation_batch_size)
@@ -113,7 +184,415 @@ def simulate_for_sbi(
                 simulation_outputs.append(simulator(batch))
 
         # Correctly format the output
-        x = torch.cat(simulation_outputs, dim=0)
+        if store is not None:
+            return store.load()
+        if not preallocate_x:
+            x = torch.cat(simulation_outputs, dim=0)
         theta = torch.as_tensor(theta, dtype=float32)
 
     return theta, x
+
+
+class SimulationStore:
+    """Persistent on-disk store of simulations, written chunk by chunk.
+
+    Every chunk holds the parameters and simulation outputs of one batch of
+    simulations and is saved as a pair of `.npy` files as soon as the batch is
+    complete. An index file keeps track of the completed chunks, the seeds they
+    were simulated with and a digest of their parameters, such that an interrupted
+    `simulate_for_sbi(..., store=store)` can be rerun with the same store and only
+    simulates the missing chunks.
+
+    Example:
+    ```
+    store = SimulationStore("simulations/")
+    theta, x = simulate_for_sbi(
+        simulator, prior, 10_000_000, num_workers=64, seed=0, store=store
+    )
+    # Later, or in another process, without running the simulator again:
+    inference.append_simulations(*SimulationStore("simulations/").load())
+    ```
+    """
+
+    _index_file = "index.json"
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Args:
+            path: Directory of the store. It is created if it does not exist, and
+                an existing store in it is resumed.
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        index_path = self.path / self._index_file
+        if index_path.exists():
+            with open(index_path) as f:
+                self._index: Dict[str, Any] = json.load(f)
+        else:
+            self._index = {"num_batches": None, "chunks": {}, "consolidated": None}
+
+    def __len__(self) -> int:
+        """Returns the number of simulations in all completed chunks."""
+        return sum(chunk["num_simulations"] for chunk in self._index["chunks"].values())
+
+    @property
+    def num_batches(self) -> Optional[int]:
+        """Number of batches the store was created for, None if it is empty."""
+        return self._index["num_batches"]
+
+    @property
+    def completed_batch_ids(self) -> List[int]:
+        """Sorted ids of all chunks that were written completely."""
+        return sorted(int(batch_id) for batch_id in self._index["chunks"])
+
+    def seed(self, batch_id: int) -> Optional[int]:
+        """Returns the seed the chunk `batch_id` was simulated with."""
+        return self._index["chunks"][str(batch_id)]["seed"]
+
+    def is_complete(self) -> bool:
+        """Returns whether all batches the store was created for are written."""
+        return self.num_batches is not None and len(self._index["chunks"]) == (
+            self.num_batches
+        )
+
+    def check_theta(self, batch_id: int, theta: Union[ndarray, Tensor]) -> None:
+        """Raises a ValueError if `theta` differs from the parameters of the chunk.
+
+        Args:
+            batch_id: Id of a completed chunk.
+            theta: Parameters that the chunk is expected to hold.
+        """
+        if self._index["chunks"][str(batch_id)]["theta_digest"] != _digest(theta):
+            raise ValueError(
+                f"The parameters of batch {batch_id} do not match the ones in the "
+                f"simulation store at {self.path}. Use the same `proposal` and "
+                "`seed` to resume, or use a new store."
+            )
+
+    def add_chunk(
+        self,
+        batch_id: int,
+        theta: Union[ndarray, Tensor],
+        x: Union[ndarray, Tensor],
+        seed: Optional[int] = None,
+    ) -> None:
+        """Writes a chunk of simulations to disk and registers it in the index.
+
+        Args:
+            batch_id: Id of the batch, determines the order of chunks in `load()`.
+            theta: Parameters of the batch.
+            x: Simulation outputs of the batch.
+            seed: Seed the batch was simulated with.
+        """
+        _write_chunk(self.path, batch_id, _as_numpy(theta), _as_numpy(x))
+        self._register_chunk(batch_id, theta, seed)
+
+    def load(self) -> Tuple[Tensor, Tensor]:
+        """Returns $\theta$ and $x$ of all completed chunks, ordered by batch id.
+
+        Chunks written since the last call are merged, chunk by chunk, into a single
+        `.npy` file for $\theta$ and for $x$, and are then removed, such that every
+        simulation is kept on disk only once. The merged files are memory-mapped
+        (copy-on-write). Hence, data are only read from disk when accessed and
+        never loaded into memory at once.
+
+        Returns:
+            Parameters and simulation outputs as memory-mapped tensors.
+        """
+        batch_ids = self.completed_batch_ids
+        if not batch_ids:
+            raise ValueError(f"The simulation store at {self.path} is empty.")
+
+        if self._index["consolidated"] != batch_ids:
+            self._consolidate(batch_ids)
+
+        theta_file = self._consolidated_file("theta", batch_ids)
+        x_file = self._consolidated_file("x", batch_ids)
+        theta = torch.from_numpy(np.load(theta_file, mmap_mode="c"))
+        x = torch.from_numpy(np.load(x_file, mmap_mode="c"))
+        return theta, x
+
+    def _consolidated_file(self, name: str, batch_ids: List[int]) -> Path:
+        # Files are named by the number of chunks they hold, such that a new merge
+        # never overwrites the files the index currently points to.
+        return self.path / f"{name}_consolidated_{len(batch_ids):08d}.npy"
+
+    def _consolidate(self, batch_ids: List[int]) -> None:
+        """Merges the consolidated files and all newer chunks, and removes them."""
+        previous_ids = self._index["consolidated"] or []
+        starts = np.cumsum([0] + [self._num_simulations(i) for i in previous_ids])
+        position = dict(zip(previous_ids, starts.tolist(), strict=False))
+        for name in ("theta", "x"):
+            previous = (
+                np.load(self._consolidated_file(name, previous_ids), mmap_mode="r")
+                if previous_ids
+                else None
+            )
+            sources = [
+                previous[position[i] : position[i] + self._num_simulations(i)]
+                if i in position
+                else np.load(_chunk_file(self.path, i, name), mmap_mode="r")
+                for i in batch_ids
+            ]
+            _concatenate_into_npy(sources, self._consolidated_file(name, batch_ids))
+            del previous, sources
+
+        # Only remove the old files once the index points to the new ones, such
+        # that an interruption leaves a consistent store behind.
+        self._index["consolidated"] = batch_ids
+        self._save_index()
+        for name in ("theta", "x"):
+            if previous_ids:
+                with suppress(OSError):
+                    os.remove(self._consolidated_file(name, previous_ids))
+            for i in set(batch_ids) - set(previous_ids):
+                with suppress(OSError):
+                    os.remove(_chunk_file(self.path, i, name))
+
+    def _num_simulations(self, batch_id: int) -> int:
+        return self._index["chunks"][str(batch_id)]["num_simulations"]
+
+    def _set_num_batches(self, num_batches: int) -> None:
+        """Sets the number of batches, or checks it against the one of the store."""
+        if self.num_batches is None:
+            self._index["num_batches"] = num_batches
+            self._save_index()
+        elif self.num_batches != num_batches:
+            raise ValueError(
+                f"The simulation store at {self.path} was created for "
+                f"{self.num_batches} batches, but {num_batches} batches were "
+                "requested. Use the same `num_simulations`, `simulation_batch_size` "
+                "and `num_workers` to resume, or use a new store."
+            )
+
+    def _register_chunk(
+        self, batch_id: int, theta: Union[ndarray, Tensor], seed: Optional[int]
+    ) -> None:
+        self._index["chunks"][str(batch_id)] = {
+            "num_simulations": len(theta),
+            "seed": None if seed is None else int(seed),
+            "theta_digest": _digest(theta),
+        }
+        self._save_index()
+
+    def _save_index(self) -> None:
+        # Write to a temporary file first such that the index is never corrupted
+        # by an interruption.
+        index_path = self.path / self._index_file
+        tmp_path = index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, index_path)
+
+
+def _chunk_file(path: Path, batch_id: int, name: str) -> Path:
+    return path / f"{name}_{batch_id:08d}.npy"
+
+
+def _write_chunk(path: Path, batch_id: int, theta: ndarray, x: ndarray) -> None:
+    """Atomically writes the `.npy` files of a chunk."""
+    for name, array in (("theta", theta), ("x", x)):
+        chunk_file = _chunk_file(path, batch_id, name)
+        tmp_file = chunk_file.with_suffix(".tmp")
+        with open(tmp_file, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_file, chunk_file)
+
+
+def _digest(theta: Union[ndarray, Tensor]) -> str:
+    """Returns a hash of the parameters of a chunk."""
+    return hashlib.sha256(np.ascontiguousarray(_as_numpy(theta)).tobytes()).hexdigest()
+
+
+def _concatenate_into_npy(chunks: List[ndarray], target_file: Path) -> None:
+    """Copies the chunks into a single memory-mapped `.npy` file."""
+    target = np.lib.format.open_memmap(
+        target_file,
+        mode="w+",
+        dtype=chunks[0].dtype,
+        shape=(sum(len(chunk) for chunk in chunks), *chunks[0].shape[1:]),
+    )
+    start = 0
+    for chunk in chunks:
+        target[start : start + len(chunk)] = chunk
+        start += len(chunk)
+    target.flush()
+    del target
+
+
+def _simulate_into_store(
+    simulator: Callable,
+    batches: Sequence[Union[ndarray, Tensor]],
+    batch_seeds: Optional[ndarray] = None,
+    num_workers: int = 1,
+    store: Optional[SimulationStore] = None,
+    show_progress_bar: bool = True,
+) -> None:
+    """Simulates all batches that are not yet in the store and writes them to it.
+
+    Every batch is written as a chunk by the process that simulated it and is
+    registered in the index of the store as soon as it is complete.
+
+    Args:
+        simulator: Simulator that maps a batch of parameters to simulation outputs.
+        batches: Batches of parameters.
+        batch_seeds: Seed for every batch. If None, the simulator is not seeded.
+        num_workers: Number of parallel workers to use for simulations.
+        store: Store to write the simulations to.
+        show_progress_bar: Whether to show a progress bar for simulating.
+    """
+    assert store is not None, "A `SimulationStore` is required."
+    store._set_num_batches(len(batches))
+    seeds = [None] * len(batches) if batch_seeds is None else list(batch_seeds)
+
+    completed = set(store.completed_batch_ids)
+    for batch_id in completed:
+        store.check_theta(batch_id, batches[batch_id])
+    todo = [batch_id for batch_id in range(len(batches)) if batch_id not in completed]
+
+    pbar = tqdm(
+        total=sum(len(batches[batch_id]) for batch_id in todo),
+        disable=not show_progress_bar,
+    )
+    if num_workers == 1:
+        for batch_id in todo:
+            x = _simulate_batch(simulator, batches[batch_id], seeds[batch_id])
+            store.add_chunk(batch_id, batches[batch_id], x, seeds[batch_id])
+            pbar.update(len(x))
+    else:
+        for batch_id, num_simulations in Parallel(
+            return_as="generator_unordered", n_jobs=num_workers
+        )(
+            delayed(_simulate_batch_into_store)(
+                simulator, batches[batch_id], seeds[batch_id], store.path, batch_id
+            )
+            for batch_id in todo
+        ):
+            store._register_chunk(batch_id, batches[batch_id], seeds[batch_id])
+            pbar.update(num_simulations)
+    pbar.close()
+
+
+def _simulate_batch_into_store(
+    simulator: Callable,
+    theta: Union[ndarray, Tensor],
+    seed: Optional[int],
+    path: Path,
+    batch_id: int,
+) -> Tuple[int, int]:
+    """Simulates a batch and writes it as chunk into the store at `path`.
+
+    Returns:
+        Batch id and number of simulations written.
+    """
+    x = _simulate_batch(simulator, theta, seed)
+    _write_chunk(path, batch_id, _as_numpy(theta), x)
+    return batch_id, len(x)
+
+
+def _simulate_into_memmap(
+    simulator: Callable,
+    batches: Sequence[Union[ndarray, Tensor]],
+    batch_seeds: Optional[ndarray] = None,
+    num_workers: int = 1,
+    x_memmap_file: Optional[str] = None,
+    show_progress_bar: bool = True,
+) -> Tensor:
+    """Simulates all batches and writes the outputs into a memory-mapped `.npy` file.
+
+    The first batch is simulated in this process to infer the shape and dtype of the
+    simulation outputs, all remaining batches are distributed among `num_workers`.
+
+    Args:
+        simulator: Simulator that maps a batch of parameters to simulation outputs.
+        batches: Batches of parameters.
+        batch_seeds: Seed for every batch. If None, the simulator is not seeded.
+        num_workers: Number of parallel workers to use for simulations.
+        x_memmap_file: Path of the `.npy` file backing `x`. If None, a temporary file
+            is used.
+        show_progress_bar: Whether to show a progress bar for simulating.
+
+    Returns:
+        Simulation outputs, backed by the memory-mapped file.
+    """
+    seeds = [None] * len(batches) if batch_seeds is None else list(batch_seeds)
+    num_simulations = sum(len(batch) for batch in batches)
+
+    pbar = tqdm(total=num_simulations, disable=not show_progress_bar)
+    x_first = _simulate_batch(simulator, batches[0], seeds[0])
+    pbar.update(len(batches[0]))
+
+    is_temporary = x_memmap_file is None
+    if x_memmap_file is None:
+        fd, x_memmap_file = tempfile.mkstemp(suffix=".npy")
+        os.close(fd)
+    x = np.lib.format.open_memmap(
+        x_memmap_file,
+        mode="w+",
+        dtype=x_first.dtype,
+        shape=(num_simulations, *x_first.shape[1:]),
+    )
+    x[: len(x_first)] = x_first
+    x.flush()
+    del x_first
+
+    starts = np.cumsum([0] + [len(batch) for batch in batches])
+    if num_workers == 1:
+        for batch, seed, start in zip(batches[1:], seeds[1:], starts[1:], strict=False):
+            x[start : start + len(batch)] = _simulate_batch(simulator, batch, seed)
+            pbar.update(len(batch))
+    else:
+        for num_written in Parallel(return_as="generator", n_jobs=num_workers)(
+            delayed(_simulate_batch_into_memmap)(
+                simulator, batch, seed, x_memmap_file, int(start)
+            )
+            for batch, seed, start in zip(
+                batches[1:], seeds[1:], starts[1:], strict=False
+            )
+        ):
+            pbar.update(num_written)
+    pbar.close()
+
+    x.flush()
+    if is_temporary:
+        # On POSIX systems, the mapping stays valid after removing the file, which is
+        # then deleted once `x` is garbage collected.
+        with suppress(OSError):
+            os.remove(x_memmap_file)
+
+    return torch.from_numpy(x)
+
+
+def _simulate_batch(
+    simulator: Callable, theta: Union[ndarray, Tensor], seed: Optional[int]
+) -> ndarray:
+    """Runs the (optionally seeded) simulator and returns its output as array."""
+    if seed is not None:
+        seed_all_backends(seed)
+    return _as_numpy(simulator(theta))
+
+
+def _as_numpy(array: Union[ndarray, Tensor]) -> ndarray:
+    if isinstance(array, Tensor):
+        return array.detach().cpu().numpy()
+    return np.asarray(array)
+
+
+def _simulate_batch_into_memmap(
+    simulator: Callable,
+    theta: Union[ndarray, Tensor],
+    seed: Optional[int],
+    x_memmap_file: str,
+    start: int,
+) -> int:
+    """Simulates a batch and writes it into its slice of the memory-mapped `x`.
+
+    Returns:
+        Number of simulations written.
+    """
+    x_batch = _simulate_batch(simulator, theta, seed)
+    x = np.load(x_memmap_file, mmap_mode="r+")
+    x[start : start + len(x_batch)] = x_batch
+    x.flush()
+    return len(x_batch)
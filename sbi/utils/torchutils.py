@@ -3,8 +3,9 @@
 
 """Various PyTorch utility functions."""
 
+import hashlib
 import os
-from typing import Any, Optional, Union
+from typing import Any, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import torch
@@ -104,6 +105,46 @@ def check_if_prior_on_device(
         )
 
 
+def move_to_device(
+    tensors: Sequence[Tensor], device: Union[str, torch.device]
+) -> Tuple[Tensor, ...]:
+    """Moves a batch of tensors to `device`.
+
+    The copies are non-blocking, i.e. if the tensors are in pinned memory (see the
+    `pin_memory` argument of `torch.utils.data.DataLoader`), the host can proceed
+    while they are transferred to the GPU.
+
+    Args:
+        tensors: Tensors of a batch, e.g. theta, x and prior masks.
+        device: Target device.
+
+    Returns:
+        Tuple of tensors on `device`.
+    """
+    return tuple(t.to(device, non_blocking=True) for t in tensors)
+
+
+class LossAccumulator:
+    """Sums losses on their device, such that the host syncs only when reading it.
+
+    Calling `.item()` on the loss of every batch forces the host to wait for the
+    device after each training step. Instead, add the losses of all batches of an
+    epoch and call `.item()` on the accumulator once at the end of the epoch.
+    """
+
+    def __init__(self):
+        self._sum: Optional[Tensor] = None
+
+    def add(self, losses: Tensor) -> None:
+        """Adds the sum of `losses` (which is detached from the graph)."""
+        loss_sum = losses.detach().sum()
+        self._sum = loss_sum if self._sum is None else self._sum + loss_sum
+
+    def item(self) -> float:
+        """Returns the sum of all added losses as a Python float."""
+        return 0.0 if self._sum is None else self._sum.item()
+
+
 def tile(x, n):
     if not is_positive_int(n):
         raise TypeError("Argument `n` must be a positive integer.")
@@ -496,3 +537,25 @@ def assert_not_nan_or_plus_inf(quantity: Tensor, description: str = "tensor") ->
     assert not (torch.isposinf(quantity).any()) and not (torch.isnan(quantity).any()), (
         msg
     )
+
+
+def tensor_digest(tensor: Tensor) -> Tuple[Tuple[int, ...], torch.dtype, str]:
+    """Return the shape, the dtype and a hash of the content of a tensor.
+
+    Tensors with equal digests are equal (up to hash collisions), which allows to use
+    the digest as key of caches which are indexed by the content of tensors.
+    """
+    data = tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8)
+    digest = hashlib.sha1(data.numpy().tobytes()).hexdigest()
+    return tuple(tensor.shape), tensor.dtype, digest
+
+
+def parameter_versions(module: torch.nn.Module) -> Tuple[int, ...]:
+    r"""Returns the versions of all parameters and buffers of `module`.
+
+    The version of a tensor is incremented by every in-place modification, e.g. by
+    optimizer steps or by loading a state dict. Hence, the versions change whenever
+    the module is trained further.
+    """
+    tensors = (*module.parameters(), *module.buffers())
+    return tuple(tensor._version for tensor in tensors)
@@ -1,17 +1,24 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
 
+import numpy as np
 import pytest
+import torch
 from torch import eye, norm, ones, zeros
 from torch.distributions import MultivariateNormal, biject_to
 
 from sbi.inference import MCABC, SMC
+from sbi.inference.abc.distances import Distance
 from sbi.simulators.linear_gaussian import (
     linear_gaussian,
     samples_true_posterior_linear_gaussian_uniform_prior,
     true_posterior_linear_gaussian_mvn_prior,
 )
-from sbi.utils.metrics import check_c2st
+from sbi.utils.metrics import (
+    check_c2st,
+    unbiased_mmd_squared,
+    wasserstein_2_squared,
+)
 from sbi.utils.torchutils import BoxUniform
 
 
@@ -243,3 +250,162 @@ def test_smcabc_iid_inference(
         num_simulations=20000,
         distance_kwargs=distance_kwargs,
     )
+
+
+@pytest.mark.parametrize("kernel", ("gaussian", "uniform"))
+@pytest.mark.parametrize("algorithm_variant", ("A", "C"))
+def test_smcabc_new_log_weights(kernel, algorithm_variant):
+    """Test the batched kernel log probs against a loop over the new particles."""
+    num_dim = 3
+    prior = BoxUniform(-5 * ones(num_dim), 5 * ones(num_dim))
+    inferer = SMC(
+        lambda theta: theta,
+        prior,
+        kernel=kernel,
+        algorithm_variant=algorithm_variant,
+        show_progress_bars=False,
+    )
+    old_particles = prior.sample((300,))
+    old_log_weights = torch.log_softmax(torch.randn(300), dim=0)
+    new_particles = old_particles[:200] + 0.5 * torch.randn(200, num_dim)
+    inferer.kernel_variance = inferer.get_kernel_variance(
+        old_particles, old_log_weights.exp(), samples_per_dim=100
+    )
+
+    new_log_weights = inferer._calculate_new_log_weights(
+        new_particles, old_particles, old_log_weights, max_num_pairs=1000
+    )
+
+    kernel_log_probs = torch.stack([
+        inferer.get_new_kernel(old_particles).log_prob(new_particle)
+        for new_particle in new_particles
+    ])
+    expected = prior.log_prob(new_particles) - torch.logsumexp(
+        old_log_weights + kernel_log_probs, dim=1
+    )
+    assert torch.allclose(new_log_weights, expected, atol=1e-4)
+
+
+@pytest.mark.parametrize("num_simulations", (3000, 20000))
+def test_smcabc_async_populations(num_simulations):
+    """Test that asynchronous populations are complete and respect the budget."""
+    num_dim = 2
+    num_particles = 200
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+    x_o = zeros((1, num_dim))
+
+    def simulator(theta):
+        return linear_gaussian(theta, zeros(num_dim), 0.1 * eye(num_dim))
+
+    inferer = SMC(
+        simulator,
+        prior,
+        num_workers=2,
+        simulation_batch_size=100,
+        show_progress_bars=False,
+        async_populations=True,
+    )
+    particles, summary = inferer(
+        x_o,
+        num_particles=num_particles,
+        num_initial_pop=1000,
+        num_simulations=num_simulations,
+        epsilon_decay=0.5,
+        distance_based_decay=True,
+        return_summary=True,
+    )
+
+    assert inferer.simulation_counter <= num_simulations
+    assert particles.shape == (num_particles, num_dim)
+    for log_weights in summary["weights"]:
+        assert torch.isclose(log_weights.exp().sum(), torch.tensor(1.0))
+    assert torch.allclose(particles.mean(dim=0), zeros(num_dim), atol=0.2)
+
+
+@pytest.mark.parametrize("eps, quantile", ((None, 0.01), (0.3, None)))
+@pytest.mark.parametrize("keep_x", (True, False))
+def test_mcabc_in_chunks(eps, quantile, keep_x):
+    """Test that MCABC in chunks keeps only the selected simulations, and that it
+    does not reseed the random state of the caller."""
+    num_dim = 2
+    num_simulations = 10_000
+    prior = MultivariateNormal(zeros(num_dim), eye(num_dim))
+    x_o = zeros((1, num_dim))
+
+    def simulator(theta):
+        return linear_gaussian(theta, zeros(num_dim), 0.1 * eye(num_dim))
+
+    inferer = MCABC(
+        simulator,
+        prior,
+        num_workers=2,
+        simulation_batch_size=500,
+        show_progress_bars=False,
+    )
+    numpy_state = np.random.get_state()[1].copy()
+    theta, summary = inferer(
+        x_o,
+        num_simulations,
+        eps=eps,
+        quantile=quantile,
+        return_summary=True,
+        chunk_size=1_500,
+        keep_x=keep_x,
+    )
+    assert np.array_equal(np.random.get_state()[1], numpy_state)
+
+    distances = summary["distances"]
+    if quantile is not None:
+        assert theta.shape == (int(num_simulations * quantile), num_dim)
+        assert torch.all(distances[1:] >= distances[:-1])
+    else:
+        assert torch.all(distances < eps)
+    if keep_x:
+        assert torch.allclose(norm(summary["x"] - x_o, dim=-1), distances)
+    else:
+        assert summary["x"] is None
+    assert torch.allclose(theta.mean(dim=0), zeros(num_dim), atol=0.2)
+
+
+@pytest.mark.parametrize("chunk_size", (None, 100))
+def test_mcabc_requires_eps_or_quantile(chunk_size):
+    """Test that MCABC raises the same error with and without chunks if neither eps
+    nor quantile is passed."""
+    prior = BoxUniform(-ones(2), ones(2))
+    inferer = MCABC(lambda theta: theta, prior, show_progress_bars=False)
+    with pytest.raises(ValueError, match="One of epsilon or quantile"):
+        inferer(zeros((1, 2)), 1_000, chunk_size=chunk_size)
+
+
+@pytest.mark.parametrize("batch_size", (-1, 7))
+def test_tiled_statistical_distances(batch_size):
+    """Test the tiled MMD and Wasserstein distances against the reference metrics."""
+    num_dim = 2
+    x_o = torch.randn(30, num_dim)
+    x = torch.randn(20, 25, num_dim) + torch.linspace(0, 2, 20).reshape(20, 1, 1)
+
+    mmd = Distance(
+        "mmd",
+        distance_kwargs={"scale": 1.0, "max_num_elements": 2000},
+        batch_size=batch_size,
+    )
+    expected_mmd = torch.stack([unbiased_mmd_squared(x_o, x_i, scale=1.0) for x_i in x])
+    assert torch.allclose(mmd(x_o, x), expected_mmd, atol=1e-5)
+    # The kernel term of `x_o` is cached and recomputed for a new `x_o`.
+    assert torch.allclose(mmd(x_o, x), expected_mmd, atol=1e-5)
+    assert torch.allclose(
+        mmd(x_o + 1.0, x),
+        torch.stack([unbiased_mmd_squared(x_o + 1.0, x_i, scale=1.0) for x_i in x]),
+        atol=1e-5,
+    )
+
+    wasserstein_kwargs = {"epsilon": 0.1, "tol": 1e-6}
+    wasserstein = Distance(
+        "wasserstein",
+        distance_kwargs={**wasserstein_kwargs, "max_num_elements": 3000},
+        batch_size=batch_size,
+    )
+    expected_wasserstein = torch.stack([
+        wasserstein_2_squared(x_o, x_i, **wasserstein_kwargs) for x_i in x
+    ])
+    assert torch.allclose(wasserstein(x_o, x), expected_wasserstein, rtol=1e-4)
@@ -1,11 +1,15 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Apache License Version 2.0, see <https://www.apache.org/licenses/>
 
+from functools import partial
+
 import pytest
 import torch
+from torch.optim.lr_scheduler import StepLR
 
 from sbi import utils
-from sbi.inference import NPE, infer
+from sbi.inference import NLE, NPE, infer
+from sbi.inference.trainers.trainer import Trainer
 
 
 def test_infer():
@@ -37,10 +41,140 @@ def test_get_dataloaders(training_batch_size):
 
     inferer = NPE()
     inferer.append_simulations(torch.ones(N), torch.zeros(N))
-    _, val_loader = inferer.get_dataloaders(
+    train_loader, val_loader = inferer.get_dataloaders(
         0,
         training_batch_size=training_batch_size,
         validation_fraction=validation_fraction,
     )
 
-    assert len(val_loader) * val_loader.batch_size == int(validation_fraction * N)
+    # Every batch is gathered from the dataset at once.
+    theta, x, _ = next(iter(train_loader))
+    assert theta.shape[0] == x.shape[0] == training_batch_size
+
+    num_val_samples = sum(theta.shape[0] for theta, *_ in val_loader)
+    assert num_val_samples == int(validation_fraction * N)
+
+
+@pytest.mark.parametrize("store_on_disk", (False, True))
+def test_get_dataset_over_rounds(store_on_disk, tmp_path):
+    num_dim = 2
+    inferer = NLE()
+    if store_on_disk:
+        inferer.store_simulations_on_disk(tmp_path)
+
+    theta = [torch.randn(n, num_dim) for n in (30, 50, 20)]
+    x = [t + 1.0 for t in theta]
+    for round_, (t, x_) in enumerate(zip(theta, x, strict=True)):
+        inferer.append_simulations(t, x_, from_round=round_)
+
+    dataset = inferer.get_dataset(starting_round=1)
+    theta_cat, x_cat, masks_cat = inferer.get_simulations(starting_round=1)
+    assert len(dataset) == len(theta_cat) == 70
+
+    indices = torch.randperm(len(dataset))[:25]
+    gathered = dataset[indices]
+    for batch, expected in zip(gathered, (theta_cat, x_cat, masks_cat), strict=True):
+        assert torch.equal(batch, expected[indices])
+    for i in indices.tolist():
+        assert torch.equal(dataset[i][0], theta_cat[i])
+
+    if store_on_disk:
+        assert len(list(tmp_path.glob("*.npy"))) == 3
+    inferer.train(max_num_epochs=2)
+
+
+def test_get_simulations_without_copies():
+    inferer = NLE()
+    theta = torch.randn(100, 2)
+    for round_ in range(4):
+        inferer.append_simulations(theta, theta + 1.0, from_round=round_)
+    # Capacity is doubled when appending, instead of growing by each round.
+    assert inferer._simulations.capacity == 400
+
+    theta_all, x_all, _ = inferer.get_simulations()
+    theta_late, _, _ = inferer.get_simulations(starting_round=2)
+    assert torch.equal(theta_all, theta.repeat(4, 1))
+    assert torch.equal(x_all, theta.repeat(4, 1) + 1.0)
+    assert theta_late.data_ptr() == theta_all[200:].data_ptr()
+
+
+def test_device_dataloader():
+    N = 1000
+    inferer = NLE()
+    theta = torch.arange(N, dtype=torch.float32).unsqueeze(1)
+    inferer.append_simulations(theta, theta + 1.0)
+    train_loader, val_loader = inferer.get_dataloaders(
+        0, training_batch_size=64, device_dataloader=True
+    )
+
+    assert len(train_loader) == len(inferer.train_indices) // 64
+    assert len(val_loader) * val_loader.batch_size == 64
+    batches = list(train_loader)
+    theta_train = torch.cat([theta_batch for theta_batch, _, _ in batches])
+    assert torch.equal(batches[0][1], batches[0][0] + 1.0)
+    # Every training sample is drawn at most once per epoch.
+    assert theta_train.unique().numel() == len(train_loader) * 64
+    assert set(theta_train.long().flatten().tolist()) <= set(
+        inferer.train_indices.tolist()
+    )
+
+    inferer.train(max_num_epochs=2, device_dataloader=True)
+
+
+@pytest.mark.parametrize("method", (NPE, NLE))
+def test_trainer_kwargs(method):
+    theta = torch.randn(500, 2)
+    inferer = method()
+    inferer.append_simulations(theta, theta + 0.1 * torch.randn_like(theta))
+
+    logged = []
+    inferer.train(
+        max_num_epochs=3,
+        trainer_kwargs={
+            "gradient_accumulation_steps": 2,
+            "mixed_precision": True,
+            "lr_scheduler": partial(StepLR, step_size=1, gamma=0.5),
+            "callbacks": [lambda *args: logged.append(args)],
+        },
+    )
+
+    num_epochs = inferer.epoch
+    assert [epoch for epoch, _, _ in logged] == list(range(1, num_epochs + 1))
+    assert inferer.optimizer.param_groups[0]["lr"] == pytest.approx(
+        5e-4 * 0.5**num_epochs
+    )
+    assert logged[-1][2] == pytest.approx(inferer._summary["validation_loss"][-1])
+
+    # The scheduler of the first call is continued when resuming training.
+    with pytest.warns(UserWarning, match="`lr_scheduler` is ignored"):
+        inferer.train(
+            max_num_epochs=num_epochs + 1,
+            resume_training=True,
+            trainer_kwargs={"lr_scheduler": partial(StepLR, step_size=1)},
+        )
+
+
+def test_gradient_accumulation_of_last_group():
+    """Test that the last, smaller group of accumulated batches is not under-scaled."""
+    x = torch.randn(12, 1)
+
+    def loss_fn(batch):
+        return (net(batch[0]) ** 2).squeeze(1)
+
+    net = torch.nn.Linear(1, 1, bias=False)
+    initial_weight = net.weight.detach().clone()
+    optimizer = torch.optim.SGD(net.parameters(), lr=0.1)
+    dataset = torch.utils.data.TensorDataset(x)
+    loader = torch.utils.data.DataLoader(dataset, batch_size=4)
+    Trainer(net, optimizer, gradient_accumulation_steps=2).train_epoch(loader, loss_fn)
+
+    # Reference: one step on the first two batches, and one on the last batch.
+    reference = torch.nn.Linear(1, 1, bias=False)
+    reference.weight.data.copy_(initial_weight)
+    reference_optimizer = torch.optim.SGD(reference.parameters(), lr=0.1)
+    for group in (x[:8], x[8:]):
+        reference_optimizer.zero_grad()
+        (reference(group) ** 2).mean().backward()
+        reference_optimizer.step()
+
+    assert torch.allclose(net.weight, reference.weight)
@@ -19,12 +19,15 @@ from sbi.inference import (
 )
 from sbi.inference.posteriors.mcmc_posterior import build_from_potential
 from sbi.neural_nets import likelihood_nn
+from sbi.samplers.mcmc.init_strategy import resample_given_potential_fn_batched
 from sbi.samplers.mcmc.pymc_wrapper import PyMCSampler
 from sbi.samplers.mcmc.slice_numpy import (
     SliceSampler,
+    SliceSamplerArrayVectorized,
     SliceSamplerSerial,
     SliceSamplerVectorized,
 )
+from sbi.samplers.mcmc.slice_torch import SliceSamplerTorch
 from sbi.simulators.linear_gaussian import (
     diagonal_linear_gaussian,
     true_posterior_linear_gaussian_mvn_prior,
@@ -75,7 +78,10 @@ def test_c2st_slice_np_on_Gaussian(
 
 @pytest.mark.mcmc
 @pytest.mark.parametrize("num_dim", (1, 2))
-@pytest.mark.parametrize("slice_sampler", (SliceSamplerVectorized, SliceSamplerSerial))
+@pytest.mark.parametrize(
+    "slice_sampler",
+    (SliceSamplerVectorized, SliceSamplerArrayVectorized, SliceSamplerSerial),
+)
 @pytest.mark.parametrize("num_workers", (1, 2))
 def test_c2st_slice_np_vectorized_parallelized_on_Gaussian(
     num_dim: int, slice_sampler, num_workers: int, mcmc_params_accurate: dict
@@ -89,7 +95,7 @@ def test_c2st_slice_np_vectorized_parallelized_on_Gaussian(
     warmup = mcmc_params_accurate["warmup_steps"]
     num_chains = (
         mcmc_params_accurate["num_chains"]
-        if slice_sampler is SliceSamplerVectorized
+        if slice_sampler in (SliceSamplerVectorized, SliceSamplerArrayVectorized)
         else 1
     )
     thin = mcmc_params_accurate["thin"]
@@ -128,12 +134,55 @@ def test_c2st_slice_np_vectorized_parallelized_on_Gaussian(
 
     alg = {
         SliceSamplerVectorized: "slice_np_vectorized",
+        SliceSamplerArrayVectorized: "slice_np_arrayvec",
         SliceSamplerSerial: "slice_np",
     }[slice_sampler]
 
     check_c2st(samples, target_samples, alg=alg)
 
 
+@pytest.mark.mcmc
+@pytest.mark.parametrize("num_dim", (1, 2))
+def test_c2st_slice_torch_on_Gaussian(num_dim: int, mcmc_params_accurate: dict):
+    """Test torch slice sampler on Gaussian, comparing to ground truth via c2st.
+
+    Args:
+        num_dim: parameter dimension of the gaussian model
+    """
+    num_samples = 1000
+    warmup = mcmc_params_accurate["warmup_steps"]
+    num_chains = mcmc_params_accurate["num_chains"]
+    thin = mcmc_params_accurate["thin"]
+
+    likelihood_shift = -5.0 * ones(num_dim)
+    likelihood_cov = 0.3 * eye(num_dim)
+    prior_mean = zeros(num_dim)
+    prior_cov = eye(num_dim)
+    x_o = zeros((1, num_dim))
+    target_distribution = true_posterior_linear_gaussian_mvn_prior(
+        x_o[0], likelihood_shift, likelihood_cov, prior_mean, prior_cov
+    )
+    target_samples = target_distribution.sample((num_samples,))
+
+    sampler = SliceSamplerTorch(
+        log_prob_fn=target_distribution.log_prob,
+        init_params=zeros((num_chains, num_dim)),
+        tuning=warmup,
+        thin=thin,
+        num_chains=num_chains,
+    )
+    samples = sampler.run(thin * (warmup + int(num_samples / num_chains)))
+    assert isinstance(samples, torch.Tensor)
+    assert samples.shape == (
+        num_chains,
+        warmup + int(num_samples / num_chains),
+        num_dim,
+    )
+    samples = samples[:, warmup:, :].reshape(-1, num_dim)
+
+    check_c2st(samples, target_samples, alg="slice_torch")
+
+
 @pytest.mark.mcmc
 @pytest.mark.slow
 @pytest.mark.parametrize("step", ("nuts", "hmc", "slice"))
@@ -199,6 +248,8 @@ def test_c2st_pymc_sampler_on_Gaussian(
         "slice_pymc",
         "slice_np",
         "slice_np_vectorized",
+        "slice_np_arrayvec",
+        "slice_torch",
     ),
 )
 def test_getting_inference_diagnostics(method, mcmc_params_fast: dict):
@@ -293,6 +344,68 @@ def test_direct_mcmc_unconditional():
     )
 
 
+@pytest.mark.mcmc
+@pytest.mark.parametrize("method", ("slice_np_vectorized", "slice_np_arrayvec"))
+def test_batched_vectorized_mcmc_with_multiple_workers(method: str):
+    """Test that sharding chains across workers keeps chains matched to their x."""
+    theta_dim = 2
+    num_samples = 200
+
+    prior = BoxUniform(low=-3 * torch.ones(theta_dim), high=3 * torch.ones(theta_dim))
+
+    def potential_fn(theta: torch.Tensor, x: torch.Tensor) -> torch.Tensor:
+        return -5.0 * ((theta - x) ** 2).sum(dim=-1)
+
+    x_batch = torch.tensor([[1.0, 1.0], [-1.0, -1.0], [1.0, -1.0]])
+    mcmc_posterior = build_from_potential(
+        potential_fn, prior, x=x_batch[:1], method=method
+    )
+    samples = mcmc_posterior.sample_batched(
+        (num_samples,),
+        x=x_batch,
+        num_chains=5,
+        warmup_steps=20,
+        num_workers=2,
+        show_progress_bars=False,
+    )
+
+    assert samples.shape == (num_samples, x_batch.shape[0], theta_dim)
+    assert torch.allclose(samples.mean(dim=0), x_batch, atol=0.2)
+
+
+@pytest.mark.parametrize("correct_for_proposal", (True, False))
+def test_resample_given_potential_fn_batched(correct_for_proposal: bool):
+    """Test that the batched resampling returns samples of every x in order."""
+    theta_dim = 2
+    num_samples_per_x = 1000
+    proposal = BoxUniform(low=-3 * ones(theta_dim), high=3 * ones(theta_dim))
+    x_batch = torch.tensor([[1.0, 1.0], [-1.0, -1.0], [1.0, -1.0]])
+
+    def potential_fn(theta: torch.Tensor) -> torch.Tensor:
+        assert theta.shape[1:] == x_batch.shape
+        return -5.0 * ((theta - x_batch) ** 2).sum(dim=-1)
+
+    samples = resample_given_potential_fn_batched(
+        proposal,
+        potential_fn,
+        transform=torch.distributions.transforms.identity_transform,
+        num_x=x_batch.shape[0],
+        num_samples_per_x=num_samples_per_x,
+        num_candidate_samples=200_000,
+        correct_for_proposal=correct_for_proposal,
+        max_sampling_batch_size=30_000,
+    )
+
+    assert samples.shape == (x_batch.shape[0] * num_samples_per_x, theta_dim)
+    samples = samples.reshape(x_batch.shape[0], num_samples_per_x, theta_dim)
+    # Samples are drawn without replacement.
+    for samples_of_x in samples:
+        assert samples_of_x.unique(dim=0).shape[0] == num_samples_per_x
+    assert torch.allclose(samples.mean(dim=1), x_batch, atol=0.1)
+    # The standard deviation of the target is sqrt(0.1).
+    assert torch.allclose(samples.std(dim=1), torch.tensor(0.1).sqrt(), atol=0.05)
+
+
 @pytest.mark.mcmc
 def test_direct_mcmc_conditional():
     "Test MCMCPosterior from user defined potential (conditional)"
@@ -113,6 +113,21 @@ def test_wasserstein_2_distance(sigma):
     assert exponent1 == exponent2
 
 
+def test_batched_wasserstein_2_matches_single():
+    """Test that batch entries of the Sinkhorn iterations converge independently."""
+    ndim = 2
+    x = torch.randn(5, 50, ndim)
+    # Batch entries at different distances converge after different iterations.
+    y = torch.randn(5, 40, ndim) + torch.arange(5.0).reshape(5, 1, 1)
+
+    batched = wasserstein_2_squared(x, y, epsilon=1e-1, tol=1e-6)
+    single = torch.stack([
+        wasserstein_2_squared(x_i, y_i, epsilon=1e-1, tol=1e-6)
+        for x_i, y_i in zip(x, y, strict=True)
+    ])
+    assert torch.allclose(batched, single, rtol=1e-4)
+
+
 @pytest.mark.slow
 @pytest.mark.parametrize(
     "test", (unbiased_mmd_squared_hypothesis_test, biased_mmd_hypothesis_test)
@@ -19,6 +19,8 @@ from sbi.inference import (
     NRE_C,
     DirectPosterior,
 )
+from sbi.neural_nets.net_builders import build_mdn
+from sbi.samplers.rejection import rejection
 from sbi.simulators.linear_gaussian import (
     diagonal_linear_gaussian,
     linear_gaussian,
@@ -151,6 +153,134 @@ def test_batched_sample_log_prob_with_different_x(
             ), "Batched log probs different from non-batched log probs"
 
 
+def test_leakage_correction_cache(monkeypatch):
+    """Test that leakage correction factors are cached per observation and estimated
+    in a single batched pass for all observations which are not cached."""
+    num_dim = 2
+    prior = Independent(Uniform(-1.0 * ones(num_dim), 1.0 * ones(num_dim)), 1)
+    theta = prior.sample((100,))
+    posterior_estimator = build_mdn(theta, diagonal_linear_gaussian(theta))
+    posterior = DirectPosterior(
+        posterior_estimator, prior, leakage_correction_cache_size=3
+    )
+
+    num_estimated = []
+    accept_reject_sample = rejection.accept_reject_sample
+
+    def counting_accept_reject_sample(*args, proposal_sampling_kwargs, **kwargs):
+        num_estimated.append(proposal_sampling_kwargs["condition"].shape[0])
+        return accept_reject_sample(
+            *args, proposal_sampling_kwargs=proposal_sampling_kwargs, **kwargs
+        )
+
+    monkeypatch.setattr(
+        rejection, "accept_reject_sample", counting_accept_reject_sample
+    )
+
+    x_o = torch.tensor([[0.0, 0.0], [0.5, 0.5], [0.0, 0.0]])
+    thetas = prior.sample((10,))
+    batched_log_probs = posterior.log_prob_batched(
+        thetas.unsqueeze(1).expand(-1, 3, -1), x_o
+    )
+    assert num_estimated == [2]
+
+    # Cached factors are reused for single and batched observations.
+    for i in range(3):
+        log_probs = posterior.log_prob(thetas, x=x_o[i])
+        assert torch.allclose(log_probs, batched_log_probs[:, i])
+    posterior.log_prob_batched(thetas.unsqueeze(1).expand(-1, 2, -1), x_o[:2])
+    assert num_estimated == [2]
+
+    # Only new observations are estimated, and the least recently used are evicted.
+    posterior.leakage_correction(torch.tensor([[0.1, 0.1], [0.2, 0.2], [0.5, 0.5]]))
+    assert num_estimated == [2, 2]
+    posterior.leakage_correction(x_o[0])
+    assert num_estimated == [2, 2, 1]
+
+    # Factors are re-estimated once the estimator is modified.
+    with torch.no_grad():
+        next(posterior_estimator.parameters()).add_(0.1)
+    posterior.leakage_correction(x_o[0])
+    assert num_estimated == [2, 2, 1, 1]
+
+
+def test_accept_reject_sample_retires_completed_observations():
+    """Test that observations with enough accepted samples are no longer proposed
+    for, and that all samples are accepted and belong to their observation."""
+    condition = torch.tensor([[0.0], [3.0], [1.0]])
+    num_proposed_xos = []
+
+    def proposal(sample_shape, condition):
+        num_proposed_xos.append(condition.shape[0])
+        noise = torch.randn(*sample_shape, condition.shape[0], 1)
+        # The observation is appended to identify the samples of each observation.
+        return torch.cat([noise + condition, condition.expand_as(noise)], dim=-1)
+
+    samples, acceptance_rates = rejection.accept_reject_sample(
+        proposal=proposal,
+        accept_reject_fn=lambda theta: theta[..., 0] < 2.0,
+        num_samples=500,
+        max_sampling_batch_size=500,
+        proposal_sampling_kwargs={"condition": condition},
+    )
+
+    assert samples.shape == (500, 3, 2)
+    assert (samples[..., 0] < 2.0).all()
+    assert (samples[..., 1] == condition[:, 0]).all()
+    # Acceptance rates are Phi(2), Phi(-1) and Phi(1).
+    assert torch.allclose(
+        acceptance_rates, torch.tensor([0.977, 0.159, 0.841]), atol=0.05
+    )
+    assert num_proposed_xos[0] == 3
+    assert num_proposed_xos[-1] == 1
+
+
+@pytest.mark.parametrize(
+    "method, build_posterior_kwargs",
+    [
+        (NPE_C, {}),
+        pytest.param(
+            NLE_A,
+            {"mcmc_method": "slice_np_vectorized"},
+            marks=pytest.mark.mcmc,
+        ),
+        pytest.param(FMPE, {}, marks=pytest.mark.slow),
+    ],
+)
+def test_map_batched(method, build_posterior_kwargs):
+    """Test that the batched MAP estimates match the MAP estimates of every single
+    observation."""
+    num_dim = 2
+    prior = MultivariateNormal(loc=zeros(num_dim), covariance_matrix=eye(num_dim))
+    theta = prior.sample((1000,))
+    x = linear_gaussian(theta, zeros(num_dim), 0.3 * eye(num_dim))
+
+    inference = method(prior=prior, show_progress_bars=False)
+    inference.append_simulations(theta, x).train(max_num_epochs=5)
+    posterior = inference.build_posterior(**build_posterior_kwargs)
+
+    x_o = torch.tensor([[0.0, 0.0], [1.0, -1.0], [-1.5, 0.5]])
+    inits = prior.sample((100,))
+    maps = posterior.map_batched(
+        x_o, num_iter=200, num_to_optimize=10, init_method=inits, learning_rate=0.05
+    )
+
+    assert maps.shape == (3, num_dim)
+    # The observation of the potential is not changed.
+    assert posterior.potential_fn.return_x_o() is None
+    for map_, x_o_i in zip(maps, x_o, strict=True):
+        posterior.set_default_x(x_o_i)
+        single_map = posterior.map(
+            num_iter=200,
+            num_to_optimize=10,
+            init_method=inits,
+            learning_rate=0.05,
+            save_best_every=1,
+            force_update=True,
+        )
+        assert torch.allclose(map_, single_map.squeeze(0), atol=0.05)
+
+
 @pytest.mark.mcmc
 @pytest.mark.parametrize("snlre_method", [NRE_C])  # it's independent of the method
 @pytest.mark.parametrize("x_o_batch_dim", (0, 1, 2))
@@ -16,7 +16,13 @@ from sbi.inference import (
     MCMCPosterior,
     likelihood_estimator_based_potential,
 )
-from sbi.samplers.mcmc import PyMCSampler, SliceSamplerSerial, SliceSamplerVectorized
+from sbi.samplers.mcmc import (
+    PyMCSampler,
+    SliceSamplerArrayVectorized,
+    SliceSamplerSerial,
+    SliceSamplerTorch,
+    SliceSamplerVectorized,
+)
 from sbi.simulators.linear_gaussian import diagonal_linear_gaussian
 
 
@@ -26,6 +32,8 @@ from sbi.simulators.linear_gaussian import diagonal_linear_gaussian
     (
         "slice_np",
         "slice_np_vectorized",
+        "slice_np_arrayvec",
+        "slice_torch",
         "nuts_pyro",
         "hmc_pyro",
         pytest.param(
@@ -87,5 +95,9 @@ def test_api_posterior_sampler_set(
         assert type(posterior.posterior_sampler) is PyMCSampler
     elif sampling_method == "slice_np":
         assert type(posterior.posterior_sampler) is SliceSamplerSerial
+    elif sampling_method == "slice_np_arrayvec":
+        assert type(posterior.posterior_sampler) is SliceSamplerArrayVectorized
+    elif sampling_method == "slice_torch":
+        assert type(posterior.posterior_sampler) is SliceSamplerTorch
     else:  # sampling_method == "slice_np_vectorized"
         assert type(posterior.posterior_sampler) is SliceSamplerVectorized
@@ -12,6 +12,7 @@ from torch.distributions import MultivariateNormal, Uniform
 
 from sbi.analysis import sbc_rank_plot
 from sbi.diagnostics import check_sbc, get_nltp, run_sbc
+from sbi.diagnostics.sbc import _run_sbc
 from sbi.inference import NLE, NPE, NPSE
 from sbi.inference.posteriors.base_posterior import NeuralPosterior
 from sbi.simulators.linear_gaussian import linear_gaussian
@@ -367,3 +368,70 @@ def test_sbc_batch_sampling(batch_sampling: bool, gaussian_setup: Dict):
     assert ranks.shape == (num_sbc_runs, gaussian_setup["num_dim"]), (
         f"Ranks shape incorrect with batched_sampling={batch_sampling}"
     )
+
+
+def test_vectorized_sbc_ranks_and_nltp(gaussian_setup: Dict):
+    """Test that the vectorized ranks and NLTP match those of single evaluations."""
+    prior = gaussian_setup["prior"]
+    simulator = gaussian_setup["simulator"]
+    num_sbc_runs = 20
+
+    posterior = train_inference_method(
+        NPE, prior, simulator, num_simulations=200, max_num_epochs=1
+    )
+    thetas = prior.sample((num_sbc_runs,))
+    xs = simulator(thetas)
+    posterior_samples = posterior.sample_batched((50,), xs, show_progress_bars=False)
+
+    ranks = _run_sbc(thetas, xs, posterior_samples, "marginals")
+    expected_ranks = torch.stack([
+        (posterior_samples[:, i] < theta).sum(dim=0) for i, theta in enumerate(thetas)
+    ]).float()
+    assert torch.equal(ranks, expected_ranks)
+
+    def log_prob(theta, x):
+        return posterior.log_prob(theta, x=x, norm_posterior=False)
+
+    def log_prob_batched(theta, x):
+        return posterior.log_prob_batched(theta, x, norm_posterior=False)
+
+    ranks = _run_sbc(thetas, xs, posterior_samples, log_prob, show_progress_bar=False)
+    batched_ranks = _run_sbc(
+        thetas, xs, posterior_samples, log_prob_batched, reduce_fns_batched=True
+    )
+    assert torch.equal(ranks, batched_ranks)
+
+    nltp = get_nltp(thetas, xs, posterior)
+    assert nltp.shape == (num_sbc_runs,)
+    expected_nltp = torch.cat([
+        -posterior.log_prob(theta, x=x) for theta, x in zip(thetas, xs, strict=True)
+    ])
+    assert torch.allclose(nltp, expected_nltp, atol=1e-5)
+
+
+def test_batched_nltp_leaves_posterior_x_untouched(gaussian_setup: Dict):
+    """Test that the batched NLTP of a likelihood-based posterior matches single
+    evaluations and does not change the observation of the posterior."""
+    prior = gaussian_setup["prior"]
+    simulator = gaussian_setup["simulator"]
+    num_sbc_runs = 20
+
+    posterior = train_inference_method(
+        NLE, prior, simulator, num_simulations=200, max_num_epochs=1
+    )
+    x_o = simulator(prior.sample((1,)))
+    posterior.set_default_x(x_o)
+    thetas = prior.sample((num_sbc_runs,))
+    xs = simulator(thetas)
+    potential = posterior.potential(thetas)
+
+    with pytest.warns(UserWarning, match="not normalized"):
+        nltp = get_nltp(thetas, xs, posterior)
+    assert nltp.shape == (num_sbc_runs,)
+    assert torch.equal(posterior.potential_fn.return_x_o(), x_o)
+    assert torch.allclose(posterior.potential_fn(thetas), potential)
+
+    expected_nltp = torch.cat([
+        -posterior.potential(theta, x=x) for theta, x in zip(thetas, xs, strict=True)
+    ])
+    assert torch.allclose(nltp, expected_nltp, atol=1e-5)
@@ -9,7 +9,7 @@ import pytest
 import torch
 
 from sbi.neural_nets.embedding_nets import CNNEmbedding
-from sbi.neural_nets.net_builders import build_score_estimator
+from sbi.neural_nets.net_builders import build_mlp_flowmatcher, build_score_estimator
 
 
 @pytest.mark.parametrize("sde_type", ["vp", "ve", "subvp"])
@@ -97,6 +97,95 @@ def test_score_estimator_forward_shapes(
     assert outputs.shape == (batch_dim, *input_event_shape), "Output shape mismatch."
 
 
+class _CountingEmbedding(torch.nn.Module):
+    def __init__(self, in_features: int, out_features: int):
+        super().__init__()
+        self.linear = torch.nn.Linear(in_features, out_features)
+        self.num_embedded = 0
+
+    def forward(self, x):
+        self.num_embedded += x.shape[0]
+        return self.linear(x)
+
+
+@pytest.mark.parametrize("estimator_type", ["score", "flowmatching"])
+def test_cached_condition_embedding(estimator_type):
+    """Test that a cached condition embedding is reused and leaves outputs unchanged."""
+    embedding_net = _CountingEmbedding(3, 5)
+    if estimator_type == "score":
+        estimator = build_score_estimator(
+            torch.randn(100, 2), torch.randn(100, 3), embedding_net_y=embedding_net
+        )
+    else:
+        estimator = build_mlp_flowmatcher(
+            torch.randn(100, 2), torch.randn(100, 3), embedding_net=embedding_net
+        )
+    estimator.eval()
+
+    inputs = torch.randn(50, 1, 2)
+    condition = torch.randn(1, 3)
+    time = torch.rand(())
+
+    # Without cache, the condition is embedded once, not once per input.
+    embedding_net.num_embedded = 0
+    outputs = estimator(inputs, condition, time)
+    assert embedding_net.num_embedded == 1
+
+    estimator.cache_condition_embedding(condition)
+    embedding_net.num_embedded = 0
+    for _ in range(3):
+        cached_outputs = estimator(inputs, condition.clone(), time)
+    assert embedding_net.num_embedded == 0
+    assert torch.allclose(outputs, cached_outputs)
+
+    # Other conditions are still embedded.
+    estimator(inputs, torch.randn(1, 3), time)
+    assert embedding_net.num_embedded == 1
+
+    # Training invalidates the cache.
+    estimator.train()
+    estimator.eval()
+    estimator(inputs, condition, time)
+    assert embedding_net.num_embedded == 2
+
+    # Slices of a cached batch reuse the cache, unless they were modified in-place.
+    conditions = torch.randn(4, 3)
+    estimator.cache_condition_embedding(conditions)
+    embedding_net.num_embedded = 0
+    estimator.embed_condition(conditions[1:3])
+    assert embedding_net.num_embedded == 0
+    conditions[1] += 1.0
+    estimator.embed_condition(conditions[1:3])
+    assert embedding_net.num_embedded == 2
+
+
+def test_load_score_estimator_state_dict_with_old_layout():
+    """Test that state dicts which hold the condition embedding inside of the score
+    net, as saved before the estimator embedded the condition, can be loaded."""
+    batch_x, batch_y = torch.randn(100, 2), torch.randn(100, 3)
+    estimator = build_score_estimator(
+        batch_x, batch_y, embedding_net_y=torch.nn.Linear(3, 5)
+    )
+    old_state_dict = {
+        key.replace("_embedding_net.", "net.input_handler.embedding_net_y.", 1)
+        if key.startswith("_embedding_net.")
+        else key: value
+        for key, value in estimator.state_dict().items()
+    }
+    old_prefix = "net.input_handler.embedding_net_y.1."
+    assert any(key.startswith(old_prefix) for key in old_state_dict)
+
+    loaded_estimator = build_score_estimator(
+        batch_x, batch_y, embedding_net_y=torch.nn.Linear(3, 5)
+    )
+    loaded_estimator.load_state_dict(old_state_dict)
+
+    inputs, condition, time = torch.randn(10, 2), torch.randn(10, 3), torch.rand(10)
+    assert torch.allclose(
+        estimator(inputs, condition, time), loaded_estimator(inputs, condition, time)
+    )
+
+
 def _build_score_estimator_and_tensors(
     sde_type: str,
     input_event_shape: Tuple[int],
@@ -10,11 +10,14 @@ import torch
 from torch import Tensor
 from torch.distributions import Gamma, Independent, MultivariateNormal, Normal, Uniform
 
+from sbi.inference.posteriors.vector_field_posterior import VectorFieldPosterior
+from sbi.inference.potentials.score_fn_iid import AutoGaussCorrectedScoreFn
 from sbi.inference.potentials.vector_field_potential import (
     vector_field_estimator_based_potential,
 )
 from sbi.neural_nets.net_builders import build_score_estimator
 from sbi.samplers.score import Diffuser
+from sbi.samplers.score.predictors import DPMSolver
 from sbi.utils import BoxUniform, MultipleIndependent
 
 
@@ -73,6 +76,93 @@ def test_score_fn_iid_on_different_priors(sde_type, iid_method, num_dim):
         assert torch.isfinite(output).all(), "Output contains non-finite values"
 
 
+def test_auto_gauss_posterior_precision_is_cached(monkeypatch):
+    """Test that the posterior precision is estimated once per estimator state and
+    observations."""
+    score_fn = _build_gaussian_score_estimator(
+        "vp", (2,), torch.zeros(2), torch.ones(2)
+    )
+    estimator = score_fn.vector_field_estimator
+    prior = BoxUniform(-3 * torch.ones(2), 3 * torch.ones(2))
+
+    num_estimates = 0
+    estimate = AutoGaussCorrectedScoreFn.estimate_posterior_precision
+
+    def counting_estimate(cls, *args, **kwargs):
+        nonlocal num_estimates
+        num_estimates += 1
+        return estimate(*args, **kwargs)
+
+    monkeypatch.setattr(
+        AutoGaussCorrectedScoreFn,
+        "estimate_posterior_precision",
+        classmethod(counting_estimate),
+    )
+    iid_params = dict(precision_est_budget=50, precision_initial_sampler_steps=5)
+    x_o = torch.ones((5, 1))
+
+    for _ in range(2):
+        # Equal observations in a new tensor and a new score function.
+        iid_score_fn = AutoGaussCorrectedScoreFn(estimator, prior, **iid_params)
+        precision = iid_score_fn.posterior_precision_est_fn(x_o.clone())
+        assert num_estimates == 1
+    assert precision.shape == (1, 5, 2, 2)
+
+    iid_score_fn.posterior_precision_est_fn(2 * x_o)
+    assert num_estimates == 2
+
+    # Training the estimator further invalidates the cache.
+    with torch.no_grad():
+        next(estimator.parameters()).add_(0.0)
+    iid_score_fn.posterior_precision_est_fn(x_o)
+    assert num_estimates == 3
+
+
+@pytest.mark.parametrize("iid_method", ["fnpe", "gauss", "auto_gauss", "jac_gauss"])
+def test_score_fn_iid_in_batches(iid_method):
+    """Test that accumulating the iid score over batches of observations gives the
+    same score, and reuses the cached embedding of the observations."""
+    embedding_net = torch.nn.Linear(2, 4)
+    num_embedded = 0
+
+    def count_embedded(module, args, output):
+        nonlocal num_embedded
+        num_embedded += args[0].shape[0]
+
+    embedding_net.register_forward_hook(count_embedded)
+    score_estimator = build_score_estimator(
+        torch.randn(100, 3), torch.randn(100, 2), embedding_net_y=embedding_net
+    )
+    prior = BoxUniform(-3 * torch.ones(3), 3 * torch.ones(3))
+    x_o = torch.randn(7, 2)
+    inputs = torch.randn(10, 1, 3)
+    time = torch.tensor([0.5])
+    iid_params = (
+        dict(precision_est_budget=50, precision_initial_sampler_steps=5)
+        if iid_method == "auto_gauss"
+        else {}
+    )
+
+    scores = []
+    for iid_batch_size in (None, 3):
+        score_fn, _ = vector_field_estimator_based_potential(
+            score_estimator, prior=prior, x_o=None
+        )
+        score_fn.set_x(
+            x_o,
+            x_is_iid=True,
+            iid_method=iid_method,
+            iid_params=dict(iid_batch_size=iid_batch_size, **iid_params),
+        )
+        # The first evaluation might estimate the posterior precisions.
+        score_fn.gradient(inputs, time=time)
+        num_embedded = 0
+        scores.append(score_fn.gradient(inputs, time=time))
+        assert num_embedded == 0
+
+    assert torch.allclose(scores[0], scores[1], atol=1e-5)
+
+
 @pytest.mark.parametrize("sde_type", ["vp", "ve", "subvp"])
 @pytest.mark.parametrize("predictor", ("euler_maruyama",))
 @pytest.mark.parametrize("corrector", (None, "gibbs", "langevin"))
@@ -101,6 +191,139 @@ def test_gaussian_score_sampling(
     assert torch.allclose(std_est, std0, atol=1e-1)
 
 
+@pytest.mark.parametrize("sde_type", ["vp", "ve", "subvp"])
+@pytest.mark.parametrize(
+    "predictor, steps", (("heun", 25), ("dpm_solver", 15), ("adaptive", 2))
+)
+@pytest.mark.parametrize("input_event_shape", ((1,), (4,)))
+def test_gaussian_score_sampling_with_few_steps(
+    sde_type, predictor, steps, input_event_shape
+):
+    """Test that higher-order and adaptive predictors need only few time points."""
+    mean0 = -1.0 * torch.ones(input_event_shape)
+    std0 = 0.5 * torch.ones(input_event_shape)
+
+    score_fn = _build_gaussian_score_estimator(sde_type, input_event_shape, mean0, std0)
+
+    sampler = Diffuser(score_fn, predictor)
+
+    t_min = score_fn.vector_field_estimator.t_min
+    t_max = score_fn.vector_field_estimator.t_max
+    ts = torch.linspace(t_max, t_min, steps)
+    samples = sampler.run(1_000, ts)
+
+    mean_est = samples.mean(0)
+    std_est = samples.std(0)
+
+    assert torch.allclose(mean_est, mean0, atol=1e-1)
+    assert torch.allclose(std_est, std0, atol=1e-1)
+
+
+@pytest.mark.parametrize("sde_type", ["vp", "ve", "subvp"])
+def test_dpm_solver_midpoint(sde_type):
+    """Test the closed-form midpoints in log-SNR of DPM-Solver against bisection."""
+    mean0 = torch.zeros(2)
+    std0 = torch.ones(2)
+    score_fn = _build_gaussian_score_estimator(sde_type, (2,), mean0, std0)
+    predictor = DPMSolver(score_fn)
+    assert predictor._time_of_log_snr is not None
+
+    t1 = torch.tensor([0.9, 0.5, 0.1])
+    t0 = torch.tensor([0.8, 0.2, 1e-3])
+    closed_form = predictor._midpoint(t1, t0)
+    predictor._time_of_log_snr = None
+    bisected = predictor._midpoint(t1, t0)
+
+    assert closed_form.shape == t1.shape
+    assert torch.all((t0 < closed_form) & (closed_form < t1))
+    assert torch.allclose(closed_form, bisected, atol=1e-4)
+
+
+@pytest.mark.parametrize("sde_type", ["vp", "ve"])
+@pytest.mark.parametrize(
+    "ode_kwargs",
+    (
+        dict(method="rk4", num_steps=20),
+        dict(method="midpoint", num_steps=50, num_probes=4),
+        dict(method="rk4", num_steps=20, exact=True),
+    ),
+)
+def test_gaussian_fixed_step_ode(sde_type, ode_kwargs):
+    """Test sampling and log_prob with the fixed-step neural ODE backend."""
+    mean0 = -1.0 * torch.ones(3)
+    std0 = 0.5 * torch.ones(3)
+    score_fn = _build_gaussian_score_estimator(sde_type, (3,), mean0, std0)
+
+    prior = BoxUniform(-10 * torch.ones(3), 10 * torch.ones(3))
+    potential_fn, _ = vector_field_estimator_based_potential(
+        score_fn.vector_field_estimator,
+        prior=prior,
+        x_o=torch.ones((1,)),
+        neural_ode_backend="fixed_step",
+        neural_ode_kwargs=ode_kwargs,
+    )
+    reference_potential_fn, _ = vector_field_estimator_based_potential(
+        score_fn.vector_field_estimator, prior=prior, x_o=torch.ones((1,))
+    )
+
+    samples = potential_fn.neural_ode(potential_fn.x_o).sample((1_000,))
+    assert torch.allclose(samples.mean(0), mean0, atol=1e-1)
+    assert torch.allclose(samples.std(0), std0, atol=1e-1)
+
+    theta = mean0 + std0 * torch.randn(10, 3)
+    log_probs = potential_fn(theta)
+    reference_log_probs = reference_potential_fn(theta)
+    assert torch.allclose(log_probs, reference_log_probs, atol=1e-1)
+
+
+@pytest.mark.parametrize("num_workers", (1, 2))
+def test_gaussian_score_sampling_in_chunks(num_workers):
+    """Test chunked and threaded sampling of the diffuser and the posterior."""
+    mean0 = -1.0 * torch.ones(2)
+    std0 = 0.5 * torch.ones(2)
+    score_fn = _build_gaussian_score_estimator("vp", (2,), mean0, std0)
+
+    ts = torch.linspace(score_fn.vector_field_estimator.t_max, 1e-3, 100)
+    chunks = list(
+        Diffuser(score_fn, "euler_maruyama").run_in_chunks(
+            1_000, ts, chunk_size=300, num_workers=num_workers
+        )
+    )
+    assert [chunk.shape[0] for chunk in chunks] == [300, 300, 300, 100]
+
+    # Threads do not share predictors and correctors.
+    diffuser = Diffuser(score_fn, "adaptive", corrector="langevin")
+    worker_diffuser = diffuser._copy_for_worker()
+    assert worker_diffuser.predictor is not diffuser.predictor
+    assert worker_diffuser.corrector.predictor is worker_diffuser.predictor
+
+    prior = BoxUniform(-3 * torch.ones(2), 3 * torch.ones(2))
+    posterior = VectorFieldPosterior(score_fn.vector_field_estimator, prior)
+    x_o = torch.ones((1,))
+    chunks = list(
+        posterior.sample_iter(
+            (1_000,), x=x_o, steps=100, chunk_size=300, num_workers=num_workers
+        )
+    )
+    assert all(chunk.shape[1:] == (2,) for chunk in chunks)
+    samples = torch.cat(chunks)
+    assert samples.shape == (1_000, 2)
+    assert torch.allclose(samples.mean(0), mean0, atol=1e-1)
+    assert torch.allclose(samples.std(0), std0, atol=1e-1)
+
+    samples = posterior.sample(
+        (1_000,), x=x_o, steps=100, max_sampling_batch_size=300, num_workers=2
+    )
+    assert samples.shape == (1_000, 2)
+    assert torch.allclose(samples.mean(0), mean0, atol=1e-1)
+
+    # Sampling stops if the prior rejects all samples.
+    prior = BoxUniform(10 * torch.ones(2), 11 * torch.ones(2))
+    posterior = VectorFieldPosterior(score_fn.vector_field_estimator, prior)
+    with pytest.raises(RuntimeError, match="support of the prior"):
+        list(posterior.sample_iter((10,), x=x_o, steps=5, chunk_size=50_000))
+
+
 def _build_gaussian_score_estimator(
     sde_type: str,
     input_event_shape: Tuple[int],
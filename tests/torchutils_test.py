@@ -227,3 +227,13 @@ def test_process_device(device_input: str) -> None:
         # should only happen if no gpu is available
         if device_input == "gpu":
             assert not torchutils.gpu_available()
+
+
+def test_loss_accumulator():
+    accumulator = torchutils.LossAccumulator()
+    assert accumulator.item() == 0.0
+
+    losses = torch.randn(10, requires_grad=True)
+    for batch_losses in losses.split(3):
+        accumulator.add(batch_losses)
+    assert accumulator.item() == pytest.approx(losses.sum().item(), rel=1e-6)
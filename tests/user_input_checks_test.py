@@ -19,7 +19,7 @@ from torch.distributions import (
     Uniform,
 )
 
-from sbi.inference import NPE_A, NPE_C, simulate_for_sbi
+from sbi.inference import NPE_A, NPE_C, SimulationStore, simulate_for_sbi
 from sbi.inference.posteriors.direct_posterior import DirectPosterior
 from sbi.simulators import linear_gaussian
 from sbi.simulators.linear_gaussian import diagonal_linear_gaussian
@@ -593,3 +593,95 @@ def test_simulate_for_sbi(
             assert x.shape[0] == num_simulations, "x should have num_simulations rows"
             assert theta.shape[1] == num_dim, "Theta should have num_dim columns"
             assert x.shape[1] == num_dim, "x should have num_dim columns"
+
+
+@pytest.mark.parametrize("num_workers", (1, 2))
+@pytest.mark.parametrize("use_file", (False, True))
+def test_simulate_for_sbi_preallocate_x(num_workers: int, use_file: bool, tmp_path):
+    """Test that preallocating x gives the same simulations as concatenating."""
+    num_dim = 3
+    prior = BoxUniform(-2.0 * ones(num_dim), 2.0 * ones(num_dim))
+    simulator = process_simulator(
+        lambda theta: linear_gaussian(theta, -1.0 * ones(num_dim), 0.3 * eye(num_dim)),
+        prior,
+        False,
+    )
+    x_memmap_file = str(tmp_path / "x.npy") if use_file else None
+
+    kwargs = dict(
+        num_simulations=53,
+        num_workers=num_workers,
+        simulation_batch_size=10,
+        seed=0,
+        show_progress_bar=False,
+    )
+    theta, x = simulate_for_sbi(simulator, prior, **kwargs)
+    theta_pre, x_pre = simulate_for_sbi(
+        simulator, prior, preallocate_x=True, x_memmap_file=x_memmap_file, **kwargs
+    )
+
+    assert torch.equal(theta, theta_pre)
+    assert torch.equal(x, x_pre)
+    if use_file:
+        assert np.array_equal(np.load(x_memmap_file), x_pre.numpy())
+
+
+@pytest.mark.parametrize("num_workers", (1, 2))
+def test_simulate_for_sbi_resume_from_store(num_workers: int, tmp_path):
+    """Test that an interrupted simulation can be resumed from a SimulationStore."""
+    num_dim = 3
+    prior = BoxUniform(-2.0 * ones(num_dim), 2.0 * ones(num_dim))
+    simulator = process_simulator(
+        lambda theta: linear_gaussian(theta, -1.0 * ones(num_dim), 0.3 * eye(num_dim)),
+        prior,
+        False,
+    )
+
+    def crashing_simulator(theta):
+        if (theta[:, 0] > 1.5).any():
+            raise RuntimeError("Simulator crashed.")
+        return simulator(theta)
+
+    kwargs = dict(
+        num_simulations=95,
+        num_workers=num_workers,
+        simulation_batch_size=10,
+        seed=0,
+        show_progress_bar=False,
+    )
+    theta_ref, x_ref = simulate_for_sbi(
+        simulator, prior, store=SimulationStore(tmp_path / "ref"), **kwargs
+    )
+
+    store = SimulationStore(tmp_path / "resumed")
+    with pytest.raises(RuntimeError, match="crashed"):
+        simulate_for_sbi(crashing_simulator, prior, store=store, **kwargs)
+    assert not store.is_complete()
+    num_completed = len(store.completed_batch_ids)
+
+    # Resume from a freshly opened store, as if the process had died.
+    store = SimulationStore(tmp_path / "resumed")
+    assert len(store.completed_batch_ids) == num_completed
+    theta, x = simulate_for_sbi(simulator, prior, store=store, **kwargs)
+
+    assert store.is_complete() and len(store) == kwargs["num_simulations"]
+    assert torch.equal(theta, theta_ref)
+    assert torch.equal(x, x_ref)
+
+    # The store can not be resumed with a different number of batches.
+    with pytest.raises(ValueError, match="was created for"):
+        simulate_for_sbi(
+            simulator, prior, store=store, **dict(kwargs, num_simulations=50)
+        )
+    # Nor with different parameters.
+    with pytest.raises(ValueError, match="do not match"):
+        simulate_for_sbi(simulator, prior, store=store, **dict(kwargs, seed=1))
+
+    # Chunks are removed once they are consolidated.
+    assert not list((tmp_path / "resumed").glob("x_0*.npy"))
+
+    # Memory-mapped data are appended without copying.
+    theta, x = store.load()
+    inference = NPE_C(prior, show_progress_bars=False).append_simulations(theta, x)
+    assert inference.get_simulations()[1].shape == x.shape
+    assert inference._x_roundwise[0].data_ptr() == x.data_ptr()